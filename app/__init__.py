@@ -4,55 +4,18 @@ Flask application factory pattern
 """
 from flask import Flask
 import os
-import sqlite3
 import logging
+from app.services.database import get_pool
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database configuration
-DATA_DIR = os.environ.get("KVTUBE_DATA_DIR", "data")
-DB_NAME = os.path.join(DATA_DIR, "kvtube.db")
-
 
 def init_db():
     """Initialize the database with required tables."""
-    # Ensure data directory exists
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Users Table
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL
-                )""")
-    
-    # User Videos (history/saved)
-    c.execute("""CREATE TABLE IF NOT EXISTS user_videos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    video_id TEXT,
-                    title TEXT,
-                    thumbnail TEXT,
-                    type TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )""")
-    
-    # Video Cache
-    c.execute("""CREATE TABLE IF NOT EXISTS video_cache (
-                    video_id TEXT PRIMARY KEY,
-                    data TEXT,
-                    expires_at DATETIME
-                )""")
-    
-    conn.commit()
-    conn.close()
+    # The shared pool creates the data directory and schema on first use
+    get_pool()
     logger.info("Database initialized")
 
 
@@ -92,6 +55,13 @@ def create_app(config_name=None):
     except Exception as e:
         logger.warning(f"Failed to start background warmer: {e}")
     
+    # Start Cache Janitor (expired rows, size budget, free pages)
+    try:
+        from app.services.janitor import get_cache_janitor
+        get_cache_janitor().start()
+    except Exception as e:
+        logger.warning(f"Failed to start cache janitor: {e}")
+    
     logger.info("KV-Tube app created successfully")
     return app
 
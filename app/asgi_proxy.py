@@ -0,0 +1,273 @@
+"""
+KV-Tube ASGI Streaming Proxy
+Non-blocking /video_proxy for serving many concurrent streams per process
+"""
+import asyncio
+import time
+import logging
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from config import Config
+from app.services.stream_proxy import build_upstream_headers, EXCLUDED_RESPONSE_HEADERS
+from app.services.hls import is_manifest, get_manifest_cache
+from app.services.proxy_tokens import get_proxy_tokens, resolve_proxy_request, TokenLinker
+from app.services.segment_cache import get_segment_cache, stream_key, requested_range, url_range
+
+logger = logging.getLogger(__name__)
+
+# Same CORS headers as the Flask streaming blueprint
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, OPTIONS"),
+    (b"access-control-allow-headers", b"Range, Content-Type"),
+    (b"access-control-expose-headers", b"Content-Length, Content-Range, Accept-Ranges"),
+]
+
+
+class AsyncProxy:
+    """
+    ASGI handler for /video_proxy using httpx's async client
+
+    Mirrors the Flask route: proxy tokens and h_* header overrides, Range
+    forwarding, the segment cache (lookups and tees of relayed bodies), HLS
+    manifest rewriting and CORS. Upstream connections are pooled by the
+    shared AsyncClient, and a stream only holds a coroutine while waiting
+    on I/O, so one process can relay hundreds of streams. SQLite and disk
+    access runs in the default thread pool, off the event loop.
+    """
+
+    def __init__(self, chunk_size: int = None, max_connections: int = None):
+        import httpx  # Optional dependency, only needed in ASGI mode
+
+        self.chunk_size = chunk_size or Config.PROXY_CHUNK_SIZE
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections or Config.ASGI_PROXY_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.PROXY_POOL_MAXSIZE,
+            ),
+            timeout=httpx.Timeout(Config.PROXY_READ_TIMEOUT, connect=Config.PROXY_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'active': 0,
+            'bytes': 0,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] == "OPTIONS":
+            await self._respond(send, 200, b"")
+            return
+
+        loop = asyncio.get_running_loop()
+        args = self._query_args(scope)
+        # Token lookups may read SQLite; keep them off the event loop
+        target, error = await loop.run_in_executor(None, resolve_proxy_request, args)
+        if error:
+            await self._respond(send, error[1], error[0].encode())
+            return
+        url, overrides = target.url, target.headers
+        request_headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        range_header = request_headers.get("range")
+
+        # Serve previously fetched bytes of this video/format from disk
+        segments = get_segment_cache()
+        key = stream_key(url) if Config.SEGMENT_CACHE_BYTES else None
+        wanted = requested_range(url, range_header) if key else None
+        if wanted:
+            hit = await loop.run_in_executor(None, segments.lookup, key, *wanted)
+            if hit:
+                await self._send_cached(hit, bool(range_header) and not url_range(url), receive, send)
+                return
+
+        variant = tuple(sorted(overrides.items()))
+        manifests = get_manifest_cache()
+        cached = manifests.get(url, variant)
+        if cached is not None:
+            await self._respond(send, 200, cached.encode(), b"application/vnd.apple.mpegurl")
+            return
+
+        headers = build_upstream_headers(overrides, range_header)
+
+        self._stats['requests'] += 1
+        started = time.monotonic()
+        try:
+            logger.info(f"Proxying URL (async): {url[:100]}...")
+            upstream = await self._client.send(self._client.build_request("GET", url, headers=headers), stream=True)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Proxy Error: {e}")
+            await self._respond(send, 500, str(e).encode())
+            return
+
+        ttfb = time.monotonic() - started
+        try:
+            if upstream.status_code not in (200, 206):
+                logger.error(f"Upstream Error: {upstream.status_code}")
+
+            content_type = upstream.headers.get("content-type", "")
+            if is_manifest(url, content_type) and upstream.status_code in (200, 206):
+                await upstream.aread()
+                link = TokenLinker(get_proxy_tokens(), overrides, target.video_id)
+                text = await loop.run_in_executor(None, manifests.rewrite_text, upstream.text, url, variant, link)
+                body = text.encode()
+                await self._respond(send, 200, body, b"application/vnd.apple.mpegurl")
+                return
+
+            writer = None
+            if wanted:
+                writer = await loop.run_in_executor(
+                    None, segments.writer_for_response, key, wanted, upstream.status_code, upstream.headers,
+                    bool(url_range(url)),
+                )
+            await self._relay(upstream, receive, send, ttfb, writer)
+        finally:
+            await upstream.aclose()
+
+    @staticmethod
+    def _watch_disconnect(receive) -> Tuple[asyncio.Event, asyncio.Future]:
+        """(event set once the client goes away, the task watching for it)"""
+        disconnected = asyncio.Event()
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        return disconnected, asyncio.ensure_future(watch())
+
+    async def _send_cached(self, hit, partial: bool, receive, send):
+        """Stream a segment cache hit from disk"""
+        loop = asyncio.get_running_loop()
+        headers = [
+            (b"content-type", (hit.content_type or "application/octet-stream").encode("latin-1")),
+            (b"content-length", str(hit.length).encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if partial:
+            headers.append((b"content-range", f"bytes {hit.start}-{hit.end}/{hit.total or '*'}".encode()))
+        disconnected, watcher = self._watch_disconnect(receive)
+        source = await loop.run_in_executor(None, hit.open)
+        try:
+            await send({"type": "http.response.start", "status": 206 if partial else 200,
+                        "headers": headers + CORS_HEADERS})
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(None, source.read, self.chunk_size)
+                if not chunk:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            watcher.cancel()
+            source.close()
+
+    async def _relay(self, upstream, receive, send, ttfb: float, writer=None):
+        """Stream the upstream body until it ends or the client goes away, teeing it into writer"""
+        loop = asyncio.get_running_loop()
+        disconnected, watcher = self._watch_disconnect(receive)
+        self._stats['active'] += 1
+        started = time.monotonic()
+        sent = 0
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": upstream.status_code,
+                "headers": self._relay_headers(upstream.headers.multi_items()) + CORS_HEADERS,
+            })
+            async for chunk in upstream.aiter_bytes(self.chunk_size):
+                if disconnected.is_set():
+                    break
+                if writer is not None:
+                    await loop.run_in_executor(None, writer.write, chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                sent += len(chunk)
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            if writer is not None:
+                await loop.run_in_executor(None, writer.close)
+            self._stats['active'] -= 1
+            self._stats['bytes'] += sent
+            elapsed = time.monotonic() - started
+            rate = sent / elapsed / 1024 / 1024 if elapsed > 0 else 0.0
+            logger.info(
+                f"Proxied {sent} bytes from {urlsplit(str(upstream.url)).netloc}: "
+                f"ttfb={ttfb * 1000:.0f}ms, {rate:.2f} MB/s"
+                f"{' (client aborted)' if disconnected.is_set() else ''}"
+            )
+
+    @staticmethod
+    def _query_args(scope) -> Dict[str, str]:
+        """Query parameters, first value wins (like Flask's request.args)"""
+        args = {}
+        for key, value in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True):
+            args.setdefault(key, value)
+        return args
+
+    @staticmethod
+    def _relay_headers(items: List[Tuple[str, str]]) -> List[Tuple[bytes, bytes]]:
+        return [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in items
+            if name.lower() not in EXCLUDED_RESPONSE_HEADERS
+        ]
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/html; charset=utf-8"):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] + CORS_HEADERS,
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def create_asgi_app(wsgi_app=None):
+    """
+    Build the ASGI application
+
+    Args:
+        wsgi_app: Flask app to serve every path other than /video_proxy
+                  (run in a thread pool). Without it, only the proxy is
+                  served, for running it as a sidecar.
+
+    Returns:
+        ASGI callable
+    """
+    proxy = AsyncProxy()
+    fallback = None
+    if wsgi_app is not None:
+        try:
+            from a2wsgi import WSGIMiddleware
+        except ImportError:
+            from uvicorn.middleware.wsgi import WSGIMiddleware
+        fallback = WSGIMiddleware(wsgi_app)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await proxy.aclose()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["type"] == "http" and scope["path"] == "/video_proxy":
+            await proxy(scope, receive, send)
+        elif fallback is not None:
+            await fallback(scope, receive, send)
+        else:
+            await AsyncProxy._respond(send, 404, b"Not Found")
+
+    app.proxy = proxy
+    return app
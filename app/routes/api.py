@@ -7,42 +7,41 @@ import os
 import sys
 import subprocess
 import json
-import sqlite3
 import re
 import heapq
+import math
 import logging
 import time
 import random
-import concurrent.futures
-import yt_dlp
 from app.services.settings import SettingsService
 from app.services.summarizer import TextRankSummarizer
 from app.services.gemini_summarizer import summarize_with_gemini, extract_key_points_with_gemini
-from app.services.youtube import YouTubeService
+from app.services.youtube import YouTubeService, abandoned_extractions
 from app.services.transcript_service import TranscriptService
+from app.services.extractor_pool import get_extractor_pool
+from app.services.cache import get_shared_cache, HistoryService
+from app.services.singleflight import get_single_flight, flight_key
+from app.services.metadata_store import get_metadata_store, FIELDS as METADATA_FIELDS
+from app.services.hydration import get_hydration_engine
+from app.services.stream_proxy import get_proxy_engine
+from app.services.segment_cache import get_segment_cache
+from app.services.hls import get_manifest_cache
+from app.services.proxy_tokens import get_proxy_tokens
+from app.services.stream_info import get_stream_info as load_stream_info, get_stream_refresher, with_formats
+from app.services.loader_to import LoaderToService, JobPending
+from app.services.hedging import get_hedger
+from app.services.circuit_breaker import get_breaker, breaker_states
+from app.services.outbound import get_outbound_scheduler, outbound_priority, WARMER
+from app.services.executor import get_executor, executor_stats, request_deadline
+from app.services.prefetch import get_stream_prefetcher
+from app.services.janitor import get_cache_janitor
+from config import Config
 
 
 logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Database path
-DATA_DIR = os.environ.get("KVTUBE_DATA_DIR", "data")
-DB_NAME = os.path.join(DATA_DIR, "kvtube.db")
-
-# Caching
-API_CACHE = {}
-CACHE_TIMEOUT = 60  # 1 minute for fresher content
-
-
-
-def get_db_connection():
-    """Get database connection with row factory."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # --- Helper Functions ---
 
 def extractive_summary(text, num_sentences=5):
@@ -87,13 +86,26 @@ def extractive_summary(text, num_sentences=5):
 
 
 def fetch_videos(query, limit=20, filter_type=None, playlist_start=1, playlist_end=None):
-    """Fetch videos from YouTube search using yt_dlp library."""
+    """Fetch videos from YouTube search using yt_dlp library (Cached)."""
+    cache_key = f"{query}|{limit}|{filter_type}|{playlist_start}|{playlist_end}"
+    cached = get_shared_cache().get("search", cache_key)
+    if cached is not None:
+        return cached
+
+    # Calculate optimal search limit
+    search_limit = playlist_end if playlist_end else (playlist_start + limit)
+
+    # Identical concurrent searches (e.g. /api/related for a viral video) share one extraction
+    return get_single_flight().do(
+        flight_key("search", cache_key),
+        lambda: search_videos_uncached(query, cache_key, filter_type, playlist_start, search_limit),
+        peek=lambda: get_shared_cache().get("search", cache_key),
+    )
+
+
+def search_videos_uncached(query, cache_key, filter_type, playlist_start, search_limit):
+    """Run a YouTube search via yt_dlp and store the results under cache_key."""
     try:
-        import yt_dlp
-        
-        # Calculate optimal search limit
-        search_limit = playlist_end if playlist_end else (playlist_start + limit)
-        
         ydl_opts = {
             'headers': {'User-Agent': 'Mozilla/5.0'},
             'skip_download': True,
@@ -109,7 +121,7 @@ def fetch_videos(query, limit=20, filter_type=None, playlist_start=1, playlist_e
         # Note: yt-dlp 'ytsearchN' fetches N items maximum.
         search_query = f"ytsearch{search_limit}:{query}"
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with get_extractor_pool().checkout(ydl_opts) as ydl:
             info = ydl.extract_info(search_query, download=False)
             
             results = []
@@ -158,7 +170,9 @@ def fetch_videos(query, limit=20, filter_type=None, playlist_start=1, playlist_e
                     "upload_date": data.get("upload_date", ""),
                     "duration": duration,
                 })
-                
+            
+            if results:
+                get_shared_cache().set("search", cache_key, results)
             return results
 
     except Exception as e:
@@ -177,12 +191,7 @@ def save_video():
 @api_bp.route("/history")
 def get_history():
     """Get watch history from database."""
-    conn = get_db_connection()
-    rows = conn.execute(
-        'SELECT video_id as id, title, thumbnail FROM user_videos WHERE type = "history" ORDER BY timestamp DESC LIMIT 50'
-    ).fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(HistoryService.get_history(limit=50))
 
 
 @api_bp.route("/suggested")
@@ -202,12 +211,7 @@ def get_suggested():
     # Server-side fallback
     if not history_titles:
         try:
-            conn = get_db_connection()
-            rows = conn.execute(
-                'SELECT title FROM user_videos WHERE type = "history" ORDER BY timestamp DESC LIMIT 5'
-            ).fetchall()
-            conn.close()
-            history_titles = [row['title'] for row in rows]
+            history_titles = [row['title'] for row in HistoryService.get_history(limit=5)]
         except Exception as e:
             logger.debug(f"History fetch failed: {e}")
     
@@ -225,10 +229,10 @@ def get_suggested():
     for channel in history_channels[:2]:
         queries.append(f"{channel} latest videos -shorts")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        results = list(executor.map(lambda q: fetch_videos(q, limit=8, filter_type="video"), queries))
-        for res in results:
-            all_suggestions.extend(res)
+    with request_deadline(Config.FANOUT_DEADLINE):
+        results = get_executor().gather(lambda q: fetch_videos(q, limit=8, filter_type="video"), queries, default=[])
+    for res in results:
+        all_suggestions.extend(res)
     
     unique_vids = {v["id"]: v for v in all_suggestions}.values()
     final_list = list(unique_vids)
@@ -241,20 +245,11 @@ def get_suggested():
 
 
 # --- Caching Helpers ---
-SECTION_CACHE = {}
-CACHE_TTL = 900  # 15 minutes
-
-def get_cached_section(key):
-    """Get data from cache if valid."""
-    if key in SECTION_CACHE:
-        data, timestamp = SECTION_CACHE[key]
-        if time.time() - timestamp < CACHE_TTL:
-            return data
-    return None
 
-def set_cached_section(key, data):
-    """Set data to cache with timestamp."""
-    SECTION_CACHE[key] = (data, time.time())
+def get_cached_section(key, section, loader):
+    """Get a homepage section, serving stale data while it refreshes in the background."""
+    soft_ttl, hard_ttl = Config.SECTION_TTL[section]
+    return get_shared_cache().get_or_refresh("section", key, loader, soft_ttl, hard_ttl)
 
 
 # --- Homepage Section Helpers ---
@@ -267,7 +262,7 @@ def warm_cache_job():
     # Delay slightly to let server start
     time.sleep(5)
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    with outbound_priority(WARMER):
         for region in regions:
             logger.info(f"Warming cache for region: {region}")
             
@@ -288,82 +283,19 @@ def warm_cache_job():
     logger.info("Cache warming complete!")
 
 def start_background_warmer():
-    """Start the cache warmer in a background thread."""
-    import threading
-    warmer_thread = threading.Thread(target=warm_cache_job, daemon=True)
-    warmer_thread.start()
+    """Start the cache warmer on the background pool."""
+    get_executor("background").submit(warm_cache_job)
 
 
-def batch_fetch_metadata(video_ids):
-    """Fetch full metadata for a list of video IDs using yt_dlp library directly."""
-    if not video_ids:
-        return {}
+def batch_fetch_metadata(video_ids, fields=METADATA_FIELDS, deadline=None):
+    """Get metadata for a list of video IDs from the metadata store, fetching only missing/stale ones.
 
-    # Deduplicate and filter
-    valid_ids = list(set([vid for vid in video_ids if vid]))
-    if not valid_ids:
-        return {}
-    
-    logger.info(f"Batch fetching metadata for {len(valid_ids)} videos using yt_dlp library")
-
-    try:
-        import yt_dlp
-    except ImportError:
-        logger.error("yt_dlp library not found in environment.")
-        return {}
-
-    results = {}
-    
-    ydl_opts = {
-        'skip_download': True,
-        'ignoreerrors': True,
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': False,
-    }
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            for vid in valid_ids:
-                try:
-                    url = f"https://www.youtube.com/watch?v={vid}"
-                    info = ydl.extract_info(url, download=False)
-                    
-                    if not info:
-                        continue
-                        
-                    vid_id = info.get("id")
-                    u_date = info.get("upload_date", "MISSING")
-                    
-                    with open("hydration_debug.txt", "a") as f:
-                        f.write(f"Fetched {vid_id}: Date={u_date}\n")
-                    
-                    # Format duration
-                    dur_str = ""
-                    duration_secs = info.get("duration")
-                    if duration_secs:
-                        m, s = divmod(int(duration_secs), 60)
-                        h, m = divmod(m, 60)
-                        dur_str = f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-                    
-                    results[vid_id] = {
-                        "id": vid_id,
-                        "title": info.get("title", "Unknown"),
-                        "thumbnail": info.get("thumbnail") or f"https://i.ytimg.com/vi/{vid_id}/hqdefault.jpg",
-                        "uploader": info.get("uploader") or info.get("channel") or "Unknown",
-                        "view_count": info.get("view_count") or 0,
-                        "duration": dur_str,
-                        "upload_date": info.get("upload_date", ""),
-                    }
-                except Exception as inner_e:
-                    logger.warning(f"Failed to fetch metadata for {vid}: {inner_e}")
-                    continue
-                    
-        return results
-
-    except Exception as e:
-        logger.error(f"Batch metadata fetch failed: {e}")
+    Fetches run on the shared hydration engine; whatever is not back within
+    `deadline` seconds is left out of this response and stored for the next one.
+    """
+    if not video_ids:
         return {}
+    return get_metadata_store().get_many(video_ids, fields=fields, deadline=deadline)
 
 
 def get_history_videos(video_ids):
@@ -376,7 +308,7 @@ def get_history_videos(video_ids):
     if not target_ids:
         return []
 
-    metadata_map = batch_fetch_metadata(target_ids)
+    metadata_map = batch_fetch_metadata(target_ids, fields=("title", "uploader", "duration"))
     
     videos = []
     for vid_id in target_ids:
@@ -399,7 +331,7 @@ def get_history_videos(video_ids):
 
 
 def fetch_subscription_videos(channel_ids, limit=16):
-    """Fetch latest videos from subscribed channels."""
+    """Fetch latest videos from subscribed channels (Cached per channel)."""
     if not channel_ids or not channel_ids[0]:
         return []
     
@@ -409,6 +341,9 @@ def fetch_subscription_videos(channel_ids, limit=16):
     channels_to_fetch = [c for c in channel_ids[:4] if c]
     
     def fetch_channel(channel_id):
+        cached = get_shared_cache().get("channel", f"latest_{channel_id}")
+        if cached is not None:
+            return cached
         try:
             suffix = "videos"
             if channel_id.startswith("UC"):
@@ -418,47 +353,32 @@ def fetch_subscription_videos(channel_ids, limit=16):
             else:
                 url = f"https://www.youtube.com/channel/{channel_id}/{suffix}"
             
-            cmd = [
-                sys.executable, "-m", "yt_dlp",
-                url,
-                "--dump-json",
-                "--flat-playlist",
-                "--playlist-end", "4",
-                "--no-warnings",
-            ]
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            stdout, _ = proc.communicate(timeout=15)
-            
             videos = []
-            for line in stdout.splitlines():
-                try:
-                    v = json.loads(line)
-                    dur_str = None
-                    if v.get("duration"):
-                        m, s = divmod(int(v["duration"]), 60)
-                        h, m = divmod(m, 60)
-                        dur_str = f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-                    
-                    videos.append({
-                        "id": v.get("id"),
-                        "title": v.get("title", "Unknown"),
-                        "thumbnail": f"https://i.ytimg.com/vi/{v.get('id')}/mqdefault.jpg",
-                        "view_count": v.get("view_count") or 0,
-                        "duration": dur_str,
-                        "upload_date": v.get("upload_date"),
-                        "uploader": v.get("uploader") or v.get("channel") or "",
-                    })
-                except json.JSONDecodeError:
-                    continue
+            for v in YouTubeService.get_playlist_entries(url, limit=4, timeout=15):
+                dur_str = None
+                if v.get("duration"):
+                    m, s = divmod(int(v["duration"]), 60)
+                    h, m = divmod(m, 60)
+                    dur_str = f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+                
+                videos.append({
+                    "id": v.get("id"),
+                    "title": v.get("title", "Unknown"),
+                    "thumbnail": f"https://i.ytimg.com/vi/{v.get('id')}/mqdefault.jpg",
+                    "view_count": v.get("view_count") or 0,
+                    "duration": dur_str,
+                    "upload_date": v.get("upload_date"),
+                    "uploader": v.get("uploader") or v.get("channel") or "",
+                })
+            if videos:
+                get_shared_cache().set("channel", f"latest_{channel_id}", videos)
             return videos
         except Exception as e:
             logger.debug(f"Error fetching channel {channel_id}: {e}")
             return []
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        results = list(executor.map(fetch_channel, channels_to_fetch))
-        for res in results:
-            all_videos.extend(res)
+    for res in get_executor().gather(fetch_channel, channels_to_fetch, default=[]):
+        all_videos.extend(res)
     
     # Deduplicate and shuffle
     unique = {v["id"]: v for v in all_videos if v.get("id")}.values()
@@ -469,11 +389,14 @@ def fetch_subscription_videos(channel_ids, limit=16):
 
 def fetch_recommended(region, limit=16):
     """Fetch recommended videos based on general popularity (Cached)."""
-    cache_key = f"recommended_{region}_{limit}"
-    cached = get_cached_section(cache_key)
-    if cached:
-        return cached
+    return get_cached_section(
+        f"recommended_{region}_{limit}", "recommended",
+        lambda: build_recommended(region, limit)
+    )
+
 
+def build_recommended(region, limit=16):
+    """Build the recommended section from a few popular searches."""
     query_pool = [
         "popular videos 2025",
         "viral videos this week",
@@ -490,31 +413,27 @@ def fetch_recommended(region, limit=16):
     queries = [q + region_suffix for q in selected]
     
     all_videos = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        results = list(executor.map(
-            lambda q: fetch_videos(q, limit=8, filter_type="video"),
-            queries
-        ))
-        for res in results:
-            all_videos.extend(res)
+    for res in get_executor().gather(lambda q: fetch_videos(q, limit=8, filter_type="video"), queries, default=[]):
+        all_videos.extend(res)
     
     # Deduplicate and shuffle
     unique = {v["id"]: v for v in all_videos if v.get("id")}.values()
     result = list(unique)
     random.shuffle(result)
     
-    final_data = result[:limit]
-    set_cached_section(cache_key, final_data)
-    return final_data
+    return result[:limit]
 
 
 def fetch_trending_fresh(region, limit=16):
     """Fetch trending with randomization for variety on each refresh (Cached)."""
-    cache_key = f"trending_{region}_{limit}"
-    cached = get_cached_section(cache_key)
-    if cached:
-        return cached
+    return get_cached_section(
+        f"trending_{region}_{limit}", "trending",
+        lambda: build_trending(region, limit)
+    )
+
 
+def build_trending(region, limit=16):
+    """Build the trending section from randomly picked trending searches."""
     query_pool = [
         "trending videos 2025",
         "viral videos today",
@@ -532,22 +451,15 @@ def fetch_trending_fresh(region, limit=16):
     queries = [q + region_suffix for q in selected]
     
     all_videos = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        results = list(executor.map(
-            lambda q: fetch_videos(q, limit=8, filter_type="video"),
-            queries
-        ))
-        for res in results:
-            all_videos.extend(res)
+    for res in get_executor().gather(lambda q: fetch_videos(q, limit=8, filter_type="video"), queries, default=[]):
+        all_videos.extend(res)
     
     # Deduplicate and shuffle
     unique = {v["id"]: v for v in all_videos if v.get("id")}.values()
     result = list(unique)
     random.shuffle(result)
     
-    final_data = result[:limit]
-    set_cached_section(cache_key, final_data)
-    return final_data
+    return result[:limit]
 
 
 @api_bp.route("/homepage")
@@ -592,10 +504,12 @@ def get_homepage():
                     for channel in history_channels[:2]:
                         queries.append(f"{channel} latest videos -shorts")
                     
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                        results = list(executor.map(lambda q: fetch_videos(q, limit=6, filter_type="video"), queries))
-                        for res in results:
-                            suggested.extend(res)
+                    # Runs on a pool worker itself; gather() is safe to nest
+                    results = get_executor().gather(
+                        lambda q: fetch_videos(q, limit=6, filter_type="video"), queries, default=[]
+                    )
+                    for res in results:
+                        suggested.extend(res)
                     
                     unique = {v["id"]: v for v in suggested if v.get("id")}.values()
                     suggested_list = list(unique)
@@ -661,26 +575,18 @@ def get_homepage():
                     }
                 return None
 
-            # Execute in parallel
-            with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
-                futures = {
-                    executor.submit(get_continue_watching): "continue_watching",
-                    executor.submit(get_suggested): "suggested",
-                    executor.submit(get_subscriptions): "subscriptions",
-                    executor.submit(get_recommended): "recommended",
-                    executor.submit(get_trending): "trending",
-                    executor.submit(get_music): "music",
-                    executor.submit(get_tech): "tech"
-                }
-                
-                results_map = {}
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        res = future.result()
-                        if res:
-                            results_map[res["id"]] = res
-                    except Exception as e:
-                        logger.error(f"Error fetching section {futures[future]}: {e}")
+            # Execute in parallel; sections not ready by the deadline are left out
+            section_builders = [
+                get_continue_watching, get_suggested, get_subscriptions,
+                get_recommended, get_trending, get_music, get_tech,
+            ]
+            with request_deadline(Config.FANOUT_DEADLINE):
+                results = get_executor().gather(lambda build: build(), section_builders)
+            
+            results_map = {}
+            for res in results:
+                if res:
+                    results_map[res["id"]] = res
 
             # Assemble sections in specific order
             order = ["continue_watching", "suggested", "subscriptions", "recommended", "music", "tech", "trending"]
@@ -751,7 +657,7 @@ def get_trending():
     # Simple hydration check for the first few to ensure date display
     if videos:
          ids = [v['id'] for v in videos[:5]]
-         meta = batch_fetch_metadata(ids)
+         meta = batch_fetch_metadata(ids, fields=("upload_date",))
          for v in videos:
              if v['id'] in meta and meta[v['id']].get('upload_date'):
                  v['upload_date'] = meta[v['id']]['upload_date']
@@ -779,11 +685,15 @@ def get_related_videos():
         topic_query = f"{title} related" if title else f"{video_id} related"
         channel_query = uploader if uploader else topic_query
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            future_topic = executor.submit(fetch_videos, topic_query, limit=topic_limit, playlist_start=start + 1)
-            future_channel = executor.submit(fetch_videos, channel_query, limit=channel_limit, playlist_start=start + 1)
-            topic_videos = future_topic.result()
-            channel_videos = future_channel.result()
+        with request_deadline(Config.FANOUT_DEADLINE):
+            topic_videos, channel_videos = get_executor().gather(
+                lambda fetch: fetch(),
+                [
+                    lambda: fetch_videos(topic_query, limit=topic_limit, playlist_start=start + 1),
+                    lambda: fetch_videos(channel_query, limit=channel_limit, playlist_start=start + 1),
+                ],
+                default=[],
+            )
 
         combined = channel_videos + topic_videos
         
@@ -802,7 +712,7 @@ def get_related_videos():
         # Hydration
         ids_to_hydrate = [v['id'] for v in unique_videos[:12]]
         if ids_to_hydrate:
-            metadata_map = batch_fetch_metadata(ids_to_hydrate)
+            metadata_map = batch_fetch_metadata(ids_to_hydrate, fields=("upload_date", "view_count", "duration"))
             for video in unique_videos:
                 if video['id'] in metadata_map:
                     meta = metadata_map[video['id']]
@@ -812,6 +722,9 @@ def get_related_videos():
                     if meta.get("duration"):
                          video["duration"] = meta["duration"]
 
+        # The next click is usually one of these; have its stream ready
+        get_stream_prefetcher().schedule(v['id'] for v in unique_videos)
+
         return jsonify(unique_videos)
     except Exception as e:
         logger.error(f"Error fetching related: {e}")
@@ -827,38 +740,33 @@ def get_download_url():
 
     try:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        ydl_opts = {
-            "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best[protocol!*=m3u8]/best",
-            "noplaylist": True,
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-            "youtube_include_dash_manifest": False,
-            "youtube_include_hls_manifest": False,
-        }
+        data, _ = load_stream_info(video_id, remote_wait=remote_wait())
+        if not data:
+            return jsonify({"error": "Failed to fetch video info from all engines"}), 500
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            download_url = info.get("url", "")
-
-            if ".m3u8" in download_url or not download_url:
-                formats = info.get("formats", [])
-                for f in reversed(formats):
-                    f_url = f.get("url", "")
-                    if f_url and "m3u8" not in f_url and f.get("ext") == "mp4":
-                        download_url = f_url
-                        break
+        # Best MP4 with audio, else the playback URL, else any MP4
+        formats = data.get("formats", [])
+        combined = [f for f in formats if f["ext"] == "mp4" and f["vcodec"] != "none" and f["acodec"] != "none"]
+        download_url = combined[-1]["url"] if combined else data.get("original_url", "")
 
-            title = info.get("title", "video")
+        if ".m3u8" in download_url or not download_url:
+            for f in reversed(formats):
+                if f["ext"] == "mp4":
+                    download_url = f["url"]
+                    break
 
-            if download_url and ".m3u8" not in download_url:
-                return jsonify({"url": download_url, "title": title, "ext": "mp4"})
-            else:
-                return jsonify({
-                    "error": "Direct download not available. Try a video downloader site.",
-                    "fallback_url": url,
-                }), 200
+        title = data.get("title", "video")
 
+        if download_url and ".m3u8" not in download_url:
+            return jsonify({"url": download_url, "title": title, "ext": "mp4"})
+        else:
+            return jsonify({
+                "error": "Direct download not available. Try a video downloader site.",
+                "fallback_url": url,
+            }), 200
+
+    except JobPending as e:
+        return pending_response(video_id, e.job)
     except Exception as e:
         logger.error(f"Download URL error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -872,99 +780,128 @@ def get_download_formats():
         return jsonify({"success": False, "error": "No video ID"}), 400
 
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        ydl_opts = {
-            "format": "best",
-            "noplaylist": True,
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-            "youtube_include_dash_manifest": False,
-            "youtube_include_hls_manifest": False,
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            title = info.get("title", "Unknown")
-            duration = info.get("duration", 0)
-            thumbnail = info.get("thumbnail", "")
-
-            video_formats = []
-            audio_formats = []
+        data, _ = load_stream_info(video_id, remote_wait=remote_wait())
+        if not data:
+            return jsonify({"success": False, "error": "Failed to fetch video info from all engines"}), 500
+        data = with_formats(video_id, data)
+        if not data.get("formats"):
+            return formats_unavailable(video_id)
+        title = data.get("title", "Unknown")
+        duration = data.get("duration") or 0
+        thumbnail = data.get("thumbnail", "")
+
+        video_formats = []
+        audio_formats = []
+        
+        for f in data.get("formats", []):
+            f_url = f["url"]
+            f_ext = f["ext"]
+            quality = f["note"] or "Unknown"
+            f_filesize = f["size"]
             
-            for f in info.get("formats", []):
-                f_url = f.get("url", "")
-                if not f_url or "m3u8" in f_url:
-                    continue
-                    
-                f_ext = f.get("ext", "")
-                quality = f.get("format_note", "") or f.get("format", "") or "Unknown"
-                f_filesize = f.get("filesize", 0) or f.get("filesize_approx", 0)
+            size_str = ""
+            if f_filesize:
+                if f_filesize > 1024**3:
+                    size_str = f"{f_filesize / 1024**3:.1f} GB"
+                elif f_filesize > 1024**2:
+                    size_str = f"{f_filesize / 1024**2:.1f} MB"
+                elif f_filesize > 1024:
+                    size_str = f"{f_filesize / 1024:.1f} KB"
+
+            if f_ext in ["mp4", "webm"]:
+                vcodec = f["vcodec"]
+                acodec = f["acodec"]
                 
-                size_str = ""
-                if f_filesize:
-                    if f_filesize > 1024**3:
-                        size_str = f"{f_filesize / 1024**3:.1f} GB"
-                    elif f_filesize > 1024**2:
-                        size_str = f"{f_filesize / 1024**2:.1f} MB"
-                    elif f_filesize > 1024:
-                        size_str = f"{f_filesize / 1024:.1f} KB"
-
-                if f_ext in ["mp4", "webm"]:
-                    vcodec = f.get("vcodec", "none")
-                    acodec = f.get("acodec", "none")
-                    
-                    if vcodec != "none" and acodec != "none":
-                        video_formats.append({
-                            "quality": f"{quality} (with audio)",
-                            "ext": f_ext,
-                            "size": size_str,
-                            "url": f_url,
-                            "type": "combined",
-                            "has_audio": True,
-                        })
-                    elif vcodec != "none":
-                        video_formats.append({
-                            "quality": quality,
-                            "ext": f_ext,
-                            "size": size_str,
-                            "url": f_url,
-                            "type": "video",
-                            "has_audio": False,
-                        })
-                    elif acodec != "none":
-                        audio_formats.append({
-                            "quality": quality,
-                            "ext": f_ext,
-                            "size": size_str,
-                            "url": f_url,
-                            "type": "audio",
-                        })
-
-            def parse_quality(f):
-                q = f["quality"].lower()
-                for i, res in enumerate(["4k", "2160", "1080", "720", "480", "360", "240", "144"]):
-                    if res in q:
-                        return i
-                return 99
-
-            video_formats.sort(key=parse_quality)
-            audio_formats.sort(key=parse_quality)
+                if vcodec != "none" and acodec != "none":
+                    video_formats.append({
+                        "quality": f"{quality} (with audio)",
+                        "ext": f_ext,
+                        "size": size_str,
+                        "url": f_url,
+                        "type": "combined",
+                        "has_audio": True,
+                    })
+                elif vcodec != "none":
+                    video_formats.append({
+                        "quality": quality,
+                        "ext": f_ext,
+                        "size": size_str,
+                        "url": f_url,
+                        "type": "video",
+                        "has_audio": False,
+                    })
+                elif acodec != "none":
+                    audio_formats.append({
+                        "quality": quality,
+                        "ext": f_ext,
+                        "size": size_str,
+                        "url": f_url,
+                        "type": "audio",
+                    })
 
-            return jsonify({
-                "success": True,
-                "video_id": video_id,
-                "title": title,
-                "duration": duration,
-                "thumbnail": thumbnail,
-                "formats": {"video": video_formats[:10], "audio": audio_formats[:5]},
-            })
+        def parse_quality(f):
+            q = f["quality"].lower()
+            for i, res in enumerate(["4k", "2160", "1080", "720", "480", "360", "240", "144"]):
+                if res in q:
+                    return i
+            return 99
 
+        video_formats.sort(key=parse_quality)
+        audio_formats.sort(key=parse_quality)
+
+        return jsonify({
+            "success": True,
+            "video_id": video_id,
+            "title": title,
+            "duration": duration,
+            "thumbnail": thumbnail,
+            "formats": {"video": video_formats[:10], "audio": audio_formats[:5]},
+        })
+
+    except JobPending as e:
+        return pending_response(video_id, e.job)
     except Exception as e:
         logger.error(f"Download formats error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def with_proxy_link(video_id, data):
+    """Client copy of cached stream info: proxy headers replaced by a /video_proxy?t= link."""
+    data = dict(data)
+    headers = data.pop("proxy_headers", {})
+    # Direct format URLs are served through /stream/qualities and /download
+    data.pop("formats", None)
+    data["stream_url"] = get_proxy_tokens().link(data["original_url"], headers, video_id=video_id)
+    return data
+
+
+def remote_wait():
+    """Seconds a request may wait on the remote engine (?wait=, capped)."""
+    try:
+        wait = float(request.args.get("wait", Config.LOADER_TO_REQUEST_WAIT))
+    except ValueError:
+        wait = Config.LOADER_TO_REQUEST_WAIT
+    return min(max(wait, 0), Config.LOADER_TO_MAX_WAIT)
+
+
+def formats_unavailable(video_id):
+    """503 when only the remote engine could resolve a video: it reports no format list."""
+    return jsonify({
+        "success": False,
+        "video_id": video_id,
+        "error": "Formats unavailable: the video was resolved by the remote engine",
+    }), 503
+
+
+def pending_response(video_id, job):
+    """202 for a video the remote engine is still fetching; the client retries the same URL."""
+    retry_after = max(1, math.ceil(job.retry_after()))
+    response = jsonify({"status": "pending", "video_id": video_id, **job.to_dict(), "retry_after": retry_after})
+    response.status_code = 202
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
 @api_bp.route("/get_stream_info")
 def get_stream_info():
     """Get video stream info with caching."""
@@ -973,78 +910,16 @@ def get_stream_info():
         return jsonify({"error": "No video ID"}), 400
 
     try:
-        conn = get_db_connection()
-        cached = conn.execute(
-            "SELECT data, expires_at FROM video_cache WHERE video_id = ?", (video_id,)
-        ).fetchone()
-
-        current_time = time.time()
-        if cached:
-            try:
-                expires_at = float(cached["expires_at"])
-                if current_time < expires_at:
-                    data = json.loads(cached["data"])
-                    conn.close()
-                    from urllib.parse import quote
-                    proxied_url = f"/video_proxy?url={quote(data['original_url'], safe='')}"
-                    data["stream_url"] = proxied_url
-                    response = jsonify(data)
-                    response.headers["X-Cache"] = "HIT"
-                    return response
-            except (ValueError, KeyError):
-                pass
-
-        # Use YouTubeService which handles failover (Local -> Remote)
-        info = YouTubeService.get_video_info(video_id)
-        
-        if not info:
+        data, hit = load_stream_info(video_id, remote_wait=remote_wait())
+        if not data:
              return jsonify({"error": "Failed to fetch video info from all engines"}), 500
 
-        stream_url = info.get("stream_url")
-        if not stream_url:
-            return jsonify({"error": "No stream URL found"}), 500
-
-        response_data = {
-            "original_url": stream_url,
-            "title": info.get("title", "Unknown"),
-            "description": info.get("description", ""),
-            "uploader": info.get("uploader", ""),
-            "uploader_id": info.get("uploader_id", ""),
-            "channel_id": info.get("channel_id", ""),
-            "upload_date": info.get("upload_date", ""),
-            "view_count": info.get("view_count", 0),
-            "subtitle_url": info.get("subtitle_url"),
-            "related": [],
-        }
-
-        from urllib.parse import quote
-        
-        # Encode headers into the proxy URL
-        http_headers = info.get("http_headers", {})
-        header_params = ""
-        for k, v in http_headers.items():
-             # Only pass critical headers that might affect access
-             if k.lower() in ['user-agent', 'cookie', 'referer', 'origin']:
-                header_params += f"&h_{quote(k)}={quote(v)}"
-        
-        proxied_url = f"/video_proxy?url={quote(stream_url, safe='')}{header_params}"
-        response_data["stream_url"] = proxied_url
-        
-
-
-        # Cache it
-        expiry = current_time + 3600
-        conn.execute(
-            "INSERT OR REPLACE INTO video_cache (video_id, data, expires_at) VALUES (?, ?, ?)",
-            (video_id, json.dumps(response_data), expiry),
-        )
-        conn.commit()
-        conn.close()
-
-        response = jsonify(response_data)
-        response.headers["X-Cache"] = "MISS"
+        response = jsonify(with_proxy_link(video_id, data))
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
         return response
 
+    except JobPending as e:
+        return pending_response(video_id, e.job)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1057,89 +932,76 @@ def get_stream_qualities():
         return jsonify({"success": False, "error": "No video ID"}), 400
 
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        ydl_opts = {
-            "format": "best",
-            "noplaylist": True,
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-            "youtube_include_dash_manifest": False,
-            "youtube_include_hls_manifest": False,
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        data, _ = load_stream_info(video_id, remote_wait=remote_wait())
+        if not data:
+            return jsonify({"success": False, "error": "Failed to fetch video info from all engines"}), 500
+        data = with_formats(video_id, data)
+        if not data.get("formats"):
+            return formats_unavailable(video_id)
+
+        qualities = []
+        seen_resolutions = set()
+        tokens = get_proxy_tokens()
+        headers = data.get("proxy_headers", {})
+        
+        for f in data.get("formats", []):
+            # Only include formats with both video and audio (progressive)
+            if f["vcodec"] == "none" or f["acodec"] == "none":
+                continue
             
-            qualities = []
-            seen_resolutions = set()
+            f_ext = f["ext"]
+            if f_ext not in ["mp4", "webm"]:
+                continue
             
-            # Sort formats by quality (highest first)
-            formats = info.get("formats", [])
+            # Get resolution label
+            height = f["height"]
             
-            for f in formats:
-                f_url = f.get("url", "")
-                if not f_url or "m3u8" in f_url:
-                    continue
-                
-                # Only include formats with both video and audio (progressive)
-                vcodec = f.get("vcodec", "none")
-                acodec = f.get("acodec", "none")
-                
-                if vcodec == "none" or acodec == "none":
-                    continue
-                
-                f_ext = f.get("ext", "")
-                if f_ext not in ["mp4", "webm"]:
-                    continue
-                
-                # Get resolution label
-                height = f.get("height", 0)
-                format_note = f.get("format_note", "")
-                
-                if height:
-                    label = f"{height}p"
-                elif format_note:
-                    label = format_note
-                else:
-                    continue
-                
-                # Skip duplicates
-                if label in seen_resolutions:
-                    continue
-                seen_resolutions.add(label)
-                
-                # Create proxied URL
-                from urllib.parse import quote
-                proxied_url = f"/video_proxy?url={quote(f_url, safe='')}"
-                
-                qualities.append({
-                    "label": label,
-                    "height": height,
-                    "url": proxied_url,
-                    "ext": f_ext,
-                })
+            if height:
+                label = f"{height}p"
+            elif f["note"]:
+                label = f["note"]
+            else:
+                continue
             
-            # Sort by height descending (best first)
-            qualities.sort(key=lambda x: x.get("height", 0), reverse=True)
+            # Skip duplicates
+            if label in seen_resolutions:
+                continue
+            seen_resolutions.add(label)
             
-            # Add "Auto" option at the beginning (uses best available)
-            if qualities:
-                auto_quality = {
-                    "label": "Auto",
-                    "height": 9999,  # Highest priority
-                    "url": qualities[0]["url"],  # Use best quality
-                    "ext": qualities[0]["ext"],
-                    "default": True,
-                }
-                qualities.insert(0, auto_quality)
+            # Create proxied URL
+            proxied_url = tokens.link(f["url"], headers, flush=False, video_id=video_id)
             
-            return jsonify({
-                "success": True,
-                "video_id": video_id,
-                "qualities": qualities[:8],  # Limit to 8 options
+            qualities.append({
+                "label": label,
+                "height": height,
+                "url": proxied_url,
+                "ext": f_ext,
             })
+        
+        tokens.flush()
 
+        # Sort by height descending (best first)
+        qualities.sort(key=lambda x: x.get("height", 0), reverse=True)
+        
+        # Add "Auto" option at the beginning (uses best available)
+        if qualities:
+            auto_quality = {
+                "label": "Auto",
+                "height": 9999,  # Highest priority
+                "url": qualities[0]["url"],  # Use best quality
+                "ext": qualities[0]["ext"],
+                "default": True,
+            }
+            qualities.insert(0, auto_quality)
+        
+        return jsonify({
+            "success": True,
+            "video_id": video_id,
+            "qualities": qualities[:8],  # Limit to 8 options
+        })
+
+    except JobPending as e:
+        return pending_response(video_id, e.job)
     except Exception as e:
         logger.error(f"Stream qualities error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1164,7 +1026,7 @@ def search():
                 "noplaylist": True,
                 "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
             }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
                 info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
                 return jsonify([{
                     "id": video_id,
@@ -1193,6 +1055,11 @@ def get_channel_videos_simple():
     if not channel_id:
         return jsonify({"error": "No channel ID provided"}), 400
 
+    cache_key = f"{channel_id}_{filter_type}"
+    cached = get_shared_cache().get("channel", cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     try:
         # Construct URL
         suffix = "shorts" if filter_type == "shorts" else "videos"
@@ -1204,42 +1071,31 @@ def get_channel_videos_simple():
         else:
             url = f"https://www.youtube.com/channel/{channel_id}/{suffix}"
 
-        cmd = [
-            sys.executable, "-m", "yt_dlp",
-            url,
-            "--dump-json",
-            "--flat-playlist",
-            "--playlist-end", "20",
-            "--no-warnings",
-        ]
-
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, stderr = proc.communicate()
-
         videos = []
-        for line in stdout.splitlines():
-            try:
-                v = json.loads(line)
-                dur_str = None
-                if v.get("duration"):
-                    m, s = divmod(int(v["duration"]), 60)
-                    h, m = divmod(m, 60)
-                    dur_str = f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+        for v in YouTubeService.get_playlist_entries(url, limit=20):
+            dur_str = None
+            if v.get("duration"):
+                m, s = divmod(int(v["duration"]), 60)
+                h, m = divmod(m, 60)
+                dur_str = f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
 
-                videos.append({
-                    "id": v.get("id"),
-                    "title": v.get("title"),
-                    "thumbnail": f"https://i.ytimg.com/vi/{v.get('id')}/mqdefault.jpg",
-                    "view_count": v.get("view_count") or 0,
-                    "duration": dur_str,
-                    "upload_date": v.get("upload_date"),
-                    "uploader": v.get("uploader") or v.get("channel") or "",
-                })
-            except json.JSONDecodeError:
-                continue
+            videos.append({
+                "id": v.get("id"),
+                "title": v.get("title"),
+                "thumbnail": f"https://i.ytimg.com/vi/{v.get('id')}/mqdefault.jpg",
+                "view_count": v.get("view_count") or 0,
+                "duration": dur_str,
+                "upload_date": v.get("upload_date"),
+                "uploader": v.get("uploader") or v.get("channel") or "",
+            })
 
+        if videos:
+            get_shared_cache().set("channel", cache_key, videos)
         return jsonify(videos)
 
+    except TimeoutError as e:
+        logger.warning(f"Channel Fetch Timeout: {e}")
+        return jsonify({"error": "Channel loading timed out"}), 504
     except Exception as e:
         logger.error(f"Channel Fetch Error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1258,10 +1114,9 @@ def trending():
     cache_key = f"trending_{category}_{page}_{sort}_{region}"
     
     # Check cache
-    if cache_key in API_CACHE:
-        cached_time, cached_data = API_CACHE[cache_key]
-        if time.time() - cached_time < CACHE_TIMEOUT:
-            return jsonify(cached_data)
+    cached = get_shared_cache().get("trending", cache_key)
+    if cached is not None:
+        return jsonify(cached)
     
     try:
         # Category search queries
@@ -1295,12 +1150,11 @@ def trending():
             start_offset = ((page - 1) // len(query_sets)) * 7 + 1
             
             # Fetch from multiple categories in parallel
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                futures = [
-                    executor.submit(fetch_videos, q, limit=7, filter_type="video", playlist_start=start_offset)
-                    for q in current_queries
-                ]
-                results = [f.result() for f in futures]
+            with request_deadline(Config.FANOUT_DEADLINE):
+                results = get_executor().gather(
+                    lambda q: fetch_videos(q, limit=7, filter_type="video", playlist_start=start_offset),
+                    current_queries, default=[]
+                )
             
             # Combine all videos and deduplicate
             all_videos = []
@@ -1316,7 +1170,7 @@ def trending():
             random.shuffle(all_videos)
             
             # Cache result
-            API_CACHE[cache_key] = (time.time(), all_videos)
+            get_shared_cache().set("trending", cache_key, all_videos)
             return jsonify(all_videos)
         
         # Single category - support proper pagination
@@ -1327,7 +1181,7 @@ def trending():
         videos = fetch_videos(query, limit=20, filter_type="video", playlist_start=(page-1)*20+1)
         
         # Cache result
-        API_CACHE[cache_key] = (time.time(), videos)
+        get_shared_cache().set("trending", cache_key, videos)
         
         return jsonify(videos)
         
@@ -1344,24 +1198,8 @@ def get_transcript():
 
     try:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        # Use yt-dlp to get subtitles
-        cmd = [
-            sys.executable, "-m", "yt_dlp",
-            url,
-            "--write-auto-sub",
-            "--sub-lang", "en,vi",
-            "--skip-download",
-            "--no-warnings",
-            "--quiet",
-            "--sub-format", "vtt",
-            "--output", "CAPTIONS_%(id)s"
-        ]
-        
-        # We need to run this in a temp dir or handle output names
-        # Simplified: fetch info and get subtitle URL
-        
-        # Better approach: Get subtitle URL from extract_info
-        with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
+        # Get subtitle URL from extract_info
+        with get_extractor_pool().checkout({'quiet': True, 'skip_download': True}) as ydl:
             info = ydl.extract_info(url, download=False)
             subtitles = info.get('subtitles') or info.get('automatic_captions') or {}
             
@@ -1500,7 +1338,7 @@ def get_transcript_text(video_id):
             'subtitlesformat': 'json3/vtt/best', # Prefer json3 for parsing, then vtt
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with get_extractor_pool().checkout(ydl_opts) as ydl:
             # This will download the subtitle file to /tmp/
             ydl.download([f"https://www.youtube.com/watch?v={video_id}"])
             
@@ -1670,37 +1508,22 @@ def get_comments():
         return jsonify({"error": "No video ID"}), 400
 
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        cmd = [
-            sys.executable, "-m", "yt_dlp",
-            url,
-            "--write-comments",
-            "--skip-download",
-            "--dump-json",
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            comments_data = data.get("comments", [])
-
-            comments = []
-            for c in comments_data[:50]:
-                comments.append({
-                    "author": c.get("author", "Unknown"),
-                    "author_thumbnail": c.get("author_thumbnail", ""),
-                    "text": c.get("text", ""),
-                    "likes": c.get("like_count", 0),
-                    "time": c.get("time_text", ""),
-                    "is_pinned": c.get("is_pinned", False),
-                })
+        data = YouTubeService.get_comments(video_id, limit=50, timeout=30)
+
+        comments = []
+        for c in data["comments"]:
+            comments.append({
+                "author": c.get("author", "Unknown"),
+                "author_thumbnail": c.get("author_thumbnail", ""),
+                "text": c.get("text", ""),
+                "likes": c.get("like_count", 0),
+                "time": c.get("time_text", ""),
+                "is_pinned": c.get("is_pinned", False),
+            })
 
-            return jsonify({"comments": comments, "count": data.get("comment_count", len(comments))})
-        else:
-            return jsonify({"comments": [], "count": 0, "error": "Could not load comments"})
+        return jsonify({"comments": comments, "count": data["comment_count"]})
 
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         return jsonify({"comments": [], "count": 0, "error": "Comments loading timed out"})
     except Exception as e:
         return jsonify({"comments": [], "count": 0, "error": str(e)})
@@ -1708,6 +1531,30 @@ def get_comments():
 
 
 
+@api_bp.route("/metrics")
+def get_metrics():
+    """Get internal service metrics."""
+    return jsonify({
+        "extractor_pool": get_extractor_pool().stats(),
+        "shared_cache": get_shared_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+        "hydration": get_hydration_engine().stats(),
+        "stream_proxy": get_proxy_engine().stats(),
+        "segment_cache": get_segment_cache().stats(),
+        "hls_manifests": get_manifest_cache().stats(),
+        "proxy_tokens": get_proxy_tokens().stats(),
+        "stream_refresher": get_stream_refresher().stats(),
+        "prefetch": get_stream_prefetcher().stats(),
+        "cache_janitor": get_cache_janitor().stats(),
+        "loader_to": LoaderToService.jobs().stats(),
+        "hedging": get_hedger().stats(),
+        "circuit_breakers": breaker_states(),
+        "outbound": get_outbound_scheduler().stats(),
+        "executors": executor_stats(),
+        "abandoned_extractions": abandoned_extractions(),
+    })
+
+
 @api_bp.route("/settings", methods=["GET"])
 def get_settings():
     """Get all settings."""
@@ -1765,21 +1612,29 @@ def test_engine():
         # Force a fresh fetch ignoring cache logic if possible
         # We just call get_video_info which uses the current SettingsService engine
         info = YouTubeService.get_video_info(TEST_VID)
+        engine = SettingsService.get('youtube_engine', 'auto')
         
         if info and info.get('stream_url'):
              return jsonify({
                  "success": True, 
-                 "message": f"Successfully fetched via {SettingsService.get('youtube_engine', 'auto')}",
+                 "message": f"Successfully fetched via {engine}",
                  "details": {
                      "title": info.get('title'),
-                     "engine": SettingsService.get('youtube_engine', 'auto')
-                 }
+                     "engine": engine
+                 },
+                 "engines": engine_states(),
              })
         else:
             return jsonify({
                 "success": False, 
-                "message": "Fetch returned no data"
+                "message": "Fetch returned no data",
+                "engines": engine_states(),
             })
             
     except Exception as e:
-        return jsonify({"success": False, "message": str(e)})
+        return jsonify({"success": False, "message": str(e), "engines": engine_states()})
+
+
+def engine_states():
+    """Circuit breaker state of each extraction engine."""
+    return {engine: get_breaker(engine).stats() for engine in ("local", "remote")}
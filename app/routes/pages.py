@@ -62,10 +62,8 @@ def watch():
 @pages_bp.route("/channel/<channel_id>")
 def channel(channel_id):
     """Channel page with videos list."""
-    import sys
-    import subprocess
-    import json
     import logging
+    from app.services.youtube import YouTubeService
     
     logger = logging.getLogger(__name__)
     
@@ -83,23 +81,12 @@ def channel(channel_id):
             real_id_or_url = channel_id[1:]
 
         if not real_id_or_url.startswith("UC") and not real_id_or_url.startswith("@"):
-            search_cmd = [
-                sys.executable,
-                "-m",
-                "yt_dlp",
-                f"ytsearch1:{channel_id}",
-                "--dump-json",
-                "--default-search",
-                "ytsearch",
-                "--no-playlist",
-            ]
             try:
-                proc_search = subprocess.run(search_cmd, capture_output=True, text=True)
-                if proc_search.returncode == 0:
-                    first_result = json.loads(proc_search.stdout.splitlines()[0])
-                    if first_result.get("channel_id"):
-                        real_id_or_url = first_result.get("channel_id")
-                        is_search_fallback = True
+                results = YouTubeService.get_playlist_entries(f"ytsearch1:{channel_id}", limit=1)
+                first_result = results[0] if results else None
+                if first_result and first_result.get("channel_id"):
+                    real_id_or_url = first_result.get("channel_id")
+                    is_search_fallback = True
             except Exception as e:
                 logger.debug(f"Channel search fallback failed: {e}")
 
@@ -119,52 +106,21 @@ def channel(channel_id):
         elif target_url.startswith("@"):
             target_url = f"https://www.youtube.com/{target_url}"
 
-        cmd = [
-            sys.executable,
-            "-m",
-            "yt_dlp",
-            target_url,
-            "--dump-json",
-            "--flat-playlist",
-            "--playlist-end",
-            "1",
-            "--no-warnings",
-        ]
-
-        proc = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-        stdout, stderr = proc.communicate()
-
-        if stdout:
-            try:
-                first = json.loads(stdout.splitlines()[0])
-                channel_info["title"] = (
-                    first.get("channel")
-                    or first.get("uploader")
-                    or channel_info["title"]
-                )
-                channel_info["id"] = first.get("channel_id") or channel_info["id"]
-            except json.JSONDecodeError as e:
-                logger.debug(f"Channel JSON parse failed: {e}")
-        
-        # If title is still just the ID, try to get channel name
-        if channel_info["title"].startswith("UC") or channel_info["title"].startswith("@"):
-            try:
-                name_cmd = [
-                    sys.executable,
-                    "-m",
-                    "yt_dlp",
-                    target_url,
-                    "--print", "channel",
-                    "--playlist-items", "1",
-                    "--no-warnings",
-                ]
-                name_proc = subprocess.run(name_cmd, capture_output=True, text=True, timeout=15)
-                if name_proc.returncode == 0 and name_proc.stdout.strip():
-                    channel_info["title"] = name_proc.stdout.strip()
-            except Exception as e:
-                logger.debug(f"Channel name fetch failed: {e}")
+        try:
+            # The playlist-level fields carry the channel name, so a single
+            # flat extraction of the first entry is enough
+            info = YouTubeService.extract_playlist(target_url, limit=1, timeout=15) or {}
+            first = next(iter(info.get("entries") or []), None) or {}
+            channel_info["title"] = (
+                info.get("channel")
+                or info.get("uploader")
+                or first.get("channel")
+                or first.get("uploader")
+                or channel_info["title"]
+            )
+            channel_info["id"] = info.get("channel_id") or first.get("channel_id") or channel_info["id"]
+        except Exception as e:
+            logger.debug(f"Channel metadata fetch failed: {e}")
 
         return render_template("channel.html", channel=channel_info)
 
@@ -3,11 +3,25 @@ KV-Tube Streaming Blueprint
 Video streaming and proxy routes
 """
 from flask import Blueprint, request, Response, stream_with_context, send_from_directory
-import requests
+from werkzeug.wsgi import wrap_file
 import os
 import logging
 import socket
 import urllib3.util.connection as urllib3_cn
+from app.services.stream_proxy import (
+    get_proxy_engine,
+    build_upstream_headers,
+    response_headers,
+)
+from app.services.proxy_tokens import get_proxy_tokens, resolve_proxy_request, TokenLinker
+from app.services.hls import is_manifest, get_manifest_cache
+from app.services.segment_cache import (
+    get_segment_cache,
+    stream_key,
+    requested_range,
+    url_range,
+)
+from config import Config
 
 # Force IPv4 for requests (which uses urllib3)
 def allowed_gai_family():
@@ -38,6 +52,42 @@ def add_cors_headers(response):
     return response
 
 
+def serve_cached_range(hit, partial):
+    """Serve bytes from the segment cache (sendfile where the server supports it)."""
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(hit.length),
+    }
+    if partial:
+        headers["Content-Range"] = f"bytes {hit.start}-{hit.end}/{hit.total or '*'}"
+    response = Response(
+        wrap_file(request.environ, hit.open()),
+        status=206 if partial else 200,
+        headers=headers,
+        content_type=hit.content_type,
+        direct_passthrough=True,
+    )
+    return add_cors_headers(response)
+
+
+def cache_upstream_body(body, upstream, key, wanted, sliced=False):
+    """Tee a relayed upstream body into the segment cache when its byte offsets are known.
+
+    See SegmentCache.writer_for_response for `sliced`.
+    """
+    writer = get_segment_cache().writer_for_response(key, wanted, upstream.status_code, upstream.headers, sliced)
+    if writer is None:
+        return body
+
+    def tee():
+        with writer:
+            for chunk in body:
+                writer.write(chunk)
+                yield chunk
+
+    return tee()
+
+
 @streaming_bp.route("/video_proxy", methods=["GET", "OPTIONS"])
 def video_proxy():
     """Proxy video streams with HLS manifest rewriting."""
@@ -46,114 +96,71 @@ def video_proxy():
         response = Response("")
         return add_cors_headers(response)
     
-    url = request.args.get("url")
-    if not url:
-        return "No URL provided", 400
+    target, error = resolve_proxy_request(request.args)
+    if error:
+        return error
+    url, overrides = target.url, target.headers
 
-    # Forward headers to mimic browser and support seeking
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Referer": "https://www.youtube.com/",
-        "Origin": "https://www.youtube.com",
-        "Accept": "*/*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "cross-site",
-    }
-    
-    # Override with propagated headers (h_*)
-    for key, value in request.args.items():
-        if key.startswith("h_"):
-            header_name = key[2:]  # Remove 'h_' prefix
-            headers[header_name] = value
-
-    # Support Range requests (scrubbing)
+    # Forward headers to mimic browser and support seeking (Range)
     range_header = request.headers.get("Range")
-    if range_header:
-        headers["Range"] = range_header
+    headers = build_upstream_headers(overrides, range_header)
+
+    # Serve previously fetched bytes of this video/format from disk
+    key = stream_key(url) if Config.SEGMENT_CACHE_BYTES else None
+    wanted = requested_range(url, range_header) if key else None
+    if wanted:
+        hit = get_segment_cache().lookup(key, *wanted)
+        if hit:
+            return serve_cached_range(hit, partial=bool(range_header) and not url_range(url))
+
+    # Live manifests are refetched every few seconds by every viewer
+    variant = tuple(sorted(overrides.items()))
+    manifests = get_manifest_cache()
+    cached_manifest = manifests.get(url, variant)
+    if cached_manifest is not None:
+        response = Response(cached_manifest, content_type="application/vnd.apple.mpegurl")
+        return add_cors_headers(response)
 
+    engine = get_proxy_engine()
     try:
         logger.info(f"Proxying URL: {url[:100]}...")
-        req = requests.get(url, headers=headers, stream=True, timeout=30)
+        req = engine.open(url, headers)
         
         logger.info(f"Upstream Status: {req.status_code}, Content-Type: {req.headers.get('content-type', 'unknown')}")
         if req.status_code != 200 and req.status_code != 206:
             logger.error(f"Upstream Error: {req.status_code}")
 
         # Handle HLS (M3U8) Rewriting - CRITICAL for 1080p+ and proper sync
-        content_type = req.headers.get("content-type", "").lower()
-        url_path = url.split("?")[0]
-        
-        # Improved manifest detection - YouTube may send text/plain or octet-stream
-        is_manifest = (
-            url_path.endswith(".m3u8")
-            or "mpegurl" in content_type
-            or "m3u8" in url_path.lower()
-            or ("/playlist/" in url.lower() and "index.m3u8" in url.lower())
-        )
-        
-        logger.info(f"Is Manifest: {is_manifest}, Status: {req.status_code}")
+        manifest = is_manifest(url, req.headers.get("content-type", ""))
+        logger.info(f"Is Manifest: {manifest}, Status: {req.status_code}")
 
         # Handle 200 and 206 (partial content) responses for manifests
-        if is_manifest and req.status_code in [200, 206]:
-            content = req.text
-            base_url = url.rsplit("/", 1)[0]
-            new_lines = []
-            
-            logger.info(f"Rewriting manifest with {len(content.splitlines())} lines")
-
-            for line in content.splitlines():
-                line_stripped = line.strip()
-                if line_stripped and not line_stripped.startswith("#"):
-                    # URL line - needs rewriting
-                    if not line_stripped.startswith("http"):
-                        # Relative URL - make absolute
-                        full_url = f"{base_url}/{line_stripped}"
-                    else:
-                        # Absolute URL
-                        full_url = line_stripped
-
-                    from urllib.parse import quote
-                    quoted_url = quote(full_url, safe="")
-                    new_line = f"/video_proxy?url={quoted_url}"
-                    
-                    # Propagate existing h_* params to segments
-                    query_string = request.query_string.decode("utf-8")
-                    h_params = [p for p in query_string.split("&") if p.startswith("h_")]
-                    if h_params:
-                        param_str = "&".join(h_params)
-                        new_line += f"&{param_str}"
-                    
-                    new_lines.append(new_line)
-                else:
-                    new_lines.append(line)
-
-            rewritten_content = "\n".join(new_lines)
-            logger.info(f"Manifest rewritten successfully")
-            
+        if manifest and req.status_code in [200, 206]:
+            # Rewrite line by line as the manifest arrives; segment links are
+            # tokens that carry this manifest's header overrides
+            req.encoding = req.encoding or "utf-8"
+            link = TokenLinker(get_proxy_tokens(), overrides, target.video_id)
+
+            def rewritten():
+                try:
+                    yield from manifests.rewrite_stream(req.iter_lines(decode_unicode=True), url, variant, link)
+                finally:
+                    req.close()
+
             response = Response(
-                rewritten_content, content_type="application/vnd.apple.mpegurl"
+                stream_with_context(rewritten()), content_type="application/vnd.apple.mpegurl"
             )
             return add_cors_headers(response)
 
         # Standard Stream Proxy (Binary) - for video segments and other files
-        excluded_headers = [
-            "content-encoding",
-            "content-length",
-            "transfer-encoding",
-            "connection",
-        ]
-        response_headers = [
-            (name, value)
-            for (name, value) in req.headers.items()
-            if name.lower() not in excluded_headers
-        ]
+        body = engine.relay(req)
+        if wanted:
+            body = cache_upstream_body(body, req, key, wanted, sliced=bool(url_range(url)))
 
         response = Response(
-            stream_with_context(req.iter_content(chunk_size=8192)),
+            stream_with_context(body),
             status=req.status_code,
-            headers=response_headers,
+            headers=response_headers(req),
             content_type=req.headers.get("content-type"),
         )
         return add_cors_headers(response)
@@ -161,4 +168,3 @@ def video_proxy():
     except Exception as e:
         logger.error(f"Proxy Error: {e}")
         return str(e), 500
-
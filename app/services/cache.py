@@ -2,105 +2,22 @@
 Cache Service Module
 SQLite-based caching with connection pooling
 """
-import sqlite3
-import json
+import os
+import copy
 import time
 import threading
 import logging
-from typing import Optional, Any, Dict
-from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, Tuple
 from config import Config
+from app.services.database import ConnectionPool, get_pool, get_db_connection
+from app.services.serializer import get_serializer
+from app.services.outbound import outbound_priority, WARMER
+from app.services.executor import get_executor, request_deadline
 
 logger = logging.getLogger(__name__)
 
 
-class ConnectionPool:
-    """Thread-safe SQLite connection pool"""
-    
-    def __init__(self, db_path: str, max_connections: int = 5):
-        self.db_path = db_path
-        self.max_connections = max_connections
-        self._local = threading.local()
-        self._lock = threading.Lock()
-        self._init_db()
-    
-    def _init_db(self):
-        """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Users table
-        c.execute('''CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )''')
-        
-        # User videos (history/saved)
-        c.execute('''CREATE TABLE IF NOT EXISTS user_videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            video_id TEXT,
-            title TEXT,
-            thumbnail TEXT,
-            type TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )''')
-        
-        # Video cache
-        c.execute('''CREATE TABLE IF NOT EXISTS video_cache (
-            video_id TEXT PRIMARY KEY,
-            data TEXT,
-            expires_at REAL
-        )''')
-        
-        conn.commit()
-        conn.close()
-    
-    def get_connection(self) -> sqlite3.Connection:
-        """Get a thread-local database connection"""
-        if not hasattr(self._local, 'connection') or self._local.connection is None:
-            self._local.connection = sqlite3.connect(self.db_path)
-            self._local.connection.row_factory = sqlite3.Row
-        return self._local.connection
-    
-    @contextmanager
-    def connection(self):
-        """Context manager for database connections"""
-        conn = self.get_connection()
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Database error: {e}")
-            raise
-    
-    def close(self):
-        """Close the thread-local connection"""
-        if hasattr(self._local, 'connection') and self._local.connection:
-            self._local.connection.close()
-            self._local.connection = None
-
-
-# Global connection pool
-_pool: Optional[ConnectionPool] = None
-
-
-def get_pool() -> ConnectionPool:
-    """Get or create the global connection pool"""
-    global _pool
-    if _pool is None:
-        _pool = ConnectionPool(Config.DB_NAME)
-    return _pool
-
-
-def get_db_connection() -> sqlite3.Connection:
-    """Get a database connection - backward compatibility"""
-    return get_pool().get_connection()
-
-
 class CacheService:
     """Service for caching video metadata"""
     
@@ -119,14 +36,21 @@ class CacheService:
             pool = get_pool()
             with pool.connection() as conn:
                 row = conn.execute(
-                    'SELECT data, expires_at FROM video_cache WHERE video_id = ?',
+                    'SELECT data, expires_at, last_access FROM video_cache WHERE video_id = ?',
                     (video_id,)
                 ).fetchone()
                 
                 if row:
                     expires_at = float(row['expires_at'])
-                    if time.time() < expires_at:
-                        return json.loads(row['data'])
+                    now = time.time()
+                    if now < expires_at:
+                        # Recency for the janitor's LRU budget, written at most once per interval
+                        if (row['last_access'] or 0) < now - Config.CACHE_ACCESS_RESOLUTION:
+                            conn.execute(
+                                'UPDATE video_cache SET last_access = ? WHERE video_id = ?',
+                                (now, video_id)
+                            )
+                        return get_serializer().loads(row['data'])
                     else:
                         # Expired, clean it up
                         conn.execute('DELETE FROM video_cache WHERE video_id = ?', (video_id,))
@@ -154,13 +78,15 @@ class CacheService:
             if ttl is None:
                 ttl = Config.CACHE_VIDEO_TTL
             
-            expires_at = time.time() + ttl
+            now = time.time()
+            payload = get_serializer().dumps(data)
             
             pool = get_pool()
             with pool.connection() as conn:
                 conn.execute(
-                    'INSERT OR REPLACE INTO video_cache (video_id, data, expires_at) VALUES (?, ?, ?)',
-                    (video_id, json.dumps(data), expires_at)
+                    'INSERT OR REPLACE INTO video_cache (video_id, data, expires_at, size, last_access) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (video_id, payload, now + ttl, len(payload), now)
                 )
             
             return True
@@ -181,18 +107,369 @@ class CacheService:
             logger.error(f"Cache cleanup error: {e}")
 
 
+class TieredCache:
+    """
+    Two-tier cache for section, search and metadata results
+    
+    Tier 1 is a bounded in-process LRU per worker; tier 2 is the shared_cache
+    table, so a result fetched by one gunicorn worker is reused by the others.
+    Entries live in a namespace whose TTL comes from Config.CACHE_NAMESPACE_TTL.
+    Callers get their own copy of a value and may modify it; the memory tier
+    keeps a private one.
+    """
+    
+    # Check the disk budget every N writes rather than on each one
+    DISK_CHECK_INTERVAL = 50
+    
+    def __init__(self, max_items: int = None, max_bytes: int = None, disk_max_bytes: int = None,
+                 ttls: Dict[str, int] = None, pool: ConnectionPool = None):
+        self.max_items = max_items or Config.CACHE_MEMORY_ITEMS
+        self.max_bytes = max_bytes or Config.CACHE_MEMORY_BYTES
+        self.disk_max_bytes = disk_max_bytes or Config.CACHE_DISK_BYTES
+        self.ttls = ttls if ttls is not None else Config.CACHE_NAMESPACE_TTL
+        self._pool = pool
+        self._lock = threading.Lock()
+        # (namespace, key) -> (value, size, stored_at, expires_at)
+        self._memory: OrderedDict = OrderedDict()
+        self._memory_bytes = 0
+        self._writes = 0
+        self._refreshing = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def _get_pool(self) -> ConnectionPool:
+        return self._pool or get_pool()
+    
+    def _count(self, namespace: str, stat: str, n: int = 1):
+        ns_stats = self._stats.setdefault(namespace, {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'refreshes': 0,
+        })
+        ns_stats[stat] += n
+    
+    def ttl_for(self, namespace: str) -> int:
+        """TTL in seconds for a namespace"""
+        return self.ttls.get(namespace, Config.CACHE_VIDEO_TTL)
+    
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Get a cached value
+        
+        Args:
+            namespace: Cache namespace (search, trending, section, channel, metadata)
+            key: Key within the namespace
+        
+        Returns:
+            Cached value or None if not found/expired
+        """
+        entry = self._lookup(namespace, key)
+        return entry[0] if entry else None
+    
+    def get_shared(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Get a value from the shared tier only
+        
+        For entries that other workers update or delete while this one may
+        still hold an older copy in its memory tier.
+        """
+        entry = self._lookup_disk(namespace, key)
+        return entry[0] if entry else None
+    
+    def _lookup(self, namespace: str, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Find an unexpired entry as (value, stored_at, expires_at), memory first"""
+        now = time.time()
+        mem_key = (namespace, key)
+        
+        with self._lock:
+            entry = self._memory.get(mem_key)
+            if entry:
+                value, size, stored_at, expires_at = entry
+                if now < expires_at:
+                    self._memory.move_to_end(mem_key)
+                    self._count(namespace, 'memory_hits')
+                    return copy.deepcopy(value), stored_at, expires_at
+                self._drop(mem_key)
+        
+        return self._lookup_disk(namespace, key)
+    
+    def _lookup_disk(self, namespace: str, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Find an unexpired entry in the shared tier, refreshing the memory tier"""
+        now = time.time()
+        mem_key = (namespace, key)
+        
+        try:
+            with self._get_pool().connection() as conn:
+                row = conn.execute(
+                    'SELECT data, stored_at, expires_at FROM shared_cache WHERE namespace = ? AND key = ?',
+                    (namespace, key)
+                ).fetchone()
+            
+            if row and now < float(row['expires_at']):
+                value, size = get_serializer().decode(row['data'])
+                stored_at, expires_at = float(row['stored_at']), float(row['expires_at'])
+                with self._lock:
+                    self._count(namespace, 'disk_hits')
+                    self._remember(mem_key, copy.deepcopy(value), size, stored_at, expires_at)
+                return value, stored_at, expires_at
+                
+        except Exception as e:
+            logger.error(f"Shared cache get error for {namespace}/{key}: {e}")
+        
+        with self._lock:
+            self._count(namespace, 'misses')
+        return None
+    
+    def get_or_refresh(self, namespace: str, key: str, loader: Callable[[], Any],
+                       soft_ttl: int, hard_ttl: int) -> Any:
+        """
+        Get a value with stale-while-revalidate semantics
+        
+        Entries younger than soft_ttl are returned as-is. Older ones (up to
+        hard_ttl) are returned immediately while a single background refresh
+        runs, deduplicated across threads and, via a lease, across workers.
+        Only a missing or hard-expired entry makes the caller wait for loader.
+        
+        Args:
+            namespace: Cache namespace
+            key: Key within the namespace
+            loader: Callable producing a fresh value; empty results are not cached
+            soft_ttl: Age in seconds after which the entry is revalidated
+            hard_ttl: Age in seconds after which the entry is no longer served
+        
+        Returns:
+            Cached or freshly loaded value
+        """
+        entry = self._lookup(namespace, key)
+        if entry and time.time() - entry[1] >= soft_ttl:
+            # Another worker may already have refreshed the shared tier
+            entry = self._lookup_disk(namespace, key) or entry
+        
+        if entry is None:
+            value = loader()
+            if value:
+                self.set(namespace, key, value, ttl=hard_ttl)
+            return value
+        
+        value, stored_at, _ = entry
+        if time.time() - stored_at >= soft_ttl:
+            self._schedule_refresh(namespace, key, loader, hard_ttl)
+        return value
+    
+    def _schedule_refresh(self, namespace: str, key: str, loader: Callable[[], Any], hard_ttl: int):
+        """Start a background refresh unless one is already running anywhere"""
+        refresh_key = (namespace, key)
+        with self._lock:
+            if refresh_key in self._refreshing:
+                return
+            self._refreshing.add(refresh_key)
+        
+        def refresh():
+            lease = f"refresh:{namespace}:{key}"
+            try:
+                if not LeaseService.acquire(lease, ttl=Config.CACHE_REFRESH_LEASE_TTL):
+                    return
+                try:
+                    # Stale data is being served meanwhile; yield to requests users wait on
+                    with outbound_priority(WARMER):
+                        value = loader()
+                    if value:
+                        self.set(namespace, key, value, ttl=hard_ttl)
+                        with self._lock:
+                            self._count(namespace, 'refreshes')
+                finally:
+                    LeaseService.release(lease)
+            except Exception as e:
+                logger.error(f"Background refresh failed for {namespace}/{key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(refresh_key)
+        
+        # Not bound to the request that noticed the stale entry; refresh() must
+        # run to clear its _refreshing mark
+        with request_deadline(None):
+            get_executor('background').submit(refresh)
+    
+    def set(self, namespace: str, key: str, value: Any, ttl: int = None) -> bool:
+        """
+        Cache a value in both tiers
+        
+        Args:
+            namespace: Cache namespace
+            key: Key within the namespace
+            value: JSON-serializable value
+            ttl: Time to live in seconds (default from the namespace)
+        
+        Returns:
+            True if the shared tier was written
+        """
+        if ttl is None:
+            ttl = self.ttl_for(namespace)
+        
+        data, size = get_serializer().encode(value)
+        stored_at = time.time()
+        expires_at = stored_at + ttl
+        
+        with self._lock:
+            self._count(namespace, 'sets')
+            self._remember((namespace, key), copy.deepcopy(value), size, stored_at, expires_at)
+            self._writes += 1
+            check_disk = self._writes % self.DISK_CHECK_INTERVAL == 0
+        
+        try:
+            with self._get_pool().connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO shared_cache (namespace, key, data, size, stored_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (namespace, key, data, len(data), stored_at, expires_at)
+                )
+            if check_disk:
+                self.enforce_disk_budget()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Shared cache set error for {namespace}/{key}: {e}")
+            return False
+    
+    def delete(self, namespace: str, key: str):
+        """Remove an entry from both tiers"""
+        with self._lock:
+            self._drop((namespace, key))
+        try:
+            with self._get_pool().connection() as conn:
+                conn.execute('DELETE FROM shared_cache WHERE namespace = ? AND key = ?', (namespace, key))
+        except Exception as e:
+            logger.error(f"Shared cache delete error for {namespace}/{key}: {e}")
+    
+    def _remember(self, mem_key: Tuple[str, str], value: Any, size: int, stored_at: float, expires_at: float):
+        """Insert into the memory tier and evict LRU entries over budget (caller holds the lock)"""
+        self._drop(mem_key)
+        if size > self.max_bytes:
+            return
+        
+        self._memory[mem_key] = (value, size, stored_at, expires_at)
+        self._memory_bytes += size
+        
+        while len(self._memory) > self.max_items or self._memory_bytes > self.max_bytes:
+            old_key, old_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= old_entry[1]
+            self._count(old_key[0], 'evictions')
+    
+    def _drop(self, mem_key: Tuple[str, str]):
+        """Remove a memory tier entry (caller holds the lock)"""
+        entry = self._memory.pop(mem_key, None)
+        if entry:
+            self._memory_bytes -= entry[1]
+    
+    def enforce_disk_budget(self):
+        """Drop expired rows, then the oldest rows until the shared tier fits its budget"""
+        try:
+            with self._get_pool().connection() as conn:
+                conn.execute('DELETE FROM shared_cache WHERE expires_at < ?', (time.time(),))
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM shared_cache').fetchone()[0]
+                excess = total - self.disk_max_bytes
+                if excess <= 0:
+                    return
+                
+                victims = []
+                for row in conn.execute('SELECT namespace, key, size FROM shared_cache ORDER BY stored_at'):
+                    victims.append((row['namespace'], row['key']))
+                    excess -= row['size']
+                    if excess <= 0:
+                        break
+                
+                conn.executemany('DELETE FROM shared_cache WHERE namespace = ? AND key = ?', victims)
+                logger.info(f"Shared cache evicted {len(victims)} entries over disk budget")
+                
+        except Exception as e:
+            logger.error(f"Shared cache eviction error: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per namespace and memory tier usage"""
+        with self._lock:
+            return {
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'namespaces': {ns: dict(counts) for ns, counts in self._stats.items()},
+            }
+
+
+class LeaseService:
+    """Cross-worker leases stored in SQLite"""
+    
+    @staticmethod
+    def _holder() -> str:
+        return f"{os.getpid()}:{threading.get_ident()}"
+    
+    @staticmethod
+    def acquire(name: str, ttl: float = 60) -> bool:
+        """
+        Try to take a named lease
+        
+        Args:
+            name: Lease name
+            ttl: Seconds until the lease lapses if never released
+        
+        Returns:
+            True if this caller now holds the lease
+        """
+        now = time.time()
+        try:
+            pool = get_pool()
+            with pool.connection() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO cache_leases (name, holder, expires_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at '
+                    'WHERE cache_leases.expires_at < ?',
+                    (name, LeaseService._holder(), now + ttl, now)
+                )
+                return cursor.rowcount == 1
+                
+        except Exception as e:
+            # Without the shared table, fall back to per-process deduplication
+            logger.error(f"Lease acquire error for {name}: {e}")
+            return True
+    
+    @staticmethod
+    def release(name: str):
+        """Release a lease held by this caller"""
+        try:
+            pool = get_pool()
+            with pool.connection() as conn:
+                conn.execute(
+                    'DELETE FROM cache_leases WHERE name = ? AND holder = ?',
+                    (name, LeaseService._holder())
+                )
+        except Exception as e:
+            logger.error(f"Lease release error for {name}: {e}")
+
+
+# Global shared cache
+_shared_cache: Optional[TieredCache] = None
+
+
+def get_shared_cache() -> TieredCache:
+    """Get or create the global two-tier cache"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TieredCache()
+    return _shared_cache
+
+
 class HistoryService:
     """Service for user video history"""
     
+    # Single local profile; history rows are written under this user
+    DEFAULT_USER_ID = 1
+    
     @staticmethod
-    def get_history(limit: int = 50) -> list:
-        """Get watch history"""
+    def get_history(limit: int = 50, user_id: int = DEFAULT_USER_ID) -> list:
+        """Get watch history, most recent first"""
         try:
             pool = get_pool()
             with pool.connection() as conn:
+                # Served by idx_user_videos_list (user_id, type, timestamp)
                 rows = conn.execute(
-                    'SELECT video_id as id, title, thumbnail FROM user_videos WHERE type = "history" ORDER BY timestamp DESC LIMIT ?',
-                    (limit,)
+                    'SELECT video_id as id, title, thumbnail FROM user_videos '
+                    'WHERE user_id = ? AND type = \'history\' ORDER BY timestamp DESC LIMIT ?',
+                    (user_id, limit)
                 ).fetchall()
                 return [dict(row) for row in rows]
                 
@@ -201,14 +478,16 @@ class HistoryService:
             return []
     
     @staticmethod
-    def add_to_history(video_id: str, title: str, thumbnail: str) -> bool:
-        """Add a video to history"""
+    def add_to_history(video_id: str, title: str, thumbnail: str, user_id: int = DEFAULT_USER_ID) -> bool:
+        """Add a video to history, or move it to the top if already there"""
         try:
             pool = get_pool()
             with pool.connection() as conn:
                 conn.execute(
-                    'INSERT INTO user_videos (user_id, video_id, title, thumbnail, type) VALUES (?, ?, ?, ?, ?)',
-                    (1, video_id, title, thumbnail, 'history')
+                    'INSERT INTO user_videos (user_id, video_id, title, thumbnail, type) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (user_id, video_id, type) DO UPDATE SET '
+                    'title = excluded.title, thumbnail = excluded.thumbnail, timestamp = CURRENT_TIMESTAMP',
+                    (user_id, video_id, title, thumbnail, 'history')
                 )
             return True
             
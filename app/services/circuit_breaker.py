@@ -0,0 +1,154 @@
+"""
+Circuit Breaker Module
+Per-engine failure tracking so a sick extraction engine is skipped instead of waited out
+"""
+import time
+import threading
+import logging
+from collections import deque
+from typing import Any, Dict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one engine
+
+    - closed: calls go through; outcomes of the last BREAKER_WINDOW seconds
+      are kept, and once there are BREAKER_MIN_CALLS of them with a failure
+      share of BREAKER_FAILURE_RATE or more, the breaker opens. Calls slower
+      than the engine's BREAKER_SLOW_CALL entry count as failures.
+    - open: allow() is False for BREAKER_COOLDOWN seconds.
+    - half_open: up to BREAKER_PROBES calls are let through as probes; a
+      successful probe closes the breaker, a failed one opens it again.
+      Probes that never report are replaced after another cooldown.
+    """
+
+    def __init__(self, name: str, window: float = None, min_calls: int = None,
+                 failure_rate: float = None, slow_call: float = None, cooldown: float = None,
+                 probes: int = None):
+        self.name = name
+        self.window = window or Config.BREAKER_WINDOW
+        self.min_calls = min_calls or Config.BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or Config.BREAKER_FAILURE_RATE
+        self.slow_call = slow_call or Config.BREAKER_SLOW_CALL.get(name)
+        self.cooldown = cooldown or Config.BREAKER_COOLDOWN
+        self.probes = probes or Config.BREAKER_PROBES
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._changed_at = time.monotonic()
+        self._outcomes: deque = deque()  # (monotonic time, ok, seconds)
+        self._probes_started = 0
+        self._stats = {
+            'calls': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+        self._changed_at = time.monotonic()
+        self._probes_started = 0
+        if state == OPEN:
+            self._stats['opened'] += 1
+        elif state == CLOSED:
+            self._outcomes.clear()
+
+    def _refresh(self, now: float):
+        """Apply cooldowns and drop outcomes older than the window (lock held)"""
+        if self._state == OPEN and now - self._changed_at >= self.cooldown:
+            self._set_state(HALF_OPEN)
+        elif self._state == HALF_OPEN and now - self._changed_at >= self.cooldown:
+            # Probes let through earlier never reported back
+            self._changed_at = now
+            self._probes_started = 0
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the engine now (half-open: takes a probe slot)"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_started < self.probes:
+                self._probes_started += 1
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record(self, ok: bool, seconds: float = 0.0):
+        """Report the outcome of a call"""
+        ok = ok and (self.slow_call is None or seconds < self.slow_call)
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            self._stats['calls'] += 1
+            if not ok:
+                self._stats['failures'] += 1
+
+            if self._state == HALF_OPEN:
+                self._set_state(CLOSED if ok else OPEN)
+                return
+            if self._state == OPEN:
+                # A call started before the breaker opened
+                return
+
+            self._outcomes.append((now, ok, seconds))
+            failures = sum(1 for _, good, _ in self._outcomes if not good)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._set_state(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            stats = dict(self._stats)
+            outcomes = list(self._outcomes)
+            stats['state'] = self._state
+            stats['recent_calls'] = len(outcomes)
+            stats['recent_failure_rate'] = (
+                round(sum(1 for _, ok, _ in outcomes if not ok) / len(outcomes), 3) if outcomes else 0.0
+            )
+            latencies = sorted(seconds for _, ok, seconds in outcomes if ok)
+            stats['recent_p50_seconds'] = round(latencies[len(latencies) // 2], 3) if latencies else None
+            if self._state == OPEN:
+                stats['retry_in'] = round(max(0.0, self.cooldown - (now - self._changed_at)), 1)
+        return stats
+
+
+# Global breakers, one per engine
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(engine: str) -> CircuitBreaker:
+    """Get or create the circuit breaker of an engine"""
+    breaker = _breakers.get(engine)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(engine)
+            if breaker is None:
+                breaker = _breakers[engine] = CircuitBreaker(engine)
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Stats of every engine's breaker"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
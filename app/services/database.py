@@ -0,0 +1,280 @@
+"""
+Database Module
+Single SQLite layer (schema, pragmas, per-thread connections) used by all modules
+"""
+import os
+import sqlite3
+import threading
+import logging
+from typing import Callable, List, Optional, Tuple
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _has_column(c: sqlite3.Cursor, table: str, column: str) -> bool:
+    return column in [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+
+
+def _migration_proxy_token_video(c: sqlite3.Cursor):
+    # Databases created before tokens were tied to videos
+    if not _has_column(c, 'proxy_tokens', 'video_id'):
+        c.execute('ALTER TABLE proxy_tokens ADD COLUMN video_id TEXT')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_proxy_tokens_video ON proxy_tokens (video_id)')
+
+
+def _migration_history_indexes(c: sqlite3.Cursor):
+    # Keep the newest row of each repeated (user, video, type) entry
+    c.execute('''DELETE FROM user_videos WHERE id NOT IN (
+        SELECT MAX(id) FROM user_videos GROUP BY user_id, video_id, type
+    )''')
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_user_videos_entry ON user_videos (user_id, video_id, type)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_user_videos_list ON user_videos (user_id, type, timestamp)')
+
+
+def _migration_cache_expiry(c: sqlite3.Cursor):
+    c.execute('CREATE INDEX IF NOT EXISTS idx_video_cache_expires ON video_cache (expires_at)')
+
+
+def _migration_cache_access(c: sqlite3.Cursor):
+    # Size and last read time of video_cache rows, for the janitor's LRU budget
+    if not _has_column(c, 'video_cache', 'size'):
+        c.execute('ALTER TABLE video_cache ADD COLUMN size INTEGER')
+    if not _has_column(c, 'video_cache', 'last_access'):
+        c.execute('ALTER TABLE video_cache ADD COLUMN last_access REAL')
+    c.execute('UPDATE video_cache SET size = LENGTH(data) WHERE size IS NULL')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_video_cache_access ON video_cache (last_access)')
+
+
+# Schema migrations in order; PRAGMA user_version records how many have run.
+# Append new ones at the end, never reorder or remove.
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Cursor], None]]] = [
+    ('proxy_tokens.video_id', _migration_proxy_token_video),
+    ('user_videos indexes and dedupe', _migration_history_indexes),
+    ('video_cache expiry index', _migration_cache_expiry),
+    ('video_cache size and last access', _migration_cache_access),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations
+    
+    Each migration runs in its own write transaction and re-checks the
+    version inside it, so workers starting together apply it once.
+    
+    Returns:
+        Schema version after migrating
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for version, (name, apply) in enumerate(MIGRATIONS, start=1):
+            if schema_version(conn) >= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if schema_version(conn) < version:
+                    apply(conn.cursor())
+                    conn.execute(f'PRAGMA user_version = {version}')
+                    logger.info(f"Applied database migration {version}: {name}")
+                conn.execute('COMMIT')
+            except Exception as e:
+                conn.execute('ROLLBACK')
+                logger.error(f"Database migration {version} ({name}) failed: {e}")
+                raise
+        return schema_version(conn)
+    finally:
+        conn.isolation_level = isolation_level
+
+
+class ConnectionPool:
+    """
+    Thread-safe SQLite connection pool
+
+    Each thread keeps one open connection, so requests skip the connect
+    cost and reuse its prepared statement cache. Connections run in WAL
+    mode with a busy timeout, letting readers proceed during writes and
+    writers in other workers wait instead of failing with "database is
+    locked".
+    """
+    
+    def __init__(self, db_path: str, max_connections: int = 5):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the shared pragmas applied"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=Config.DB_BUSY_TIMEOUT,
+            cached_statements=Config.DB_CACHED_STATEMENTS,
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT * 1000)}')
+        conn.execute(f'PRAGMA synchronous = {Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA mmap_size = {int(Config.DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+    
+    def _init_db(self):
+        """Create the data directory, switch to WAL and initialize tables"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        conn = self._connect()
+        # Only takes effect on a new database file; lets the janitor return
+        # freed pages to the filesystem without a full VACUUM
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # WAL is a property of the database file; set once, every connection uses it
+        conn.execute('PRAGMA journal_mode = WAL')
+        c = conn.cursor()
+        
+        # Users table
+        c.execute('''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )''')
+        
+        # User videos (history/saved)
+        c.execute('''CREATE TABLE IF NOT EXISTS user_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            video_id TEXT,
+            title TEXT,
+            thumbnail TEXT,
+            type TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )''')
+        
+        # Video cache
+        c.execute('''CREATE TABLE IF NOT EXISTS video_cache (
+            video_id TEXT PRIMARY KEY,
+            data TEXT,
+            expires_at REAL,
+            size INTEGER,
+            last_access REAL
+        )''')
+        
+        # Shared cache (disk tier of TieredCache, shared by all workers)
+        c.execute('''CREATE TABLE IF NOT EXISTS shared_cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT,
+            size INTEGER,
+            stored_at REAL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )''')
+        
+        # Video metadata (durable, per-field fetch times in fetched_at)
+        c.execute('''CREATE TABLE IF NOT EXISTS video_metadata (
+            video_id TEXT PRIMARY KEY,
+            title TEXT,
+            thumbnail TEXT,
+            uploader TEXT,
+            view_count INTEGER,
+            duration INTEGER,
+            upload_date TEXT,
+            fetched_at TEXT
+        )''')
+        
+        # Proxied video bytes cached on disk: one file per (video_id, itag),
+        # with the byte ranges it holds
+        c.execute('''CREATE TABLE IF NOT EXISTS segment_files (
+            video_id TEXT NOT NULL,
+            itag TEXT NOT NULL,
+            total INTEGER,
+            content_type TEXT,
+            size INTEGER DEFAULT 0,
+            last_access REAL,
+            PRIMARY KEY (video_id, itag)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS segment_ranges (
+            video_id TEXT NOT NULL,
+            itag TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            end INTEGER NOT NULL,
+            PRIMARY KEY (video_id, itag, start)
+        )''')
+        
+        # Proxy tokens: short IDs for upstream URL + header overrides
+        c.execute('''CREATE TABLE IF NOT EXISTS proxy_tokens (
+            token TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            headers TEXT,
+            expires_at REAL,
+            video_id TEXT
+        )''')
+        
+        # Short-lived leases for work that only one worker should do at a time
+        c.execute('''CREATE TABLE IF NOT EXISTS cache_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT,
+            expires_at REAL
+        )''')
+        
+        conn.commit()
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """Get a thread-local database connection"""
+        if not hasattr(self._local, 'connection') or self._local.connection is None:
+            self._local.connection = self._connect()
+            self._local.connection.row_factory = sqlite3.Row
+        return self._local.connection
+    
+    @contextmanager
+    def connection(self):
+        """Context manager for database connections"""
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Database error: {e}")
+            raise
+    
+    def close(self):
+        """Close the thread-local connection"""
+        if hasattr(self._local, 'connection') and self._local.connection:
+            self._local.connection.close()
+            self._local.connection = None
+
+
+# Global connection pool
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get or create the global connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(Config.DB_NAME)
+    return _pool
+
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Get this thread's pooled connection - backward compatibility
+    
+    The connection is shared by the thread; do not close it.
+    """
+    return get_pool().get_connection()
@@ -0,0 +1,264 @@
+"""
+Executor Module
+Shared, bounded worker pools for fan-out work, with request deadlines and nested-wait safety
+"""
+import time
+import threading
+import contextvars
+import logging
+import concurrent.futures
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Monotonic time by which the current request's tasks must have started; copied
+# into every task, so nested fan-outs inherit it
+_deadline: contextvars.ContextVar = contextvars.ContextVar('task_deadline', default=None)
+
+# Pool whose worker the current thread is, for nested waits
+_local = threading.local()
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """
+    Bound the tasks submitted and the waits made in the block to now + seconds
+
+    Nesting can only tighten an outer deadline. None lifts it, for work
+    meant to outlive the request (background refreshes, late hydration).
+    """
+    if seconds is None:
+        deadline = None
+    else:
+        deadline = time.monotonic() + seconds
+        outer = _deadline.get()
+        if outer is not None:
+            deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class Task(concurrent.futures.Future):
+    """A queued call, run in a copy of the submitter's context (priority, deadline)"""
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: dict):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.context = contextvars.copy_context()
+        self.deadline = _deadline.get()
+        self.queued_at = time.monotonic()
+
+
+class TaskPool:
+    """
+    Bounded pool of long-lived worker threads shared by all requests
+
+    - Workers are started on demand up to max_workers and then kept, so a
+      burst of requests reuses threads instead of creating pools per call.
+    - Tasks inherit the submitter's context: its outbound priority and its
+      request deadline. A task still queued at its deadline is not run; its
+      future fails with TimeoutError.
+    - wait() called from one of the pool's own workers runs the awaited
+      tasks that are still queued itself, so nested fan-outs cannot
+      deadlock a saturated pool.
+    - wait() cancels tasks still queued when it gives up on them.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+        self._active = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'expired': 0,
+            'inline': 0,
+            'max_queued': 0,
+            'queue_time': 0.0,
+        }
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Task:
+        """Queue fn(*args, **kwargs); returns its future"""
+        task = Task(fn, args, kwargs)
+        with self._cond:
+            self._queue.append(task)
+            self._stats['submitted'] += 1
+            self._stats['max_queued'] = max(self._stats['max_queued'], len(self._queue))
+            if len(self._queue) > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._worker, name=f'{self.name}-{len(self._threads)}', daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return task
+
+    def _worker(self):
+        _local.pool = self
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._idle += 1
+                    try:
+                        self._cond.wait()
+                    finally:
+                        self._idle -= 1
+                task = self._queue.popleft()
+            self._execute(task)
+
+    def _execute(self, task: Task):
+        if not task.set_running_or_notify_cancel():
+            with self._cond:
+                self._stats['cancelled'] += 1
+            return
+        started = time.monotonic()
+        with self._cond:
+            self._stats['queue_time'] += started - task.queued_at
+            if task.deadline is not None and started >= task.deadline:
+                self._stats['expired'] += 1
+                expired = True
+            else:
+                self._active += 1
+                expired = False
+        if expired:
+            task.set_exception(TimeoutError(f"Deadline passed before the task started ({self.name})"))
+            return
+
+        try:
+            result = task.context.run(task.fn, *task.args, **task.kwargs)
+        except BaseException as e:
+            task.set_exception(e)
+            outcome = 'failed'
+        else:
+            task.set_result(result)
+            outcome = 'completed'
+        finally:
+            # Drop references so a finished future does not pin its arguments
+            task.fn = task.args = task.kwargs = task.context = None
+        with self._cond:
+            self._active -= 1
+            self._stats[outcome] += 1
+
+    def _unqueue(self, task: Task) -> bool:
+        """Take a task off the queue before a worker gets it (lock held)"""
+        try:
+            self._queue.remove(task)
+            return True
+        except ValueError:
+            return False
+
+    def wait(self, tasks: Iterable[Task], timeout: Optional[float] = None,
+             cancel_late: bool = True) -> Tuple[Set[Task], Set[Task]]:
+        """
+        Wait for tasks of this pool to finish
+
+        Args:
+            tasks: Futures returned by submit()
+            timeout: Max seconds to wait; the request deadline applies as well
+            cancel_late: Cancel tasks still queued when the wait ends
+
+        Returns:
+            (done, not_done) sets, as concurrent.futures.wait
+        """
+        tasks = list(tasks)
+        deadline = _deadline.get()
+        if timeout is not None:
+            deadline = min(deadline, time.monotonic() + timeout) if deadline is not None else time.monotonic() + timeout
+
+        if getattr(_local, 'pool', None) is self:
+            # Nested wait: no worker may be free to pick these up, so run them here
+            for task in tasks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                with self._cond:
+                    if not self._unqueue(task):
+                        continue
+                    self._stats['inline'] += 1
+                self._execute(task)
+
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, not_done = concurrent.futures.wait(tasks, timeout=remaining)
+        if not_done and cancel_late:
+            with self._cond:
+                for task in not_done:
+                    if self._unqueue(task):
+                        task.cancel()
+                        self._stats['cancelled'] += 1
+        return done, not_done
+
+    def gather(self, fn: Callable[[Any], Any], items: Iterable[Any], timeout: Optional[float] = None,
+               default: Any = None) -> List[Any]:
+        """
+        Call fn on every item in parallel and return the results in order
+
+        Items that fail or miss the deadline yield default (errors are logged),
+        so a fan-out returns what it has instead of failing as a whole.
+        """
+        items = list(items)
+        tasks = [self.submit(fn, item) for item in items]
+        done, _ = self.wait(tasks, timeout=timeout)
+        results = []
+        for item, task in zip(items, tasks):
+            if task in done and not task.cancelled():
+                error = task.exception()
+                if error is None:
+                    results.append(task.result())
+                    continue
+                logger.error(f"{self.name} task failed for {item!r}: {error}")
+            results.append(default)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus current thread, active and queue sizes"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['workers'] = len(self._threads)
+            stats['max_workers'] = self.max_workers
+            stats['active'] = self._active
+            stats['idle'] = self._idle
+            stats['queued'] = len(self._queue)
+        started = stats['completed'] + stats['failed'] + stats['expired']
+        queue_time = stats.pop('queue_time')
+        stats['avg_queue_ms'] = round(queue_time / started * 1000, 1) if started else 0.0
+        return stats
+
+
+# Global pools by name
+_pools: Dict[str, TaskPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_executor(name: str = 'requests') -> TaskPool:
+    """Get or create a named shared pool (sizes from EXECUTOR_POOLS)"""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = TaskPool(name, Config.EXECUTOR_POOLS.get(name, Config.EXECUTOR_DEFAULT_WORKERS))
+    return pool
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every named pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
@@ -0,0 +1,259 @@
+"""
+Extractor Pool Module
+Keeps warm yt-dlp YoutubeDL instances that are shared across requests
+"""
+import json
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+import yt_dlp
+from config import Config
+from app.services.outbound import OutboundScheduler, YOUTUBE_HOST, get_outbound_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Options yt-dlp reads at extraction time (not in YoutubeDL.__init__),
+# so they can be applied per checkout without splitting the pool
+PER_CALL_OPTIONS = ('playliststart', 'playlistend', 'playlist_items')
+
+_MISSING = object()
+
+
+class _Extractor:
+    """A pooled YoutubeDL instance and its bookkeeping"""
+
+    __slots__ = ('ydl', 'uses', 'created_at', 'released_at')
+
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.uses = 0
+        self.created_at = time.time()
+        self.released_at = self.created_at
+
+
+class ExtractorPool:
+    """
+    Bounded pool of reusable YoutubeDL instances keyed by their options.
+
+    A YoutubeDL object is not thread-safe, so each instance is checked out
+    exclusively. Reusing it keeps the extractor registry, cookie jar and
+    HTTP connections warm between requests. With an outbound scheduler,
+    every checkout first waits for a YouTube slot at the calling thread's
+    priority, so all yt-dlp calls share one rate limit.
+    """
+
+    def __init__(self, max_per_key: int = 4, max_uses: int = 200, max_idle: float = 600,
+                 factory: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                 outbound: Optional[OutboundScheduler] = None):
+        self.max_per_key = max_per_key
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self._factory = factory or yt_dlp.YoutubeDL
+        self._outbound = outbound
+        self._cond = threading.Condition()
+        self._idle: Dict[str, deque] = {}
+        self._live: Dict[str, int] = {}
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait': 0.0,
+            'discarded': 0,
+            'retired': 0,
+            'timeouts': 0,
+        }
+
+    @staticmethod
+    def _key(opts: Dict[str, Any]) -> str:
+        """Stable key for an options dict"""
+        return json.dumps(opts, sort_keys=True, default=str)
+
+    @contextmanager
+    def checkout(self, opts: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        Check out a YoutubeDL instance for exclusive use
+
+        Args:
+            opts: yt-dlp options; per-call options (playlist range) are applied
+                  to the instance for this checkout only
+            timeout: Max seconds to wait for an outbound slot, then again for
+                     a free instance (default from config)
+
+        Yields:
+            A YoutubeDL instance
+        """
+        base_opts = {k: v for k, v in opts.items() if k not in PER_CALL_OPTIONS}
+        overrides = {k: v for k, v in opts.items() if k in PER_CALL_OPTIONS}
+        key = self._key(base_opts)
+
+        if self._outbound is not None:
+            self._outbound.acquire(YOUTUBE_HOST, timeout=timeout)
+        extractor = self._acquire(key, base_opts, timeout)
+        saved = {k: extractor.ydl.params.get(k, _MISSING) for k in PER_CALL_OPTIONS}
+        extractor.ydl.params.update(overrides)
+
+        healthy = True
+        try:
+            yield extractor.ydl
+        except yt_dlp.utils.YoutubeDLError:
+            # Extraction failures (unavailable video, network) leave the instance usable
+            raise
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            for k, v in saved.items():
+                if v is _MISSING:
+                    extractor.ydl.params.pop(k, None)
+                else:
+                    extractor.ydl.params[k] = v
+            self._release(key, extractor, healthy)
+
+    def _acquire(self, key: str, opts: Dict[str, Any], timeout: Optional[float]) -> _Extractor:
+        """Take an idle instance, create one, or wait for a release"""
+        if timeout is None:
+            timeout = Config.EXTRACTOR_CHECKOUT_TIMEOUT
+
+        start = time.monotonic()
+        waited = False
+        create = False
+
+        with self._cond:
+            self._stats['checkouts'] += 1
+            while True:
+                self._evict_idle(key)
+                idle = self._idle.get(key)
+                if idle:
+                    extractor = idle.pop()
+                    self._stats['hits'] += 1
+                    break
+                if self._live.get(key, 0) < self.max_per_key:
+                    self._live[key] = self._live.get(key, 0) + 1
+                    self._stats['misses'] += 1
+                    create = True
+                    break
+
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError("Timed out waiting for a free extractor")
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += wait_time
+                self._stats['max_wait'] = max(self._stats['max_wait'], wait_time)
+
+        if create:
+            try:
+                extractor = _Extractor(self._factory(dict(opts)))
+            except Exception:
+                with self._cond:
+                    self._live[key] -= 1
+                    self._cond.notify()
+                raise
+
+        extractor.uses += 1
+        return extractor
+
+    def _release(self, key: str, extractor: _Extractor, healthy: bool):
+        """Return an instance to the pool, or close it if it should not be reused"""
+        retire = extractor.uses >= self.max_uses
+        if healthy and not retire:
+            self._reset(extractor.ydl)
+            extractor.released_at = time.time()
+            with self._cond:
+                self._idle.setdefault(key, deque()).append(extractor)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._live[key] -= 1
+            self._stats['retired' if healthy else 'discarded'] += 1
+            self._cond.notify()
+        self._close(extractor.ydl)
+
+    def _evict_idle(self, key: str):
+        """Close instances of a key that sat idle too long (caller holds the lock)"""
+        idle = self._idle.get(key)
+        if not idle:
+            return
+        cutoff = time.time() - self.max_idle
+        # Oldest releases sit at the left of the deque
+        while idle and idle[0].released_at < cutoff:
+            stale = idle.popleft()
+            self._live[key] -= 1
+            self._stats['retired'] += 1
+            self._close(stale.ydl)
+
+    @staticmethod
+    def _reset(ydl):
+        """Clear per-run state that would otherwise accumulate across checkouts"""
+        printed = getattr(ydl, '_printed_messages', None)
+        if isinstance(printed, set):
+            printed.clear()
+
+    @staticmethod
+    def _close(ydl):
+        """Close an instance, releasing its HTTP connections"""
+        try:
+            close = getattr(ydl, 'close', None)
+            if close:
+                close()
+        except Exception as e:
+            logger.debug(f"Extractor close failed: {e}")
+
+    def clear(self):
+        """Close all idle instances"""
+        with self._cond:
+            for key, idle in self._idle.items():
+                while idle:
+                    self._live[key] -= 1
+                    self._close(idle.pop().ydl)
+
+    def in_use(self) -> int:
+        """Number of instances currently checked out, across all keys"""
+        with self._cond:
+            return sum(self._live.values()) - sum(len(d) for d in self._idle.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool metrics: hit rate, checkout wait and instance counts"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['live'] = sum(self._live.values())
+            stats['idle'] = sum(len(d) for d in self._idle.values())
+            stats['keys'] = len(self._live)
+
+        checkouts = stats['checkouts']
+        stats['hit_rate'] = round(stats['hits'] / checkouts, 3) if checkouts else 0.0
+        stats['avg_wait_ms'] = round(stats['wait_time'] / stats['waits'] * 1000, 1) if stats['waits'] else 0.0
+        stats['wait_time'] = round(stats['wait_time'], 3)
+        stats['max_wait'] = round(stats['max_wait'], 3)
+        return stats
+
+
+# Global extractor pool
+_extractor_pool: Optional[ExtractorPool] = None
+_extractor_pool_lock = threading.Lock()
+
+
+def get_extractor_pool() -> ExtractorPool:
+    """Get or create the global extractor pool"""
+    global _extractor_pool
+    if _extractor_pool is None:
+        with _extractor_pool_lock:
+            if _extractor_pool is None:
+                _extractor_pool = ExtractorPool(
+                    max_per_key=Config.EXTRACTOR_POOL_SIZE,
+                    max_uses=Config.EXTRACTOR_MAX_USES,
+                    max_idle=Config.EXTRACTOR_MAX_IDLE,
+                    outbound=get_outbound_scheduler(),
+                )
+    return _extractor_pool
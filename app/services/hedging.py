@@ -0,0 +1,267 @@
+"""
+Hedging Module
+Races a backup extraction engine against a slow primary, with delays tuned from latency histograms
+"""
+import bisect
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+from app.services.executor import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds: 50 ms growing by 25% per bucket to ~2 minutes
+BUCKET_BOUNDS: List[float] = [round(0.05 * 1.25 ** i, 3) for i in range(36)]
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram
+
+    Counts are halved once they reach max_samples, so percentiles follow
+    recent behaviour without keeping individual samples.
+    """
+
+    def __init__(self, max_samples: int = None, bounds: List[float] = None):
+        self.max_samples = max_samples or Config.HEDGE_HISTORY
+        self.bounds = bounds or BUCKET_BOUNDS
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._total = 0
+
+    def observe(self, seconds: float):
+        self._counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self._total += 1
+        if self._total >= self.max_samples:
+            self._counts = [c // 2 for c in self._counts]
+            self._total = sum(self._counts)
+
+    @property
+    def count(self) -> int:
+        return self._total
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile, or None when empty"""
+        if not self._total:
+            return None
+        rank = self._total * p / 100
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return self.bounds[-1]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self._total,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class _Race:
+    """Results of one hedged call, filled in by the engine threads"""
+
+    __slots__ = ('cond', 'results', 'finished')
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.results: Dict[str, Any] = {}
+        self.finished: List[str] = []
+
+
+class Hedger:
+    """
+    Runs a primary engine and, if it has not answered after the hedge
+    delay, a secondary one; the first valid result wins
+
+    The hedge delay is the HEDGE_PERCENTILE latency of the primary's recent
+    successful calls, clamped to [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY], and
+    HEDGE_DEFAULT_DELAY until HEDGE_MIN_SAMPLES calls were seen. A primary
+    that fails early starts the secondary at once. The losing engine is
+    cancelled through the caller's callback where it supports that;
+    otherwise its result is discarded when it finishes.
+    """
+
+    def __init__(self, percentile: float = None, default_delay: float = None,
+                 min_delay: float = None, max_delay: float = None, min_samples: int = None):
+        self.percentile = percentile or Config.HEDGE_PERCENTILE
+        self.default_delay = default_delay or Config.HEDGE_DEFAULT_DELAY
+        self.min_delay = min_delay if min_delay is not None else Config.HEDGE_MIN_DELAY
+        self.max_delay = max_delay or Config.HEDGE_MAX_DELAY
+        self.min_samples = min_samples or Config.HEDGE_MIN_SAMPLES
+        self._lock = threading.Lock()
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._failures: Dict[str, int] = {}
+        self._stats = {
+            'calls': 0,
+            'hedged': 0,
+            'failover': 0,
+            'cancelled': 0,
+            'unanswered': 0,
+        }
+        self._wins: Dict[str, int] = {}
+
+    def record(self, engine: str, seconds: float, ok: bool):
+        """Record one engine call; only successes shape the latency histogram"""
+        with self._lock:
+            if ok:
+                if engine not in self._latency:
+                    self._latency[engine] = LatencyHistogram()
+                self._latency[engine].observe(seconds)
+            else:
+                self._failures[engine] = self._failures.get(engine, 0) + 1
+
+    def timed(self, engine: str, fn: Callable[[], Any]) -> Any:
+        """Call fn and record its latency; a None result or an exception counts as a failure"""
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn()
+            ok = result is not None
+            return result
+        finally:
+            self.record(engine, time.monotonic() - started, ok)
+
+    def delay(self, engine: str) -> float:
+        """Seconds to give engine before hedging"""
+        with self._lock:
+            histogram = self._latency.get(engine)
+            if histogram is None or histogram.count < self.min_samples:
+                return self.default_delay
+            value = histogram.percentile(self.percentile)
+        return min(max(value, self.min_delay), self.max_delay)
+
+    def run(self, primary: tuple, secondary: tuple, timeout: Optional[float] = None,
+            cancel: Optional[Callable[[str], None]] = None) -> Tuple[Any, Optional[str]]:
+        """
+        Race two engines
+
+        Args:
+            primary, secondary: (engine name, call) or (engine name, call,
+                True). A plain call runs on the extract pool; returning None
+                or raising counts as a failure. With True the engine is
+                asynchronous: call(report) is made in the caller's thread,
+                must not block, and arranges for report(result) to be called
+                once, so waiting on remote work holds no pool thread. Calls
+                record their own latency (see timed()), since engines may
+                also be used unhedged
+            timeout: Seconds to wait once the secondary runs (None: until
+                both engines finish)
+            cancel: Called with the losing engine's name when one wins
+
+        Returns:
+            (first valid result or None, winning engine name or None)
+        """
+        race = _Race()
+        with self._lock:
+            self._stats['calls'] += 1
+
+        def start(engine: str, fn: Callable[..., Any], asynchronous: bool = False):
+            def finish(result: Any):
+                with race.cond:
+                    if engine in race.results:
+                        return
+                    race.results[engine] = result
+                    race.finished.append(engine)
+                    race.cond.notify_all()
+
+            if asynchronous:
+                try:
+                    fn(finish)
+                except Exception as e:
+                    logger.warning(f"Engine {engine} failed to start: {e}")
+                    finish(None)
+                return
+
+            def target():
+                try:
+                    result = fn()
+                except Exception as e:
+                    logger.warning(f"Engine {engine} failed: {e}")
+                    result = None
+                finish(result)
+
+            task = get_executor('extract').submit(target)
+            # A call dropped before it ran (request deadline passed) counts as a failure
+            task.add_done_callback(lambda t: finish(None) if t.cancelled() or t.exception() else None)
+
+        def winner() -> Optional[str]:
+            for engine in race.finished:
+                if race.results[engine] is not None:
+                    return engine
+            return None
+
+        primary_name, secondary_name = primary[0], secondary[0]
+        start(*primary)
+        hedge_at = time.monotonic() + self.delay(primary_name)
+        with race.cond:
+            while not race.finished and time.monotonic() < hedge_at:
+                race.cond.wait(hedge_at - time.monotonic())
+            if winner():
+                return self._won(race, winner(), None, cancel)
+
+        with self._lock:
+            self._stats['failover' if race.finished else 'hedged'] += 1
+        start(*secondary)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with race.cond:
+            while not winner() and len(race.finished) < 2:
+                if deadline is None:
+                    race.cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                race.cond.wait(remaining)
+
+            engine = winner()
+            if engine:
+                loser = secondary_name if engine == primary_name else primary_name
+                return self._won(race, engine, None if loser in race.finished else loser, cancel)
+
+        if len(race.finished) < 2:
+            with self._lock:
+                self._stats['unanswered'] += 1
+        return None, None
+
+    def _won(self, race: _Race, engine: str, loser: Optional[str],
+             cancel: Optional[Callable[[str], None]]) -> Tuple[Any, str]:
+        with self._lock:
+            self._wins[engine] = self._wins.get(engine, 0) + 1
+            if loser and cancel:
+                self._stats['cancelled'] += 1
+        if loser and cancel:
+            try:
+                cancel(loser)
+            except Exception as e:
+                logger.error(f"Error cancelling engine {loser}: {e}")
+        return race.results[engine], engine
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['wins'] = dict(self._wins)
+            stats['failures'] = dict(self._failures)
+            stats['latency'] = {engine: h.summary() for engine, h in self._latency.items()}
+        stats['delay'] = {engine: self.delay(engine) for engine in stats['latency']}
+        return stats
+
+
+# Global hedger
+_hedger: Optional[Hedger] = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    """Get or create the global engine hedger"""
+    global _hedger
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger()
+    return _hedger
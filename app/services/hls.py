@@ -0,0 +1,225 @@
+"""
+HLS Module
+Manifest detection, rewriting and caching for /video_proxy
+"""
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Rewritten lines are sent to the client in blocks of this many
+_STREAM_BATCH_LINES = 256
+
+
+def is_manifest(url: str, content_type: str) -> bool:
+    """Whether an upstream response is an HLS manifest rather than media bytes"""
+    content_type = (content_type or "").lower()
+    url_path = url.split("?")[0]
+    # YouTube may send manifests as text/plain or octet-stream
+    return (
+        url_path.endswith(".m3u8")
+        or "mpegurl" in content_type
+        or "m3u8" in url_path.lower()
+        or ("/playlist/" in url.lower() and "index.m3u8" in url.lower())
+    )
+
+
+class Playlist:
+    """
+    What one pass over a manifest learned about it
+
+    Filled in while its lines are rewritten, so the manifest is only
+    walked once.
+    """
+
+    __slots__ = ('target_duration', 'ended', 'is_master', 'uri_count')
+
+    def __init__(self):
+        self.target_duration: Optional[float] = None
+        self.ended = False
+        self.is_master = False
+        self.uri_count = 0
+
+    def observe_tag(self, tag: str):
+        if tag.startswith("#EXT-X-TARGETDURATION:"):
+            try:
+                self.target_duration = float(tag.split(":", 1)[1])
+            except ValueError:
+                pass
+        elif tag.startswith("#EXT-X-ENDLIST") or tag == "#EXT-X-PLAYLIST-TYPE:VOD":
+            self.ended = True
+        elif tag.startswith("#EXT-X-STREAM-INF"):
+            self.is_master = True
+
+    @property
+    def is_live(self) -> bool:
+        return not (self.ended or self.is_master)
+
+
+def rewrite_lines(lines: Iterable[str], url: str, link: Callable[[str], str],
+                  playlist: Optional[Playlist] = None) -> Iterator[str]:
+    """
+    Point every URI line of an HLS manifest back at /video_proxy
+
+    Args:
+        lines: Manifest lines (without line endings)
+        url: URL the manifest was fetched from, for resolving relative URIs
+        link: Builds the proxy link for an absolute segment URL
+        playlist: Optional Playlist to record tags into
+
+    Yields:
+        Rewritten lines
+    """
+    base_url = url.rsplit("/", 1)[0] + "/"
+    for line in lines:
+        line_stripped = line.strip()
+        if line_stripped and not line_stripped.startswith("#"):
+            full_url = line_stripped if line_stripped.startswith("http") else base_url + line_stripped
+            if playlist is not None:
+                playlist.uri_count += 1
+            yield link(full_url)
+        else:
+            if playlist is not None and line_stripped.startswith("#EXT"):
+                playlist.observe_tag(line_stripped)
+            yield line
+
+
+def rewrite_manifest(content: str, url: str, link: Callable[[str], str]) -> str:
+    """Rewrite a whole manifest held in memory, see rewrite_lines()"""
+    return "\n".join(rewrite_lines(content.splitlines(), url, link))
+
+
+def _flush(link: Callable[[str], str]):
+    flush = getattr(link, "flush", None)
+    if flush:
+        flush()
+
+
+class ManifestCache:
+    """
+    Rewritten manifests, per (manifest URL, variant)
+
+    The variant identifies what else shaped the links, e.g. the header
+    overrides carried onto segments. Link builders with a flush() method
+    (token links) are flushed before the rewritten text is handed out.
+
+    A live playlist is kept for its target duration, the soonest it can
+    change; VOD and master playlists for HLS_VOD_TTL. Large VOD playlists
+    are rewritten while streaming to the client and only cached when they
+    fit the per-entry size limit.
+    """
+
+    def __init__(self, max_items: int = None, max_entry_bytes: int = None, vod_ttl: int = None):
+        self.max_items = max_items or Config.HLS_CACHE_ITEMS
+        self.max_entry_bytes = max_entry_bytes or Config.HLS_CACHE_MAX_ENTRY_BYTES
+        self.vod_ttl = vod_ttl or Config.HLS_VOD_TTL
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stored': 0,
+            'too_large': 0,
+        }
+
+    def ttl_for(self, playlist: Playlist) -> float:
+        if playlist.is_live:
+            return playlist.target_duration or Config.HLS_LIVE_DEFAULT_TTL
+        return self.vod_ttl
+
+    def get(self, url: str, variant: Hashable) -> Optional[str]:
+        """Cached rewritten manifest, if still fresh"""
+        key = (url, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+        return None
+
+    def _store(self, url: str, variant: Hashable, body: str, playlist: Playlist):
+        key = (url, variant)
+        with self._lock:
+            self._entries[key] = (body, time.time() + self.ttl_for(playlist))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+            self._stats['stored'] += 1
+
+    def rewrite_text(self, content: str, url: str, variant: Hashable, link: Callable[[str], str]) -> str:
+        """Rewrite a manifest held in memory and cache the result"""
+        playlist = Playlist()
+        body = "\n".join(rewrite_lines(content.splitlines(), url, link, playlist))
+        _flush(link)
+        if len(body) <= self.max_entry_bytes:
+            self._store(url, variant, body, playlist)
+        else:
+            self._count('too_large')
+        return body
+
+    def rewrite_stream(self, lines: Iterable[str], url: str, variant: Hashable,
+                       link: Callable[[str], str]) -> Iterator[str]:
+        """
+        Rewrite a manifest as its lines arrive, yielding blocks of output
+
+        The output is also collected for the cache until it outgrows the
+        per-entry limit; after that it is only streamed.
+        """
+        playlist = Playlist()
+        collected: Optional[List[str]] = []
+        size = 0
+        batch: List[str] = []
+        for line in rewrite_lines(lines, url, link, playlist):
+            batch.append(line)
+            if len(batch) >= _STREAM_BATCH_LINES:
+                block = "\n".join(batch) + "\n"
+                batch = []
+                _flush(link)
+                if collected is not None:
+                    size += len(block)
+                    collected.append(block)
+                    if size > self.max_entry_bytes:
+                        collected = None
+                        self._count('too_large')
+                yield block
+
+        block = "\n".join(batch)
+        _flush(link)
+        if block:
+            yield block
+        if collected is not None:
+            collected.append(block)
+            self._store(url, variant, "".join(collected), playlist)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+
+# Global manifest cache
+_manifest_cache: Optional[ManifestCache] = None
+_manifest_cache_lock = threading.Lock()
+
+
+def get_manifest_cache() -> ManifestCache:
+    """Get or create the global manifest cache"""
+    global _manifest_cache
+    if _manifest_cache is None:
+        with _manifest_cache_lock:
+            if _manifest_cache is None:
+                _manifest_cache = ManifestCache()
+    return _manifest_cache
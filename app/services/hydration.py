@@ -0,0 +1,152 @@
+"""
+Hydration Engine Module
+Bounded, deadline-aware fan-out for per-video metadata fetches
+"""
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+from config import Config
+from app.services.executor import Task, TaskPool, request_deadline
+
+logger = logging.getLogger(__name__)
+
+
+class HydrationEngine:
+    """
+    Fan per-item fetches out over one shared, bounded worker pool
+
+    - Concurrency per upstream host is capped, independent of pool size.
+    - Each item has a deadline; an item still queued past it is dropped
+      rather than spending an upstream call nobody is waiting for.
+    - hydrate() returns whatever finished by the caller's deadline. Items
+      still running keep going and report through on_result, so their data
+      is in the store for the next request.
+    - An item already in flight for another request is joined, not refetched.
+    """
+
+    def __init__(self, max_workers: int = None, per_host_limit: int = None, item_timeout: float = None):
+        self.max_workers = max_workers or Config.HYDRATION_WORKERS
+        self.per_host_limit = per_host_limit or Config.HYDRATION_PER_HOST
+        self.item_timeout = item_timeout or Config.HYDRATION_ITEM_TIMEOUT
+        self._pool = TaskPool('hydrate', self.max_workers)
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: Dict[str, Task] = {}
+        self._stats = {
+            'submitted': 0,
+            'joined': 0,
+            'completed': 0,
+            'failed': 0,
+            'expired': 0,
+            'late': 0,
+        }
+
+    def _host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return slot
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def _run(self, key: str, fetch: Callable[[str], Any], host: str, item_deadline: float,
+             on_result: Optional[Callable[[str, Any], None]]) -> Any:
+        """Worker body: respect the item deadline and host limit, then fetch"""
+        try:
+            remaining = item_deadline - time.monotonic()
+            slot = self._host_slot(host)
+            if remaining <= 0 or not slot.acquire(timeout=remaining):
+                self._count('expired')
+                return None
+            try:
+                result = fetch(key)
+            finally:
+                slot.release()
+
+            if result is not None and on_result:
+                on_result(key, result)
+            self._count('completed')
+            return result
+
+        except Exception as e:
+            self._count('failed')
+            logger.warning(f"Hydration failed for {key}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def hydrate(self, keys: Iterable[str], fetch: Callable[[str], Any], deadline: float = None,
+                host: str = 'www.youtube.com',
+                on_result: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        Fetch many items in parallel, returning what finishes in time
+
+        Args:
+            keys: Item keys (video IDs)
+            fetch: Called with one key in a worker thread; returns a result or None
+            deadline: Seconds the caller is willing to wait (default from config)
+            host: Upstream host, for the per-host concurrency limit
+            on_result: Called in the worker with (key, result) for every
+                       successful fetch, including ones that finish late
+
+        Returns:
+            key -> result for items that completed within the deadline
+        """
+        if deadline is None:
+            deadline = Config.HYDRATION_DEADLINE
+
+        item_deadline = time.monotonic() + self.item_timeout
+        futures = {}
+        # Items outlive the request (late results still reach on_result), so
+        # they follow item_timeout rather than the request deadline
+        with self._lock, request_deadline(None):
+            for key in dict.fromkeys(keys):
+                future = self._in_flight.get(key)
+                if future is not None:
+                    self._stats['joined'] += 1
+                else:
+                    # _run clears its entry under this lock, so it cannot finish before we record it
+                    future = self._pool.submit(self._run, key, fetch, host, item_deadline, on_result)
+                    self._in_flight[key] = future
+                    self._stats['submitted'] += 1
+                futures[future] = key
+
+        done, pending = self._pool.wait(futures, timeout=deadline, cancel_late=False)
+        if pending:
+            self._count('late', len(pending))
+            logger.info(f"Hydration deadline hit: {len(done)} done, {len(pending)} still running")
+
+        results = {}
+        for future in done:
+            result = future.result()
+            if result is not None:
+                results[futures[future]] = result
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus current queue/in-flight sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._in_flight)
+        stats['queued'] = self._pool.stats()['queued']
+        return stats
+
+
+# Global hydration engine
+_hydration_engine: Optional[HydrationEngine] = None
+_hydration_engine_lock = threading.Lock()
+
+
+def get_hydration_engine() -> HydrationEngine:
+    """Get or create the global hydration engine"""
+    global _hydration_engine
+    if _hydration_engine is None:
+        with _hydration_engine_lock:
+            if _hydration_engine is None:
+                _hydration_engine = HydrationEngine()
+    return _hydration_engine
@@ -0,0 +1,192 @@
+"""
+Janitor Module
+Periodic cleanup of expired cache rows, the video_cache size budget and free pages
+"""
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+from app.services.database import ConnectionPool, get_pool
+from app.services.cache import LeaseService
+
+logger = logging.getLogger(__name__)
+
+# Tables with an expires_at column, and how to size a row for reporting
+EXPIRING_TABLES: List[Tuple[str, str]] = [
+    ('video_cache', 'COALESCE(size, LENGTH(data))'),
+    ('shared_cache', 'COALESCE(size, LENGTH(data))'),
+    ('proxy_tokens', 'LENGTH(url) + COALESCE(LENGTH(headers), 0)'),
+    ('cache_leases', '0'),
+]
+
+
+class CacheJanitor:
+    """
+    Keeps kvtube.db from growing without bound
+
+    Each pass, run by one worker at a time under a lease:
+    - deletes expired rows from the cache tables, JANITOR_BATCH rows per
+      transaction so request writes interleave;
+    - evicts least recently read video_cache rows while the table is over
+      VIDEO_CACHE_MAX_BYTES;
+    - returns up to JANITOR_VACUUM_PAGES free pages to the filesystem
+      (databases created with incremental auto_vacuum only).
+    """
+
+    def __init__(self, interval: float = None, batch_size: int = None, max_bytes: int = None,
+                 vacuum_pages: int = None, pool: ConnectionPool = None):
+        self.interval = interval or Config.JANITOR_INTERVAL
+        self.batch_size = batch_size or Config.JANITOR_BATCH
+        self.max_bytes = max_bytes if max_bytes is not None else Config.VIDEO_CACHE_MAX_BYTES
+        self.vacuum_pages = vacuum_pages or Config.JANITOR_VACUUM_PAGES
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'runs': 0,
+            'expired_rows': 0,
+            'expired_bytes': 0,
+            'evicted_rows': 0,
+            'evicted_bytes': 0,
+            'vacuumed_bytes': 0,
+            'errors': 0,
+            'last_run': None,
+            'last_duration_ms': None,
+        }
+
+    def _get_pool(self) -> ConnectionPool:
+        return self._pool or get_pool()
+
+    def start(self):
+        """Start the janitor thread (once per worker)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cache-janitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not LeaseService.acquire('cache_janitor', ttl=self.interval):
+                continue
+            # The lease is left to lapse, so other workers skip this interval
+            self.run_once()
+
+    def run_once(self) -> Dict[str, int]:
+        """One cleanup pass; returns what it reclaimed"""
+        started = time.monotonic()
+        result = {'expired_rows': 0, 'expired_bytes': 0, 'evicted_rows': 0, 'evicted_bytes': 0,
+                  'vacuumed_bytes': 0}
+        try:
+            now = time.time()
+            for table, size_expr in EXPIRING_TABLES:
+                rows, size = self._delete_batches(
+                    f'SELECT rowid, {size_expr} FROM {table} WHERE expires_at < ? LIMIT ?', (now,), table
+                )
+                result['expired_rows'] += rows
+                result['expired_bytes'] += size
+
+            if self.max_bytes:
+                rows, size = self._evict_over_budget()
+                result['evicted_rows'] += rows
+                result['evicted_bytes'] += size
+
+            result['vacuumed_bytes'] = self._incremental_vacuum()
+
+        except Exception as e:
+            logger.error(f"Cache janitor error: {e}")
+            self._count('errors')
+
+        with self._lock:
+            for stat, value in result.items():
+                self._stats[stat] += value
+            self._stats['runs'] += 1
+            self._stats['last_run'] = time.time()
+            self._stats['last_duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+        if result['expired_rows'] or result['evicted_rows']:
+            logger.info(
+                f"Cache janitor: {result['expired_rows']} expired and {result['evicted_rows']} evicted rows "
+                f"({result['expired_bytes'] + result['evicted_bytes']} bytes), "
+                f"{result['vacuumed_bytes']} bytes returned to disk"
+            )
+        return result
+
+    def _delete_batches(self, select: str, params: tuple, table: str,
+                        limit_bytes: int = None) -> Tuple[int, int]:
+        """
+        Delete rows picked by select (rowid, size) one batch per transaction
+
+        Stops when select finds nothing, or once limit_bytes have been freed.
+        """
+        rows = size = 0
+        while True:
+            with self._get_pool().connection() as conn:
+                batch = conn.execute(select, params + (self.batch_size,)).fetchall()
+                if not batch:
+                    break
+                if limit_bytes is not None:
+                    kept = []
+                    for row in batch:
+                        if size >= limit_bytes:
+                            break
+                        kept.append(row)
+                        size += row[1] or 0
+                    batch = kept
+                else:
+                    size += sum(row[1] or 0 for row in batch)
+                conn.executemany(f'DELETE FROM {table} WHERE rowid = ?', [(row[0],) for row in batch])
+                rows += len(batch)
+            if len(batch) < self.batch_size or (limit_bytes is not None and size >= limit_bytes):
+                break
+        return rows, size
+
+    def _evict_over_budget(self) -> Tuple[int, int]:
+        """Drop least recently read video_cache rows until the table fits max_bytes"""
+        with self._get_pool().connection() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(COALESCE(size, LENGTH(data))), 0) FROM video_cache').fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return 0, 0
+        return self._delete_batches(
+            'SELECT rowid, COALESCE(size, LENGTH(data)) FROM video_cache '
+            'ORDER BY last_access LIMIT ?', (), 'video_cache', limit_bytes=excess
+        )
+
+    def _incremental_vacuum(self) -> int:
+        """Release free pages; returns bytes given back to the filesystem"""
+        with self._get_pool().connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not before:
+                return 0
+            # executescript steps the pragma to completion; execute() frees one page
+            conn.executescript(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)});')
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (before - after) * page_size
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+
+# Global janitor
+_janitor: Optional[CacheJanitor] = None
+_janitor_lock = threading.Lock()
+
+
+def get_cache_janitor() -> CacheJanitor:
+    """Get or create the global cache janitor"""
+    global _janitor
+    if _janitor is None:
+        with _janitor_lock:
+            if _janitor is None:
+                _janitor = CacheJanitor()
+    return _janitor
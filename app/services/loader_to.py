@@ -1,114 +1,547 @@
-
 import requests
+import heapq
+import itertools
+import os
+import secrets
+import threading
 import time
 import logging
-import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from config import Config
+from app.services.hedging import get_hedger
+from app.services.circuit_breaker import get_breaker
+from app.services.outbound import current_priority, outbound_priority, get_outbound_scheduler
+from app.services.cache import TieredCache, get_shared_cache
+from app.services.executor import get_executor
 
 logger = logging.getLogger(__name__)
 
+
+class JobPending(Exception):
+    """Raised when a remote job did not finish within the caller's wait"""
+
+    def __init__(self, job: 'LoaderToJob'):
+        super().__init__(f"Remote job {job.id} still running")
+        self.job = job
+
+
+class LoaderToJob:
+    """A loader.to conversion task, driven by the LoaderToJobs scheduler"""
+
+    __slots__ = ('id', 'video_url', 'format_id', 'task_id', 'progress_url', 'info', 'status',
+                 'result', 'error', 'created_at', 'deadline', 'delay', 'next_poll', 'polls',
+                 'priority', 'follows', 'subscribers', 'done', '_lock', '_callbacks')
+
+    def __init__(self, video_url: str, format_id: str, timeout: float):
+        self.id = secrets.token_urlsafe(9)
+        self.video_url = video_url
+        self.format_id = format_id
+        self.task_id: Optional[str] = None
+        self.progress_url: Optional[str] = None
+        self.info: Dict[str, Any] = {}
+        self.status = 'pending'  # pending, done, failed, cancelled
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.deadline = time.monotonic() + timeout
+        self.delay = Config.LOADER_TO_POLL_INITIAL
+        self.next_poll = time.monotonic()
+        self.polls = 0
+        # Outbound priority of whoever submitted the job
+        self.priority = current_priority()
+        # Mirrors a job another worker runs, read from the shared record
+        self.follows = False
+        # Callers that submitted or joined the job here, see LoaderToJobs.release()
+        self.subscribers = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[str, Callable[['LoaderToJob'], None]] = {}
+
+    @property
+    def pending(self) -> bool:
+        return not self.done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block up to timeout seconds (None: until finished); returns the result if done"""
+        self.done.wait(timeout)
+        return self.result
+
+    def retry_after(self) -> float:
+        """Seconds until the scheduler next checks on the task"""
+        return max(0.0, self.next_poll - time.monotonic())
+
+    def add_done_callback(self, name: str, fn: Callable[['LoaderToJob'], None]):
+        """
+        Call fn(job) on the scheduler thread once the job finishes
+
+        A callback registered again under the same name replaces the first,
+        so callers that re-check a job on every poll register it once.
+        """
+        with self._lock:
+            if self.pending:
+                self._callbacks[name] = fn
+                return
+        fn(self)
+
+    def remove_done_callback(self, name: str):
+        """Drop a callback registered under name, if it has not run yet"""
+        with self._lock:
+            self._callbacks.pop(name, None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job': self.id,
+            'status': self.status,
+            'error': self.error,
+            'polls': self.polls,
+            'age': round(time.time() - self.created_at, 1),
+            'retry_after': round(self.retry_after(), 1),
+        }
+
+
+class LoaderToJobs:
+    """
+    Runs loader.to tasks from one scheduler thread per worker
+
+    submit() returns a job handle right away; the scheduler starts the
+    remote task, then polls its progress with exponential backoff
+    (LOADER_TO_POLL_INITIAL doubling up to LOADER_TO_POLL_MAX) through one
+    shared HTTP session, until it succeeds, fails or reaches
+    LOADER_TO_TIMEOUT. The scheduler thread only keeps the timing heap:
+    each due start or poll runs on the background pool and requeues its
+    job when it returns, so a slow or rate-limited call does not hold up
+    the other jobs. Concurrent submits for the same video and format share
+    one job. Finished jobs stay addressable for LOADER_TO_JOB_TTL.
+
+    Each job is also published to the shared cache tier (SHARED_NAMESPACE),
+    so a poll that lands on another worker joins it instead of extracting
+    again: that worker follows the record, polling SQLite rather than
+    loader.to, and a finished record hands over its result directly.
+
+    Every submit() counts as a subscriber of the job it returns. A caller
+    that no longer needs a job calls release(); the job is cancelled only
+    once no other caller here, or follower on another worker, joined it.
+    """
+
+    SHARED_NAMESPACE = 'loader_job'
+
+    def __init__(self, timeout: float = None, job_ttl: float = None, cache: TieredCache = None):
+        self.timeout = timeout or Config.LOADER_TO_TIMEOUT
+        self.job_ttl = job_ttl or Config.LOADER_TO_JOB_TTL
+        self._cache = cache
+        # Tells this scheduler's records from other workers'
+        self.owner = f"{os.getpid()}:{secrets.token_hex(4)}"
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, LoaderToJob] = {}
+        self._active: Dict[Tuple[str, str], LoaderToJob] = {}
+        self._heap: List[Tuple[float, int, LoaderToJob]] = []
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'submitted': 0,
+            'joined': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'cancelled': 0,
+            'polls': 0,
+            'followed': 0,
+        }
+
+    def submit(self, video_url: str, format_id: str = "1080") -> LoaderToJob:
+        """Start (or join) the task for a video and format; never blocks on the network"""
+        job = self._start_or_join(video_url, format_id)
+        with self._cond:
+            job.subscribers += 1
+        return job
+
+    def _start_or_join(self, video_url: str, format_id: str) -> LoaderToJob:
+        """The local or followed job for a video and format, or a new one"""
+        with self._cond:
+            job = self._active.get((video_url, format_id))
+            if job is not None:
+                self._stats['joined'] += 1
+                return job
+
+        job = self._follow(video_url, format_id, finished=True)
+        if job is not None:
+            return job
+
+        with self._cond:
+            job = self._active.get((video_url, format_id))
+            if job is not None:
+                self._stats['joined'] += 1
+                return job
+
+            self._prune()
+            job = LoaderToJob(video_url, format_id, self.timeout)
+            self._jobs[job.id] = job
+            self._active[(video_url, format_id)] = job
+            self._stats['submitted'] += 1
+            self._schedule(job)
+        self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[LoaderToJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def find(self, video_url: str, format_id: str = "1080") -> Optional[LoaderToJob]:
+        """The unfinished job for a video and format, if any, on this worker or another"""
+        with self._cond:
+            job = self._active.get((video_url, format_id))
+        return job or self._follow(video_url, format_id)
+
+    def _shared(self) -> TieredCache:
+        return self._cache or get_shared_cache()
+
+    @staticmethod
+    def _record_key(video_url: str, format_id: str) -> str:
+        return f"{format_id}:{video_url}"
+
+    @classmethod
+    def _joined_key(cls, video_url: str, format_id: str) -> str:
+        """Marker left by workers following a job, so its owner keeps it running"""
+        return f"{cls._record_key(video_url, format_id)}:joined"
+
+    def _publish(self, job: LoaderToJob):
+        """Write the job's state where other workers find it"""
+        record = {
+            'job': job.id,
+            'owner': self.owner,
+            'status': job.status,
+            'result': job.result,
+            'error': job.error,
+            'created_at': job.created_at,
+        }
+        ttl = self.timeout + Config.LOADER_TO_POLL_MAX if job.pending else self.job_ttl
+        self._shared().set(self.SHARED_NAMESPACE, self._record_key(job.video_url, job.format_id), record, ttl=ttl)
+
+    def _read_record(self, video_url: str, format_id: str) -> Optional[Dict[str, Any]]:
+        """Another worker's record for a video and format"""
+        record = self._shared().get_shared(self.SHARED_NAMESPACE, self._record_key(video_url, format_id))
+        if not record or record.get('owner') == self.owner:
+            return None
+        return record
+
+    @staticmethod
+    def _apply_record(job: LoaderToJob, record: Optional[Dict[str, Any]]) -> bool:
+        """Copy a finished record into a following job; True when it is finished"""
+        if record is None:
+            job.error = 'job record lost'
+            return True
+        if record['status'] == 'pending':
+            return False
+        job.result = record.get('result')
+        job.error = record.get('error') or (None if job.result else record['status'])
+        return True
+
+    def _follow(self, video_url: str, format_id: str, finished: bool = False) -> Optional[LoaderToJob]:
+        """
+        Join a job another worker runs, as a local job that follows its record
+
+        Pending records are always joined; successful finished ones only
+        with finished=True, handing their result over at once.
+        """
+        record = self._read_record(video_url, format_id)
+        if record is None or not (record['status'] == 'pending' or (finished and record['status'] == 'done')):
+            return None
+
+        with self._cond:
+            job = self._active.get((video_url, format_id))
+            if job is not None:
+                return job
+            self._prune()
+            job = LoaderToJob(video_url, format_id, self.timeout)
+            job.id = record['job']
+            job.created_at = record['created_at']
+            job.follows = True
+            self._jobs[job.id] = job
+            self._active[(video_url, format_id)] = job
+            self._stats['followed'] += 1
+            done = self._apply_record(job, record)
+            if not done:
+                self._schedule(job)
+        if done:
+            self._finish(job)
+        else:
+            self._shared().set(self.SHARED_NAMESPACE, self._joined_key(video_url, format_id), self.owner,
+                               ttl=self.timeout + Config.LOADER_TO_POLL_MAX)
+        return job
+
+    def _schedule(self, job: LoaderToJob):
+        """Queue a job for the scheduler thread (lock held)"""
+        self._push(job)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='loader-to-jobs', daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def cancel(self, job: LoaderToJob):
+        """Stop polling a job nobody needs anymore (its callbacks still run)"""
+        self._finish(job, 'cancelled')
+
+    def release(self, job: LoaderToJob) -> bool:
+        """
+        Drop one subscriber's interest in a job, cancelling it if nobody else joined
+
+        Returns:
+            True if the job was cancelled
+        """
+        with self._cond:
+            job.subscribers = max(job.subscribers - 1, 0)
+            if job.subscribers or not job.pending:
+                return False
+        if not job.follows and self._shared().get_shared(
+                self.SHARED_NAMESPACE, self._joined_key(job.video_url, job.format_id)):
+            # Followed from another worker
+            return False
+        self.cancel(job)
+        return True
+
+    def _push(self, job: LoaderToJob):
+        heapq.heappush(self._heap, (job.next_poll, next(self._seq), job))
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id, job in list(self._jobs.items()):
+            if not job.pending and job.created_at < cutoff:
+                del self._jobs[job_id]
+
+    def _run(self):
+        pool = get_executor('background')
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, job = heapq.heappop(self._heap)
+            if not job.pending:
+                # Cancelled while queued
+                continue
+            pool.submit(self._run_step, job)
+
+    def _run_step(self, job: LoaderToJob):
+        """Step a due job on a pool worker, then finish it or queue its next poll"""
+        try:
+            with outbound_priority(job.priority):
+                finished = self._step(job)
+        except Exception as e:
+            logger.error(f"Loader.to job {job.id} error: {e}")
+            job.error = str(e)
+            finished = True
+
+        if not finished and time.monotonic() >= job.deadline:
+            logger.error(f"Loader.to timed out waiting for {job.video_url}")
+            job.error = 'timed out'
+            self._count('timed_out')
+            finished = True
+
+        if finished:
+            self._finish(job)
+        elif job.pending:
+            with self._cond:
+                job.next_poll = min(time.monotonic() + job.delay, job.deadline)
+                job.delay = min(job.delay * 2, Config.LOADER_TO_POLL_MAX)
+                self._push(job)
+                self._cond.notify()
+
+    def _step(self, job: LoaderToJob) -> bool:
+        """Start or poll the remote task once; True when the job is finished"""
+        if job.follows:
+            return self._apply_record(job, self._read_record(job.video_url, job.format_id))
+
+        if job.progress_url is None:
+            data = LoaderToService.start_task(job.video_url, job.format_id)
+            if data is None:
+                job.error = 'initial request failed'
+                return True
+            job.task_id = data.get('id')
+            job.info = data.get('info') or {}
+            job.progress_url = data.get('progress_url')
+            # If progress_url is missing, construct it manually (fallback)
+            if not job.progress_url and job.task_id:
+                job.progress_url = f"{LoaderToService.BASE_URL}{LoaderToService.PROGRESS_ENDPOINT}?id={job.task_id}"
+            if not job.progress_url:
+                logger.error("No progress URL found")
+                job.error = 'no progress URL'
+                return True
+            logger.info(f"Loader.to task started: {job.task_id}")
+            return False
+
+        job.polls += 1
+        self._count('polls')
+        state, payload = LoaderToService.check_progress(job.progress_url)
+        if state == 'done':
+            logger.info("Loader.to extraction successful")
+            job.result = LoaderToService.to_video_info(payload, job.info, job.format_id)
+            return True
+        if state == 'failed':
+            logger.error(f"Loader.to task failed: {payload}")
+            job.error = str(payload)
+            return True
+        return False
+
+    def _finish(self, job: LoaderToJob, status: str = None):
+        with self._cond:
+            if job.status != 'pending':
+                return
+            job.status = status or ('done' if job.result else 'failed')
+            if job.status == 'cancelled':
+                job.error = 'cancelled'
+            self._stats[{'done': 'succeeded'}.get(job.status, job.status)] += 1
+            if self._active.get((job.video_url, job.format_id)) is job:
+                del self._active[(job.video_url, job.format_id)]
+        if not job.follows:
+            self._publish(job)
+        if job.status != 'cancelled' and not job.follows:
+            seconds = time.time() - job.created_at
+            get_hedger().record('remote', seconds, job.status == 'done')
+            get_breaker('remote').record(job.status == 'done', seconds)
+        with job._lock:
+            callbacks = list(job._callbacks.values())
+            job._callbacks.clear()
+            job.done.set()
+
+        for fn in callbacks:
+            try:
+                fn(job)
+            except Exception as e:
+                logger.error(f"Loader.to job {job.id} callback error: {e}")
+
+    def _count(self, stat: str):
+        with self._cond:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['active'] = len(self._active)
+        return stats
+
+
 class LoaderToService:
     """Service for interacting with loader.to / savenow.to API"""
-    
-    BASE_URL = "https://p.savenow.to"
+
+    HOST = "p.savenow.to"
+    BASE_URL = f"https://{HOST}"
     DOWNLOAD_ENDPOINT = "/ajax/download.php"
     PROGRESS_ENDPOINT = "/api/progress"
-    
+
+    # Using curl-like headers to avoid bot detection
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://loader.to/',
+        'Origin': 'https://loader.to'
+    }
+
+    _session: Optional[requests.Session] = None
+    _jobs: Optional[LoaderToJobs] = None
+    _lock = threading.Lock()
+
     @classmethod
-    def get_stream_url(cls, video_url: str, format_id: str = "1080") -> Optional[Dict[str, Any]]:
+    def session(cls) -> requests.Session:
+        """Shared HTTP session (keeps the connection to loader.to open between polls)"""
+        if cls._session is None:
+            with cls._lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    session.headers.update(cls.HEADERS)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def jobs(cls) -> LoaderToJobs:
+        """Get or create this worker's job scheduler"""
+        if cls._jobs is None:
+            with cls._lock:
+                if cls._jobs is None:
+                    cls._jobs = LoaderToJobs()
+        return cls._jobs
+
+    @classmethod
+    def submit(cls, video_url: str, format_id: str = "1080") -> LoaderToJob:
+        """Start fetching a video via loader.to; returns a job handle immediately"""
+        return cls.jobs().submit(video_url, format_id)
+
+    @classmethod
+    def get_stream_url(cls, video_url: str, format_id: str = "1080",
+                       timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Get download URL for a video via loader.to
-        
+
         Args:
             video_url: Full YouTube URL
             format_id: Target format (1080, 720, 4k, etc.)
-            
+            timeout: Seconds to wait (default: until the job finishes)
+
         Returns:
             Dict containing 'stream_url' and available metadata, or None
         """
-        try:
-            # 1. Initiate Download
-            params = {
-                'format': format_id,
-                'url': video_url,
-                'api_key': Config.LOADER_TO_API_KEY
-            }
-            
-            # Using curl-like headers to avoid bot detection
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': 'https://loader.to/',
-                'Origin': 'https://loader.to'
-            }
-            
-            logger.info(f"Initiating Loader.to fetch for {video_url}")
-            response = requests.get(
-                f"{cls.BASE_URL}{cls.DOWNLOAD_ENDPOINT}", 
-                params=params, 
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('success') and not data.get('id'):
-                logger.error(f"Loader.to initial request failed: {data}")
-                return None
-                
-            task_id = data.get('id')
-            info = data.get('info', {})
-            logger.info(f"Loader.to task started: {task_id}")
-            
-            # 2. Poll for progress
-            # Timeout after 60 seconds
-            start_time = time.time()
-            while time.time() - start_time < 60:
-                progress_url = data.get('progress_url')
-                # If progress_url is missing, construct it manually (fallback)
-                if not progress_url and task_id:
-                     progress_url = f"{cls.BASE_URL}/api/progress?id={task_id}"
-
-                if not progress_url:
-                     logger.error("No progress URL found")
-                     return None
-
-                p_res = requests.get(progress_url, headers=headers, timeout=10)
-                if p_res.status_code != 200:
-                    logger.warning(f"Progress check failed: {p_res.status_code}")
-                    time.sleep(2)
-                    continue
-                    
-                p_data = p_res.json()
-                
-                # Check for success (success can be boolean true or int 1)
-                is_success = p_data.get('success') in [True, 1, '1']
-                text_status = p_data.get('text', '').lower()
-                
-                if is_success and p_data.get('download_url'):
-                    logger.info("Loader.to extraction successful")
-                    return {
-                        'stream_url': p_data['download_url'],
-                        'title': info.get('title') or 'Unknown Title',
-                        'thumbnail': info.get('image'),
-                        # Add basic fields to match yt-dlp dict structure
-                        'description': f"Fetched via Loader.to (Format: {format_id})",
-                        'uploader': 'Unknown',
-                        'duration': None,
-                        'view_count': 0
-                    }
-                
-                # Check for failure
-                if 'error' in text_status or 'failed' in text_status: 
-                   logger.error(f"Loader.to task failed: {text_status}")
-                   return None
-
-                # Wait before next poll
-                time.sleep(2)
-            
-            logger.error("Loader.to timed out waiting for video")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Loader.to service error: {e}")
+        return cls.submit(video_url, format_id).wait(timeout)
+
+    @classmethod
+    def start_task(cls, video_url: str, format_id: str) -> Optional[Dict[str, Any]]:
+        """Initiate a download task; returns loader.to's response or None"""
+        params = {
+            'format': format_id,
+            'url': video_url,
+            'api_key': Config.LOADER_TO_API_KEY
+        }
+
+        logger.info(f"Initiating Loader.to fetch for {video_url}")
+        get_outbound_scheduler().acquire(cls.HOST)
+        response = cls.session().get(
+            f"{cls.BASE_URL}{cls.DOWNLOAD_ENDPOINT}",
+            params=params,
+            timeout=10
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        if not data.get('success') and not data.get('id'):
+            logger.error(f"Loader.to initial request failed: {data}")
             return None
+        return data
+
+    @classmethod
+    def check_progress(cls, progress_url: str) -> Tuple[str, Any]:
+        """
+        Poll a task once
+
+        Returns:
+            ('done', progress data), ('failed', status text) or ('running', None)
+        """
+        get_outbound_scheduler().acquire(cls.HOST)
+        p_res = cls.session().get(progress_url, timeout=10)
+        if p_res.status_code != 200:
+            logger.warning(f"Progress check failed: {p_res.status_code}")
+            return 'running', None
+
+        p_data = p_res.json()
+
+        # Check for success (success can be boolean true or int 1)
+        is_success = p_data.get('success') in [True, 1, '1']
+        text_status = (p_data.get('text') or '').lower()
+
+        if is_success and p_data.get('download_url'):
+            return 'done', p_data
+
+        # Check for failure
+        if 'error' in text_status or 'failed' in text_status:
+            return 'failed', text_status
+
+        return 'running', None
+
+    @staticmethod
+    def to_video_info(p_data: Dict[str, Any], info: Dict[str, Any], format_id: str) -> Dict[str, Any]:
+        """Video info dict for a finished task, shaped like the yt-dlp engine's"""
+        return {
+            'stream_url': p_data['download_url'],
+            'title': info.get('title') or 'Unknown Title',
+            'thumbnail': info.get('image'),
+            # Add basic fields to match yt-dlp dict structure
+            'description': f"Fetched via Loader.to (Format: {format_id})",
+            'uploader': 'Unknown',
+            'duration': None,
+            'view_count': 0
+        }
@@ -0,0 +1,198 @@
+"""
+Metadata Store Module
+Durable per-video metadata with field-level freshness
+"""
+import time
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import Config
+from app.services.cache import ConnectionPool, get_pool
+from app.services.hydration import get_hydration_engine
+from app.services.serializer import get_serializer
+from app.utils.formatters import format_duration
+
+logger = logging.getLogger(__name__)
+
+# Columns of video_metadata that hold metadata fields
+FIELDS = ('title', 'thumbnail', 'uploader', 'view_count', 'duration', 'upload_date')
+
+# SQLite limits bound parameters per statement; stay well under it
+_QUERY_CHUNK = 500
+
+
+class MetadataStore:
+    """
+    Video metadata keyed by video ID, stored in the video_metadata table
+
+    Each field records when it was last fetched, so a row can be fresh for
+    slow-changing fields (upload date, duration) while its view count is due
+    for a refresh.
+    """
+
+    def __init__(self, fetcher: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                 field_ttl: Dict[str, int] = None, pool: ConnectionPool = None):
+        self._fetcher = fetcher
+        self.field_ttl = field_ttl or Config.METADATA_FIELD_TTL
+        self._pool = pool
+
+    def _get_pool(self) -> ConnectionPool:
+        return self._pool or get_pool()
+
+    def _fetch(self, video_id: str) -> Optional[Dict[str, Any]]:
+        if self._fetcher:
+            return self._fetcher(video_id)
+        from app.services.youtube import YouTubeService
+        return YouTubeService.get_video_metadata(video_id)
+
+    def load(self, video_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Read stored rows in bulk
+
+        Returns:
+            video_id -> {'fields': {...}, 'fetched_at': {field: timestamp}}
+        """
+        ids = list(dict.fromkeys(vid for vid in video_ids if vid))
+        rows = {}
+        try:
+            with self._get_pool().connection() as conn:
+                for i in range(0, len(ids), _QUERY_CHUNK):
+                    chunk = ids[i:i + _QUERY_CHUNK]
+                    placeholders = ','.join('?' * len(chunk))
+                    for row in conn.execute(
+                        f'SELECT video_id, {", ".join(FIELDS)}, fetched_at FROM video_metadata '
+                        f'WHERE video_id IN ({placeholders})',
+                        chunk
+                    ):
+                        rows[row['video_id']] = {
+                            'fields': {f: row[f] for f in FIELDS},
+                            'fetched_at': get_serializer().loads(row['fetched_at'] or '{}'),
+                        }
+        except Exception as e:
+            logger.error(f"Metadata load error: {e}")
+        return rows
+
+    def is_fresh(self, stored: Optional[Dict[str, Any]], fields: Iterable[str], now: float = None) -> bool:
+        """
+        Whether every requested field was fetched within its TTL
+
+        A field fetched empty (a video without an upload date, say) is fresh
+        as well, so it is not refetched on every request.
+        """
+        if not stored:
+            return False
+        now = now or time.time()
+        for field in fields:
+            fetched_at = stored['fetched_at'].get(field)
+            if fetched_at is None:
+                return False
+            if now - fetched_at > self.field_ttl.get(field, Config.CACHE_VIDEO_TTL):
+                return False
+        return True
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]):
+        """
+        Store fetched metadata, refreshing the timestamp of each field provided
+
+        Args:
+            records: Dicts with an 'id' and any subset of FIELDS; every field
+                     provided counts as fetched, but empty values do not
+                     overwrite stored ones
+        """
+        records = [r for r in records if r and r.get('id')]
+        if not records:
+            return
+
+        now = time.time()
+        existing = self.load(r['id'] for r in records)
+        params = []
+        for record in records:
+            stored = existing.get(record['id'], {'fields': {}, 'fetched_at': {}})
+            fields = dict(stored['fields'])
+            fetched_at = dict(stored['fetched_at'])
+            for field in FIELDS:
+                if field not in record:
+                    continue
+                value = record[field]
+                if value not in (None, ''):
+                    fields[field] = value
+                fetched_at[field] = now
+            params.append((record['id'], *(fields.get(f) for f in FIELDS), get_serializer().dumps(fetched_at)))
+
+        try:
+            with self._get_pool().connection() as conn:
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO video_metadata (video_id, {", ".join(FIELDS)}, fetched_at) '
+                    f'VALUES (?, {", ".join("?" * len(FIELDS))}, ?)',
+                    params
+                )
+        except Exception as e:
+            logger.error(f"Metadata store error: {e}")
+
+    def get_many(self, video_ids: List[str], fields: Iterable[str] = FIELDS,
+                 deadline: float = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Get metadata for many videos, fetching only what is missing or stale
+
+        Args:
+            video_ids: YouTube video IDs
+            fields: Fields the caller needs fresh
+            deadline: Max seconds to wait for fetches (default from config);
+                      fetches still running are stored when they finish
+
+        Returns:
+            video_id -> metadata dict (id, title, thumbnail, uploader,
+            view_count, duration, upload_date). Videos that could not be
+            fetched in time are returned from stale data when available,
+            else omitted.
+        """
+        ids = list(dict.fromkeys(vid for vid in video_ids if vid))
+        if not ids:
+            return {}
+
+        fields = tuple(fields)
+        stored = self.load(ids)
+        now = time.time()
+        missing = [vid for vid in ids if not self.is_fresh(stored.get(vid), fields, now)]
+
+        if missing:
+            logger.info(f"Fetching metadata for {len(missing)} of {len(ids)} videos")
+            fetched = get_hydration_engine().hydrate(
+                missing, self._fetch_record, deadline=deadline,
+                on_result=lambda vid, record: self.upsert_many([record]),
+            )
+            for vid, record in fetched.items():
+                merged = dict(stored[vid]['fields']) if vid in stored else {}
+                merged.update({f: record[f] for f in FIELDS if record.get(f) not in (None, '')})
+                stored[vid] = {'fields': merged, 'fetched_at': {}}
+
+        return {vid: self._to_video(vid, stored[vid]['fields']) for vid in ids if vid in stored}
+
+    def _fetch_record(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch one video's metadata, keyed by the ID we asked for"""
+        record = self._fetch(video_id)
+        return {**record, 'id': video_id} if record else None
+
+    @staticmethod
+    def _to_video(video_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape stored fields like the video dicts the API returns"""
+        return {
+            'id': video_id,
+            'title': fields.get('title') or 'Unknown',
+            'thumbnail': fields.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            'uploader': fields.get('uploader') or 'Unknown',
+            'view_count': fields.get('view_count') or 0,
+            'duration': format_duration(fields.get('duration')),
+            'upload_date': fields.get('upload_date') or '',
+        }
+
+
+# Global metadata store
+_metadata_store: Optional[MetadataStore] = None
+
+
+def get_metadata_store() -> MetadataStore:
+    """Get or create the global metadata store"""
+    global _metadata_store
+    if _metadata_store is None:
+        _metadata_store = MetadataStore()
+    return _metadata_store
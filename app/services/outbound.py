@@ -0,0 +1,194 @@
+"""
+Outbound Module
+Per-host token-bucket rate limiting of upstream calls, granted in priority order
+"""
+import heapq
+import itertools
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+INTERACTIVE = 0  # A user is waiting on the response
+PREFETCH = 1  # Likely needed soon (related-video prefetch)
+WARMER = 2  # Cache warming and background refreshes
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', PREFETCH: 'prefetch', WARMER: 'warmer'}
+
+YOUTUBE_HOST = 'www.youtube.com'
+
+# Priority of the upstream calls made by the current thread; threads start
+# with the default, so background threads set it explicitly
+_priority: contextvars.ContextVar = contextvars.ContextVar('outbound_priority', default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def outbound_priority(priority: int):
+    """Run the enclosed upstream calls at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def carry_priority(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn to run at the caller's priority when called from another thread (pool workers)"""
+    priority = current_priority()
+
+    def wrapper(*args, **kwargs):
+        with outbound_priority(priority):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class _Bucket:
+    """Token bucket of one host plus the callers waiting on it"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at', 'waiters')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.waiters: List[tuple] = []  # heap of (priority, seq)
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class OutboundScheduler:
+    """
+    Admits upstream calls per host at a sustained rate with bursts
+
+    Each host has a token bucket (OUTBOUND_RATE: requests per second and
+    burst size, per worker). Callers that find it empty queue up and are
+    admitted most urgent class first, FIFO within a class. Lower classes
+    also leave OUTBOUND_RESERVE tokens untouched, so a burst of warming or
+    prefetching never uses up the headroom interactive requests need.
+    """
+
+    def __init__(self, rates: Dict[str, tuple] = None, default_rate: tuple = None,
+                 reserve: Dict[str, float] = None):
+        self.rates = rates if rates is not None else Config.OUTBOUND_RATE
+        self.default_rate = default_rate or Config.OUTBOUND_DEFAULT_RATE
+        self.reserve = reserve if reserve is not None else Config.OUTBOUND_RESERVE
+        self._cond = threading.Condition()
+        self._buckets: Dict[str, _Bucket] = {}
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, Any]] = {
+            name: {'granted': 0, 'waited': 0, 'wait_time': 0.0, 'max_wait': 0.0, 'timeouts': 0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def _bucket(self, host: str) -> _Bucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.rates.get(host, self.default_rate)
+            bucket = self._buckets[host] = _Bucket(rate, burst)
+        return bucket
+
+    def acquire(self, host: str = YOUTUBE_HOST, priority: Optional[int] = None,
+                timeout: Optional[float] = None):
+        """
+        Block until a call to host may go out
+
+        Args:
+            host: Upstream host
+            priority: Priority class (default: the current thread's, see outbound_priority())
+            timeout: Max seconds to wait (default EXTRACTOR_CHECKOUT_TIMEOUT)
+
+        Raises:
+            TimeoutError: If no token was granted in time
+        """
+        if priority is None:
+            priority = current_priority()
+        if timeout is None:
+            timeout = Config.EXTRACTOR_CHECKOUT_TIMEOUT
+        stats = self._stats[PRIORITY_NAMES[priority]]
+        reserve = self.reserve.get(PRIORITY_NAMES[priority], 0)
+        start = time.monotonic()
+
+        with self._cond:
+            bucket = self._bucket(host)
+            entry = (priority, next(self._seq))
+            heapq.heappush(bucket.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+                    # A reserve beyond the burst size would lock the class out
+                    needed = min(1 + reserve, bucket.burst)
+                    if bucket.waiters[0] == entry and bucket.tokens >= needed:
+                        bucket.tokens -= 1
+                        break
+                    remaining = timeout - (now - start)
+                    if remaining <= 0:
+                        stats['timeouts'] += 1
+                        raise TimeoutError(f"Timed out waiting for an outbound slot to {host}")
+                    # Sleep until the next token is due (or a waiter ahead is admitted)
+                    due = (needed - bucket.tokens) / bucket.rate if bucket.rate else remaining
+                    self._cond.wait(min(remaining, max(due, 0.01)))
+            finally:
+                bucket.waiters.remove(entry)
+                heapq.heapify(bucket.waiters)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            stats['granted'] += 1
+            if waited > 0.001:
+                stats['waited'] += 1
+                stats['wait_time'] += waited
+                stats['max_wait'] = max(stats['max_wait'], waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Grants and waits per priority class, queue depth and tokens per host"""
+        with self._cond:
+            now = time.monotonic()
+            priorities = {}
+            for name, counters in self._stats.items():
+                stats = dict(counters)
+                stats['avg_wait_ms'] = round(stats['wait_time'] / stats['waited'] * 1000, 1) if stats['waited'] else 0.0
+                stats['wait_time'] = round(stats['wait_time'], 3)
+                stats['max_wait'] = round(stats['max_wait'], 3)
+                priorities[name] = stats
+            hosts = {}
+            for host, bucket in self._buckets.items():
+                bucket.refill(now)
+                queued = {name: 0 for name in PRIORITY_NAMES.values()}
+                for priority, _ in bucket.waiters:
+                    queued[PRIORITY_NAMES[priority]] += 1
+                hosts[host] = {
+                    'rate': bucket.rate,
+                    'burst': bucket.burst,
+                    'tokens': round(bucket.tokens, 2),
+                    'queued': queued,
+                }
+        return {'priorities': priorities, 'hosts': hosts}
+
+
+# Global outbound scheduler
+_scheduler: Optional[OutboundScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_outbound_scheduler() -> OutboundScheduler:
+    """Get or create the global outbound scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = OutboundScheduler()
+    return _scheduler
@@ -0,0 +1,145 @@
+"""
+Prefetch Module
+Background resolution of stream info for videos a user is likely to open next
+"""
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional
+from config import Config
+from app.services.extractor_pool import get_extractor_pool
+from app.services.loader_to import JobPending
+from app.services.outbound import outbound_priority, PREFETCH
+from app.services.stream_info import get_cached_stream_info, get_stream_info
+
+logger = logging.getLogger(__name__)
+
+
+class StreamPrefetcher:
+    """
+    Resolves stream info for the top related videos into video_cache
+
+    Work runs on one daemon thread per worker and always yields to live
+    requests:
+    - nothing starts while PREFETCH_MAX_BUSY extractors are checked out;
+    - at most PREFETCH_BUDGET extractions run per PREFETCH_BUDGET_WINDOW;
+    - the queue is bounded and entries older than PREFETCH_MAX_AGE are
+      dropped, since the user has moved on by then.
+    Extractions go through the stream_info single-flight, so a user
+    clicking a video that is being prefetched waits for that extraction
+    instead of starting another.
+    """
+
+    def __init__(self, top_n: int = None, budget: int = None, window: float = None,
+                 max_busy: int = None, max_age: float = None, max_queue: int = None):
+        self.top_n = top_n or Config.PREFETCH_TOP_N
+        self.budget = budget or Config.PREFETCH_BUDGET
+        self.window = window or Config.PREFETCH_BUDGET_WINDOW
+        self.max_busy = max_busy or Config.PREFETCH_MAX_BUSY
+        self.max_age = max_age or Config.PREFETCH_MAX_AGE
+        self.max_queue = max_queue or Config.PREFETCH_QUEUE
+        self._cond = threading.Condition()
+        self._queue: "OrderedDict[str, float]" = OrderedDict()
+        self._spent: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'scheduled': 0,
+            'fetched': 0,
+            'cached': 0,
+            'failed': 0,
+            'dropped': 0,
+            'deferred': 0,
+        }
+
+    def schedule(self, video_ids: Iterable[str]):
+        """Queue the first top_n of a ranked list of video IDs"""
+        now = time.time()
+        with self._cond:
+            # Best-ranked ends up last, where _next() takes from
+            for video_id in reversed(list(video_ids)[:self.top_n]):
+                if video_id not in self._queue:
+                    self._stats['scheduled'] += 1
+                self._queue[video_id] = now
+                self._queue.move_to_end(video_id)
+            while len(self._queue) > self.max_queue:
+                self._queue.popitem(last=False)
+                self._stats['dropped'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-prefetch', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _next(self) -> str:
+        """Block until an item may run within the budget, then return it"""
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._spent and self._spent[0] < now - self.window:
+                    self._spent.popleft()
+                for video_id, queued_at in list(self._queue.items()):
+                    if queued_at >= now - self.max_age:
+                        break
+                    del self._queue[video_id]
+                    self._stats['dropped'] += 1
+
+                if not self._queue:
+                    self._cond.wait()
+                elif len(self._spent) >= self.budget:
+                    self._cond.wait(self._spent[0] + self.window - now)
+                elif get_extractor_pool().in_use() >= self.max_busy:
+                    self._stats['deferred'] += 1
+                    self._cond.wait(Config.PREFETCH_BUSY_BACKOFF)
+                else:
+                    # Newest first: the latest watch page is what the user sees
+                    video_id, _ = self._queue.popitem(last=True)
+                    return video_id
+
+    def _run(self):
+        with outbound_priority(PREFETCH):
+            self._loop()
+
+    def _loop(self):
+        while True:
+            video_id = self._next()
+            try:
+                if get_cached_stream_info(video_id):
+                    self._count('cached')
+                    continue
+                with self._cond:
+                    self._spent.append(time.time())
+                # Never hold the thread on a remote failover; its job fills the cache
+                data, _ = get_stream_info(video_id, remote_wait=0)
+                self._count('fetched' if data else 'failed')
+            except JobPending:
+                self._count('fetched')
+            except Exception as e:
+                self._count('failed')
+                logger.warning(f"Prefetch failed for {video_id}: {e}")
+
+    def _count(self, stat: str):
+        with self._cond:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+            recent = sum(1 for t in self._spent if t >= time.time() - self.window)
+            stats['budget_left'] = max(0, self.budget - recent)
+        return stats
+
+
+# Global prefetcher
+_prefetcher: Optional[StreamPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_stream_prefetcher() -> StreamPrefetcher:
+    """Get or create the global stream prefetcher"""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = StreamPrefetcher()
+    return _prefetcher
@@ -0,0 +1,360 @@
+"""
+Proxy Token Module
+Short signed tokens standing in for upstream URLs in /video_proxy links
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+from config import Config
+from app.services.cache import ConnectionPool, get_pool
+from app.services.stream_proxy import header_overrides
+
+logger = logging.getLogger(__name__)
+
+# Delete expired rows every N flushes
+_CLEANUP_INTERVAL = 200
+
+
+class ProxyTarget(NamedTuple):
+    """What a proxy token stands for"""
+    url: str
+    headers: Dict[str, str]
+    video_id: Optional[str] = None
+
+
+class _Entry:
+    """A token in the per-worker LRU; checked_at is when it was last read from the table"""
+
+    __slots__ = ('url', 'headers', 'expires_at', 'video_id', 'checked_at')
+
+    def __init__(self, url: str, headers: Dict[str, str], expires_at: float,
+                 video_id: Optional[str] = None, checked_at: float = None):
+        self.url = url
+        self.headers = headers
+        self.expires_at = expires_at
+        self.video_id = video_id
+        self.checked_at = checked_at if checked_at is not None else time.time()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _load_secret() -> bytes:
+    """Signing key shared by all workers: from the environment, else a key file in DATA_DIR"""
+    if Config.PROXY_TOKEN_SECRET:
+        return Config.PROXY_TOKEN_SECRET.encode()
+
+    path = os.path.join(Config.DATA_DIR, 'proxy_token.key')
+    os.makedirs(Config.DATA_DIR, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another worker may still be writing it
+        for _ in range(50):
+            with open(path, 'rb') as f:
+                secret = f.read()
+            if secret:
+                return secret
+            time.sleep(0.01)
+        raise RuntimeError(f"Proxy token key file {path} is empty")
+    secret = os.urandom(32).hex().encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    return secret
+
+
+class ProxyTokenRegistry:
+    """
+    Maps short tokens to (upstream URL, header overrides, video, expiry)
+
+    Tokens are derived from the URL and headers, so issuing the same target
+    twice gives the same token, and signed with a key shared by all workers.
+    Entries live in a per-worker LRU and in the proxy_tokens table, which
+    lets any worker resolve a token another one issued. Tokens of a video
+    can be repointed at a freshly extracted URL; memory entries are
+    re-read from the table every PROXY_TOKEN_RECHECK seconds so other
+    workers pick that up.
+    """
+
+    def __init__(self, secret: bytes = None, ttl: int = None, max_items: int = None,
+                 pool: ConnectionPool = None, recheck: float = None):
+        self._secret = secret
+        self.ttl = ttl or Config.PROXY_TOKEN_TTL
+        self.max_items = max_items or Config.PROXY_TOKEN_MEMORY_ITEMS
+        self.recheck = recheck if recheck is not None else Config.PROXY_TOKEN_RECHECK
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._pending: Dict[str, _Entry] = {}
+        self._flushes = 0
+        self._stats = {
+            'issued': 0,
+            'memory_hits': 0,
+            'db_hits': 0,
+            'invalid': 0,
+            'expired': 0,
+            'repointed': 0,
+        }
+
+    def _get_pool(self) -> ConnectionPool:
+        return self._pool or get_pool()
+
+    def _key(self) -> bytes:
+        if self._secret is None:
+            with self._lock:
+                if self._secret is None:
+                    self._secret = _load_secret()
+        return self._secret
+
+    def _sign(self, token_id: str) -> str:
+        return _b64(hmac.new(self._key(), token_id.encode(), hashlib.sha256).digest()[:8])
+
+    def issue(self, url: str, headers: Dict[str, str] = None, ttl: int = None,
+              video_id: str = None) -> str:
+        """
+        Register an upstream target and return its token
+
+        The entry is usable in this worker at once; call flush() to make it
+        visible to other workers.
+
+        Args:
+            url: Upstream URL
+            headers: Header overrides sent upstream
+            ttl: Seconds the token stays valid (default PROXY_TOKEN_TTL)
+            video_id: Video the URL plays, so the token can follow re-extraction
+        """
+        headers = headers or {}
+        digest = hashlib.sha256(f"{url}\0{json.dumps(headers, sort_keys=True)}".encode()).digest()
+        token_id = _b64(digest[:15])
+        token = f"{token_id}.{self._sign(token_id)}"
+        ttl = ttl or self.ttl
+        entry = _Entry(url, dict(headers), time.time() + ttl, video_id)
+        with self._lock:
+            known = self._memory.get(token)
+            # Re-issued by every manifest refresh; only rewrite rows that are getting old
+            if known is None or known.expires_at < entry.expires_at - ttl / 2:
+                self._remember(token, entry)
+                self._pending[token] = entry
+                self._stats['issued'] += 1
+            else:
+                self._memory.move_to_end(token)
+        return token
+
+    def link(self, url: str, headers: Dict[str, str] = None, ttl: int = None, flush: bool = True,
+             video_id: str = None) -> str:
+        """Proxy URL for an upstream target, e.g. /video_proxy?t=<token>"""
+        token = self.issue(url, headers, ttl, video_id)
+        if flush:
+            self.flush()
+        return f"/video_proxy?t={quote(token)}"
+
+    def flush(self):
+        """Write newly issued tokens to the shared table"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushes += 1
+            cleanup = self._flushes % _CLEANUP_INTERVAL == 0
+        if not pending:
+            return
+        try:
+            with self._get_pool().connection() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO proxy_tokens (token, url, headers, expires_at, video_id) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(token, e.url, json.dumps(e.headers), e.expires_at, e.video_id)
+                     for token, e in pending.items()]
+                )
+                if cleanup:
+                    conn.execute('DELETE FROM proxy_tokens WHERE expires_at < ?', (time.time(),))
+        except Exception as e:
+            logger.error(f"Proxy token store error: {e}")
+
+    def resolve(self, token: str) -> Optional[ProxyTarget]:
+        """
+        Look up a token
+
+        Returns:
+            ProxyTarget, or None if the token is forged, unknown or expired
+        """
+        token_id, _, signature = token.partition('.')
+        if not signature or not hmac.compare_digest(signature, self._sign(token_id)):
+            self._count('invalid')
+            return None
+
+        now = time.time()
+        stale = None
+        with self._lock:
+            entry = self._memory.get(token)
+            if entry is not None:
+                self._memory.move_to_end(token)
+                # Not yet flushed entries have nothing newer in the table
+                if now - entry.checked_at < self.recheck or token in self._pending:
+                    self._stats['memory_hits'] += 1
+                else:
+                    stale, entry = entry, None
+
+        if entry is None:
+            try:
+                with self._get_pool().connection() as conn:
+                    row = conn.execute(
+                        'SELECT url, headers, expires_at, video_id FROM proxy_tokens WHERE token = ?', (token,)
+                    ).fetchone()
+            except Exception as e:
+                logger.error(f"Proxy token lookup error: {e}")
+                row = None
+            if row is not None:
+                entry = _Entry(row['url'], json.loads(row['headers'] or '{}'), row['expires_at'],
+                               row['video_id'], now)
+                with self._lock:
+                    self._remember(token, entry)
+                    self._stats['db_hits'] += 1
+            elif stale is not None:
+                # Table unavailable or row cleaned up; keep serving what this worker knows
+                entry = stale
+                stale.checked_at = now
+            else:
+                self._count('invalid')
+                return None
+
+        if entry.expires_at < now:
+            self._count('expired')
+            return None
+        return ProxyTarget(entry.url, entry.headers, entry.video_id)
+
+    def repoint(self, video_id: str, old_url: str, new_url: str, headers: Dict[str, str] = None) -> int:
+        """
+        Move tokens of a video from an expiring upstream URL to its replacement
+
+        Links already handed to players keep working, and stay valid for
+        another full TTL.
+
+        Returns:
+            Number of tokens repointed in the shared table
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for entry in self._memory.values():
+                if entry.video_id == video_id and entry.url == old_url:
+                    entry.url = new_url
+                    if headers is not None:
+                        entry.headers = dict(headers)
+                    entry.expires_at = max(entry.expires_at, expires_at)
+        # Pending entries are the same objects, so they flush with the new URL
+        try:
+            with self._get_pool().connection() as conn:
+                cursor = conn.execute(
+                    'UPDATE proxy_tokens SET url = ?, headers = COALESCE(?, headers), '
+                    'expires_at = MAX(expires_at, ?) WHERE video_id = ? AND url = ?',
+                    (new_url, json.dumps(headers) if headers is not None else None,
+                     expires_at, video_id, old_url)
+                )
+                moved = cursor.rowcount
+        except Exception as e:
+            logger.error(f"Proxy token repoint error for {video_id}: {e}")
+            return 0
+        with self._lock:
+            self._stats['repointed'] += moved
+        return moved
+
+    def urls_for(self, video_id: str) -> List[str]:
+        """Upstream URLs that unexpired tokens of a video point at"""
+        now = time.time()
+        with self._lock:
+            urls = {e.url for e in self._memory.values() if e.video_id == video_id and e.expires_at >= now}
+        try:
+            with self._get_pool().connection() as conn:
+                rows = conn.execute(
+                    'SELECT DISTINCT url FROM proxy_tokens WHERE video_id = ? AND expires_at >= ?',
+                    (video_id, now)
+                ).fetchall()
+            urls.update(row['url'] for row in rows)
+        except Exception as e:
+            logger.error(f"Proxy token lookup error for {video_id}: {e}")
+        return sorted(urls)
+
+    def _remember(self, token: str, entry: _Entry):
+        """Add to the memory LRU; caller holds the lock"""
+        self._memory[token] = entry
+        self._memory.move_to_end(token)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_items'] = len(self._memory)
+        return stats
+
+
+def resolve_proxy_request(args: Mapping[str, str]) -> Tuple[Optional[ProxyTarget], Optional[Tuple[str, int]]]:
+    """
+    Upstream target of a /video_proxy request
+
+    Accepts ?t=<token> links as well as the older ?url=...&h_<Name>=... form.
+    Tokens tied to a video mark it as being watched, so its stream URL is
+    refreshed before it expires.
+
+    Returns:
+        (target, error) where error is a (message, status) pair when the
+        request cannot be served
+    """
+    token = args.get("t")
+    if token:
+        target = get_proxy_tokens().resolve(token)
+        if target is None:
+            return None, ("Proxy link expired or invalid", 410)
+        if target.video_id:
+            from app.services.stream_info import get_stream_refresher
+            get_stream_refresher().touch(target.video_id)
+        return target, None
+
+    url = args.get("url")
+    if not url:
+        return None, ("No URL provided", 400)
+    return ProxyTarget(url, header_overrides(args)), None
+
+
+class TokenLinker:
+    """
+    Turns segment URLs of one manifest into token links carrying the
+    manifest's header overrides and video; flush() persists a batch of them.
+    """
+
+    def __init__(self, registry: ProxyTokenRegistry, headers: Dict[str, str], video_id: str = None):
+        self._registry = registry
+        self._headers = headers
+        self._video_id = video_id
+
+    def __call__(self, url: str) -> str:
+        return self._registry.link(url, self._headers, flush=False, video_id=self._video_id)
+
+    def flush(self):
+        self._registry.flush()
+
+
+# Global token registry
+_registry: Optional[ProxyTokenRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_proxy_tokens() -> ProxyTokenRegistry:
+    """Get or create the global proxy token registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProxyTokenRegistry()
+    return _registry
@@ -0,0 +1,426 @@
+"""
+Segment Cache Module
+Disk-backed byte-range cache for proxied googlevideo streams
+"""
+import os
+import re
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+from config import Config
+from app.services.cache import ConnectionPool, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Characters allowed in a cache file name built from video id / itag
+_SAFE_KEY = re.compile(r'^[\w.\-]+$')
+_RANGE_HEADER = re.compile(r'^bytes=(\d+)-(\d*)$')
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def stream_key(url: str) -> Optional[Tuple[str, str]]:
+    """
+    (video_id, itag) for a googlevideo URL, or None if it is not cacheable
+
+    Both query-style (?id=..&itag=..) and path-style (/id/../itag/../)
+    URLs are understood. Manifests and numbered HLS/live segments (sq=)
+    share their id and itag with other responses, each starting at byte 0,
+    so they are never keyed.
+    """
+    parts = urlsplit(url)
+    if parts.hostname and parts.hostname.startswith('manifest.'):
+        return None
+    if '/manifest/' in parts.path or parts.path.endswith(('.m3u8', '.mpd')):
+        return None
+    query = parse_qs(parts.query)
+    segments = parts.path.split('/')
+    if 'sq' in query or 'sq' in segments:
+        return None
+    video_id = (query.get('id') or [None])[0]
+    itag = (query.get('itag') or [None])[0]
+    if not (video_id and itag):
+        for name, value in zip(segments, segments[1:]):
+            if name == 'id' and not video_id:
+                video_id = value
+            elif name == 'itag' and not itag:
+                itag = value
+    if video_id and itag and _SAFE_KEY.match(video_id) and _SAFE_KEY.match(itag):
+        return video_id, itag
+    return None
+
+
+def url_range(url: str) -> Optional[str]:
+    """The `range=a-b` parameter of a DASH segment URL, if any"""
+    return (parse_qs(urlsplit(url).query).get('range') or [None])[0]
+
+
+def requested_range(url: str, range_header: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    The byte range a proxy request asks for, as (start, end-or-None)
+
+    A `range=a-b` URL parameter (DASH segments) wins over the Range header.
+    Multi-range and suffix (bytes=-N) requests return None: not cacheable.
+    """
+    in_url = url_range(url)
+    if in_url:
+        start, _, end = in_url.partition('-')
+        if start.isdigit() and end.isdigit():
+            return int(start), int(end)
+        return None
+    if not range_header:
+        return 0, None
+    match = _RANGE_HEADER.match(range_header.strip())
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
+class RangeFile:
+    """
+    Read-only view of bytes [start, start + length) of a cache file
+
+    Works with wsgi.file_wrapper: servers that support sendfile (gunicorn)
+    use fileno() from the current offset, others call read().
+    """
+
+    def __init__(self, path: str, start: int, length: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class CachedRange:
+    """A cache hit: where the bytes are and how to describe them"""
+
+    def __init__(self, path: str, start: int, end: int, total: Optional[int], content_type: Optional[str]):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.total = total
+        self.content_type = content_type
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+    def open(self) -> RangeFile:
+        return RangeFile(self.path, self.start, self.length)
+
+
+class SegmentWriter:
+    """
+    Tee for a relayed upstream body: writes each chunk at its offset in the
+    cache file and records the bytes written when closed, including when
+    the client disconnects part way.
+    """
+
+    def __init__(self, cache: 'SegmentCache', key: Tuple[str, str], start: int,
+                 total: Optional[int], content_type: Optional[str]):
+        self._cache = cache
+        self._key = key
+        self._start = start
+        self._total = total
+        self._content_type = content_type
+        self._written = 0
+        self._failed = False
+        path = cache.path_for(key)
+        try:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            # A new file holds none of the ranges an evicted predecessor may have left recorded
+            cache.forget(key)
+        except FileExistsError:
+            self._fd = os.open(path, os.O_RDWR)
+
+    def write(self, chunk: bytes):
+        if self._fd is None or self._failed:
+            return
+        try:
+            os.pwrite(self._fd, chunk, self._start + self._written)
+            self._written += len(chunk)
+        except OSError as e:
+            # Keep what was written so far; stop caching the rest
+            logger.error(f"Segment cache write error: {e}")
+            self._failed = True
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _still_cached(self) -> bool:
+        """Whether our file is still the one at the cache path (it may have been evicted)"""
+        try:
+            return os.fstat(self._fd).st_ino == os.stat(self._cache.path_for(self._key)).st_ino
+        except OSError:
+            return False
+
+    def close(self):
+        if self._fd is None:
+            return
+        current = self._still_cached()
+        self._close_fd()
+        if self._written and current:
+            self._cache.record(self._key, self._start, self._start + self._written - 1,
+                               self._total, self._content_type)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SegmentCache:
+    """
+    Byte ranges of proxied streams, stored per (video_id, itag)
+
+    Bytes live in one sparse file per stream under cache_dir; the ranges each
+    file holds are tracked in SQLite so all workers share the cache. Whole
+    files are evicted least-recently-used first once the total exceeds
+    max_bytes.
+    """
+
+    # Check the size budget every N stored ranges
+    BUDGET_CHECK_INTERVAL = 20
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, pool: ConnectionPool = None):
+        self.cache_dir = cache_dir or Config.SEGMENT_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.SEGMENT_CACHE_BYTES
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._records = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'bytes_served': 0,
+            'bytes_stored': 0,
+            'evictions': 0,
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_pool(self) -> ConnectionPool:
+        return self._pool or get_pool()
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def path_for(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.cache_dir, f"{key[0]}_{key[1]}.seg")
+
+    def lookup(self, key: Tuple[str, str], start: int, end: Optional[int]) -> Optional[CachedRange]:
+        """
+        Find bytes [start, end] of a stream on disk
+
+        Args:
+            key: (video_id, itag)
+            start: First byte
+            end: Last byte, or None for "to the end of the stream"
+
+        Returns:
+            CachedRange if every requested byte is cached, else None
+        """
+        try:
+            with self._get_pool().connection() as conn:
+                row = conn.execute(
+                    'SELECT total, content_type FROM segment_files WHERE video_id = ? AND itag = ?', key
+                ).fetchone()
+                if row is not None:
+                    total = row['total']
+                    if end is None and total:
+                        end = total - 1
+                    elif end is not None and total:
+                        end = min(end, total - 1)
+                    covered = end is not None and conn.execute(
+                        'SELECT 1 FROM segment_ranges WHERE video_id = ? AND itag = ? AND start <= ? AND end >= ?',
+                        (*key, start, end)
+                    ).fetchone()
+                    if covered:
+                        conn.execute(
+                            'UPDATE segment_files SET last_access = ? WHERE video_id = ? AND itag = ?',
+                            (time.time(), *key)
+                        )
+        except Exception as e:
+            logger.error(f"Segment cache lookup error: {e}")
+            row = covered = None
+
+        path = self.path_for(key)
+        if row is None or not covered or end < start or not os.path.exists(path):
+            self._count('misses')
+            return None
+
+        hit = CachedRange(path, start, end, row['total'], row['content_type'])
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['bytes_served'] += hit.length
+        return hit
+
+    def writer(self, key: Tuple[str, str], start: int, total: Optional[int],
+               content_type: Optional[str]) -> Optional[SegmentWriter]:
+        """Start caching an upstream body that begins at byte `start`"""
+        try:
+            return SegmentWriter(self, key, start, total, content_type)
+        except OSError as e:
+            logger.error(f"Segment cache open error: {e}")
+            return None
+
+    def writer_for_response(self, key: Tuple[str, str], wanted: Tuple[int, Optional[int]], status: int,
+                            headers: Mapping[str, str], sliced: bool = False) -> Optional[SegmentWriter]:
+        """
+        Writer for an upstream response body, if its byte offsets are known
+
+        Args:
+            key: (video_id, itag)
+            wanted: The requested range, see requested_range()
+            status: Upstream status code
+            headers: Upstream response headers (case-insensitive mapping)
+            sliced: The URL itself selects bytes (DASH range=), so a 200 holds
+                    just that slice; otherwise a 200 is the whole stream, even
+                    when the client sent a Range header that upstream ignored
+        """
+        if headers.get('content-encoding'):
+            return None
+        if status == 206:
+            content_range = parse_content_range(headers.get('content-range'))
+            if not content_range:
+                return None
+            start, _, total = content_range
+        elif status == 200 and sliced:
+            start, total = wanted[0], None
+        elif status == 200:
+            length = headers.get('content-length')
+            start, total = 0, int(length) if length and length.isdigit() else None
+        else:
+            return None
+        return self.writer(key, start, total, headers.get('content-type'))
+
+    def forget(self, key: Tuple[str, str]):
+        """Drop everything recorded for a stream"""
+        try:
+            with self._get_pool().connection() as conn:
+                conn.execute('DELETE FROM segment_ranges WHERE video_id = ? AND itag = ?', key)
+                conn.execute('DELETE FROM segment_files WHERE video_id = ? AND itag = ?', key)
+        except Exception as e:
+            logger.error(f"Segment cache forget error: {e}")
+
+    def record(self, key: Tuple[str, str], start: int, end: int,
+               total: Optional[int], content_type: Optional[str]):
+        """Mark bytes [start, end] of a stream as present, merging touching ranges"""
+        try:
+            with self._get_pool().connection() as conn:
+                rows = conn.execute(
+                    'SELECT start, end FROM segment_ranges '
+                    'WHERE video_id = ? AND itag = ? AND start <= ? AND end >= ?',
+                    (*key, end + 1, start - 1)
+                ).fetchall()
+                merged_start = min([start] + [r['start'] for r in rows])
+                merged_end = max([end] + [r['end'] for r in rows])
+                conn.executemany(
+                    'DELETE FROM segment_ranges WHERE video_id = ? AND itag = ? AND start = ?',
+                    [(*key, r['start']) for r in rows]
+                )
+                conn.execute(
+                    'INSERT OR REPLACE INTO segment_ranges (video_id, itag, start, end) VALUES (?, ?, ?, ?)',
+                    (*key, merged_start, merged_end)
+                )
+                size = conn.execute(
+                    'SELECT COALESCE(SUM(end - start + 1), 0) FROM segment_ranges WHERE video_id = ? AND itag = ?',
+                    key
+                ).fetchone()[0]
+                conn.execute(
+                    '''INSERT INTO segment_files (video_id, itag, total, content_type, size, last_access)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(video_id, itag) DO UPDATE SET
+                           total = COALESCE(excluded.total, total),
+                           content_type = COALESCE(excluded.content_type, content_type),
+                           size = excluded.size,
+                           last_access = excluded.last_access''',
+                    (*key, total, content_type, size, time.time())
+                )
+        except Exception as e:
+            logger.error(f"Segment cache record error: {e}")
+            return
+
+        with self._lock:
+            self._stats['bytes_stored'] += end - start + 1
+            self._records += 1
+            check = self._records % self.BUDGET_CHECK_INTERVAL == 0
+        if check:
+            self.enforce_budget()
+
+    def enforce_budget(self):
+        """Delete least recently used stream files until under max_bytes"""
+        try:
+            with self._get_pool().connection() as conn:
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM segment_files').fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                victims: List[Tuple[str, str]] = []
+                for row in conn.execute('SELECT video_id, itag, size FROM segment_files ORDER BY last_access'):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((row['video_id'], row['itag']))
+                    total -= row['size']
+                conn.executemany('DELETE FROM segment_ranges WHERE video_id = ? AND itag = ?', victims)
+                conn.executemany('DELETE FROM segment_files WHERE video_id = ? AND itag = ?', victims)
+        except Exception as e:
+            logger.error(f"Segment cache eviction error: {e}")
+            return
+
+        for key in victims:
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+        self._count('evictions', len(victims))
+        logger.info(f"Segment cache evicted {len(victims)} streams")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this worker"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """(start, end, total-or-None) from a Content-Range header"""
+    match = _CONTENT_RANGE.match((value or '').strip())
+    if not match:
+        return None
+    total = match.group(3)
+    return int(match.group(1)), int(match.group(2)), None if total == '*' else int(total)
+
+
+# Global segment cache
+_segment_cache: Optional[SegmentCache] = None
+_segment_cache_lock = threading.Lock()
+
+
+def get_segment_cache() -> SegmentCache:
+    """Get or create the global segment cache"""
+    global _segment_cache
+    if _segment_cache is None:
+        with _segment_cache_lock:
+            if _segment_cache is None:
+                _segment_cache = SegmentCache()
+    return _segment_cache
@@ -0,0 +1,163 @@
+"""
+Serializer Module
+Compact, version-tagged encoding of cached payloads
+"""
+import json
+import zlib
+import threading
+import logging
+from typing import Any, Optional, Tuple, Union
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack  # Optional: smaller and faster to decode than JSON
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard  # Optional: better ratio and speed than zlib
+except ImportError:
+    zstandard = None
+
+# Blobs start with one tag byte: encoding in the high nibble, compression in
+# the low one. Rows written before tagging are JSON text and stay readable.
+ENCODINGS = {'json': 0x10, 'msgpack': 0x20}
+COMPRESSIONS = {'none': 0x0, 'zlib': 0x1, 'zstd': 0x2}
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class Serializer:
+    """
+    Encodes cache values as tagged blobs
+
+    Payloads of at least `threshold` encoded bytes are compressed. The tag
+    byte records how a blob was written, so changing CACHE_SERIALIZER or
+    CACHE_COMPRESSION never strands existing rows.
+    """
+
+    def __init__(self, encoding: str = None, compression: str = None, threshold: int = None,
+                 level: int = None):
+        encoding = encoding or Config.CACHE_SERIALIZER
+        compression = compression or Config.CACHE_COMPRESSION
+        if encoding == 'auto':
+            encoding = 'msgpack' if msgpack else 'json'
+        if compression == 'auto':
+            compression = 'zstd' if zstandard else 'zlib'
+        if encoding == 'msgpack' and not msgpack:
+            logger.error("CACHE_SERIALIZER=msgpack but msgpack is not installed, using json")
+            encoding = 'json'
+        if compression == 'zstd' and not zstandard:
+            logger.error("CACHE_COMPRESSION=zstd but zstandard is not installed, using zlib")
+            compression = 'zlib'
+        if encoding not in ENCODINGS or compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache serializer {encoding}/{compression}")
+
+        self.encoding = encoding
+        self.compression = compression
+        self.threshold = threshold if threshold is not None else Config.CACHE_COMPRESS_THRESHOLD
+        self.level = level
+        self._local = threading.local()
+
+    def _zstd(self):
+        """Per-thread zstd contexts (they are not thread-safe)"""
+        if getattr(self._local, 'zstd', None) is None:
+            self._local.zstd = (
+                zstandard.ZstdCompressor(level=self.level or 3),
+                zstandard.ZstdDecompressor(),
+            )
+        return self._local.zstd
+
+    def encode(self, value: Any) -> Tuple[bytes, int]:
+        """
+        Serialize a value
+
+        Returns:
+            (tagged blob, encoded size before compression) - the latter is
+            what the value costs once decoded, for memory budgets
+        """
+        encoding = self.encoding
+        if encoding == 'msgpack':
+            try:
+                raw = msgpack.packb(value, use_bin_type=True)
+            except (TypeError, OverflowError, ValueError):
+                encoding = 'json'
+        if encoding == 'json':
+            raw = _json_dumps(value)
+
+        compression = self.compression if len(raw) >= self.threshold else 'none'
+        if compression == 'zlib':
+            body = zlib.compress(raw, self.level or 6)
+        elif compression == 'zstd':
+            body = self._zstd()[0].compress(raw)
+        else:
+            body = raw
+        # Not worth it for incompressible payloads
+        if compression != 'none' and len(body) >= len(raw):
+            compression, body = 'none', raw
+
+        tag = ENCODINGS[encoding] | COMPRESSIONS[compression]
+        return bytes((tag,)) + body, len(raw)
+
+    def decode(self, blob: Union[bytes, str, None]) -> Tuple[Any, int]:
+        """
+        Deserialize a blob written by encode(), or a legacy JSON text row
+
+        Returns:
+            (value, encoded size before compression)
+        """
+        if blob is None:
+            return None, 0
+        if isinstance(blob, str):
+            return json.loads(blob), len(blob)
+
+        blob = bytes(blob)
+        if blob[:1] in (b'{', b'['):
+            # Untagged JSON object/array stored as a blob
+            return json.loads(blob), len(blob)
+        tag = blob[0]
+        encoding, compression = tag & 0xF0, tag & 0x0F
+        body = blob[1:]
+        if compression == COMPRESSIONS['zlib']:
+            raw = zlib.decompress(body)
+        elif compression == COMPRESSIONS['zstd']:
+            if not zstandard:
+                raise ValueError("Cached payload is zstd-compressed but zstandard is not installed")
+            raw = self._zstd()[1].decompress(body)
+        elif compression == COMPRESSIONS['none']:
+            raw = body
+        else:
+            raise ValueError(f"Unknown cache payload tag {tag:#x}")
+
+        if encoding == ENCODINGS['json']:
+            return json.loads(raw), len(raw)
+        if encoding == ENCODINGS['msgpack']:
+            if not msgpack:
+                raise ValueError("Cached payload is msgpack but msgpack is not installed")
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False), len(raw)
+        raise ValueError(f"Unknown cache payload tag {tag:#x}")
+
+    def dumps(self, value: Any) -> bytes:
+        return self.encode(value)[0]
+
+    def loads(self, blob: Union[bytes, str, None]) -> Any:
+        return self.decode(blob)[0]
+
+
+# Global serializer
+_serializer: Optional[Serializer] = None
+_serializer_lock = threading.Lock()
+
+
+def get_serializer() -> Serializer:
+    """Get or create the global cache serializer"""
+    global _serializer
+    if _serializer is None:
+        with _serializer_lock:
+            if _serializer is None:
+                _serializer = Serializer()
+    return _serializer
@@ -1,21 +1,47 @@
 
 import json
 import os
+import time
+import tempfile
+import threading
 import logging
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 from config import Config
 
 logger = logging.getLogger(__name__)
 
 class SettingsService:
-    """Manage application settings using a JSON file"""
-    
+    """
+    Manage application settings using a JSON file
+
+    Settings are parsed once into an immutable snapshot shared by all
+    threads. Reads stat the file at most once per SETTINGS_RECHECK_INTERVAL
+    and reload only when its mtime or size changed, which is also how a
+    change saved by another worker reaches this one. Writes replace the
+    file atomically, so readers never see it half-written.
+    """
+
     SETTINGS_FILE = os.path.join(Config.DATA_DIR, 'settings.json')
-    
+
     # Default settings
     DEFAULTS = {
         'youtube_engine': 'auto',  # auto, local, remote
     }
-    
+
+    _lock = threading.Lock()
+    _snapshot: Optional[Mapping] = None
+    _signature: Optional[Tuple[int, int]] = None
+    _checked_at = 0.0
+
+    @classmethod
+    def _file_signature(cls) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(cls.SETTINGS_FILE)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
     @classmethod
     def _load_settings(cls) -> dict:
         """Load settings from file or return defaults"""
@@ -27,29 +53,62 @@ class SettingsService:
                     return {**cls.DEFAULTS, **data}
         except Exception as e:
             logger.error(f"Error loading settings: {e}")
-        
+
         return cls.DEFAULTS.copy()
 
+    @classmethod
+    def snapshot(cls) -> Mapping:
+        """Current settings as a read-only mapping"""
+        now = time.monotonic()
+        snapshot = cls._snapshot
+        if snapshot is not None and now - cls._checked_at < Config.SETTINGS_RECHECK_INTERVAL:
+            return snapshot
+
+        with cls._lock:
+            if cls._snapshot is not None and now - cls._checked_at < Config.SETTINGS_RECHECK_INTERVAL:
+                return cls._snapshot
+            signature = cls._file_signature()
+            if cls._snapshot is None or signature != cls._signature:
+                cls._snapshot = MappingProxyType(cls._load_settings())
+                cls._signature = signature
+            cls._checked_at = now
+            return cls._snapshot
+
     @classmethod
     def get(cls, key: str, default=None):
         """Get a setting value"""
-        settings = cls._load_settings()
+        settings = cls.snapshot()
         return settings.get(key, default if default is not None else cls.DEFAULTS.get(key))
 
     @classmethod
     def set(cls, key: str, value):
         """Set a setting value and persist"""
-        settings = cls._load_settings()
-        settings[key] = value
-        
-        try:
-            with open(cls.SETTINGS_FILE, 'w') as f:
-                json.dump(settings, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving settings: {e}")
-            raise
+        with cls._lock:
+            # Start from the file, not the snapshot, to keep other workers' recent changes
+            settings = cls._load_settings()
+            settings[key] = value
+
+            directory = os.path.dirname(cls.SETTINGS_FILE) or '.'
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix='.settings-', suffix='.json', dir=directory)
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(settings, f, indent=2)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, cls.SETTINGS_FILE)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except Exception as e:
+                logger.error(f"Error saving settings: {e}")
+                raise
+
+            cls._snapshot = MappingProxyType(settings)
+            cls._signature = cls._file_signature()
+            cls._checked_at = time.monotonic()
 
     @classmethod
     def get_all(cls):
         """Get all settings"""
-        return cls._load_settings()
+        return dict(cls.snapshot())
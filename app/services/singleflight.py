@@ -0,0 +1,165 @@
+"""
+Single-Flight Module
+Collapses concurrent identical upstream extractions into one call
+"""
+import json
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional
+from config import Config
+from app.services.cache import LeaseService
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(operation: str, *args, **kwargs) -> str:
+    """Build a single-flight key from an operation name and its arguments"""
+    return f"{operation}:{json.dumps([args, kwargs], sort_keys=True, default=str)}"
+
+
+class _Call:
+    """An in-flight call that followers wait on, until its deadline at most"""
+
+    __slots__ = ('done', 'result', 'error', 'deadline')
+
+    def __init__(self, deadline: float):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.deadline = deadline
+
+    def wait(self) -> bool:
+        """Wait for the leader; False if it overran its deadline (which it may push back)"""
+        while not self.done.is_set():
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.done.wait(remaining)
+        return True
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    Within a process, concurrent callers with the same key wait for the
+    leader's result. Across gunicorn workers, the leader holds a SQLite lease;
+    a worker that finds the lease taken polls `peek` (usually a shared cache
+    lookup) for the other worker's result instead of calling upstream itself.
+
+    Followers give the leader lease_ttl for each phase of its work (waiting
+    on another worker, then calling upstream); one that overruns it is
+    presumed stuck, and the follower calls upstream itself.
+    """
+
+    def __init__(self, lease_ttl: float = None, poll_interval: float = None):
+        self.lease_ttl = lease_ttl or Config.SINGLE_FLIGHT_LEASE_TTL
+        self.poll_interval = poll_interval or Config.SINGLE_FLIGHT_POLL_INTERVAL
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {
+            'leaders': 0,
+            'followers': 0,
+            'remote_hits': 0,
+            'remote_timeouts': 0,
+            'follower_timeouts': 0,
+        }
+
+    def do(self, key: str, fn: Callable[[], Any], peek: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Call fn once for all concurrent callers of key
+
+        Args:
+            key: Identity of the call, see flight_key()
+            fn: The upstream call
+            peek: Optional lookup of a result produced by another worker;
+                  enables cross-worker coalescing
+
+        Returns:
+            fn's result (or the result found by peek)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(time.monotonic() + self.lease_ttl)
+                self._stats['leaders'] += 1
+            else:
+                self._stats['followers'] += 1
+
+        if not leader:
+            if not call.wait():
+                with self._lock:
+                    self._stats['follower_timeouts'] += 1
+                logger.warning(f"Single-flight leader for {key} overran {self.lease_ttl}s; calling upstream")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, call, fn, peek)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _lead(self, key: str, call: _Call, fn: Callable[[], Any], peek: Optional[Callable[[], Any]]) -> Any:
+        """Run fn under a cross-worker lease, or wait for the worker holding it"""
+        if peek is None:
+            return fn()
+
+        lease = f"flight:{key}"
+        deadline = time.monotonic() + self.lease_ttl
+        while not LeaseService.acquire(lease, ttl=self.lease_ttl):
+            result = peek()
+            if result is not None:
+                with self._lock:
+                    self._stats['remote_hits'] += 1
+                return result
+            if time.monotonic() >= deadline:
+                # The other worker is stuck or died; its lease is about to lapse
+                with self._lock:
+                    self._stats['remote_timeouts'] += 1
+                call.deadline = time.monotonic() + self.lease_ttl
+                return fn()
+            time.sleep(self.poll_interval)
+
+        try:
+            # The previous holder may have published its result just before releasing
+            result = peek()
+            if result is not None:
+                with self._lock:
+                    self._stats['remote_hits'] += 1
+                return result
+            call.deadline = time.monotonic() + self.lease_ttl
+            return fn()
+        finally:
+            LeaseService.release(lease)
+
+    def stats(self) -> Dict[str, Any]:
+        """Coalescing counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+# Global single-flight group
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get or create the global single-flight group"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,327 @@
+"""
+Stream Info Module
+Extraction, expiry-aware caching and background refresh of playable stream URLs
+"""
+import re
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+from config import Config
+from app.services.cache import CacheService, LeaseService
+from app.services.loader_to import JobPending
+from app.services.proxy_tokens import get_proxy_tokens
+from app.services.singleflight import get_single_flight, flight_key
+
+logger = logging.getLogger(__name__)
+
+# Manifest URLs carry the expiry as a path segment: .../expire/1700000000/...
+_PATH_EXPIRE = re.compile(r'/expire/(\d+)(?:/|$)')
+
+# Upstream request headers worth forwarding through the proxy
+_FORWARDED_HEADERS = ('user-agent', 'cookie', 'referer', 'origin')
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Unix time a googlevideo URL stops working, from its expire= parameter"""
+    parts = urlsplit(url)
+    value = (parse_qs(parts.query).get('expire') or [None])[0]
+    if value is None:
+        match = _PATH_EXPIRE.search(parts.path)
+        value = match.group(1) if match else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def url_itag(url: str) -> Optional[str]:
+    """The itag= query parameter of a progressive stream URL, if any"""
+    return (parse_qs(urlsplit(url).query).get("itag") or [None])[0]
+
+
+def normalize_formats(formats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Format table of one extraction, in yt-dlp's order (worst to best)
+
+    Keeps direct (non-HLS) formats only, reduced to what the stream and
+    download endpoints use.
+    """
+    table = []
+    for f in formats or []:
+        url = f.get("url", "")
+        if not url or "m3u8" in url:
+            continue
+        table.append({
+            "itag": f.get("format_id"),
+            "ext": f.get("ext", ""),
+            "height": f.get("height") or 0,
+            "vcodec": f.get("vcodec") or "none",
+            "acodec": f.get("acodec") or "none",
+            "size": f.get("filesize") or f.get("filesize_approx") or 0,
+            "note": f.get("format_note") or f.get("format") or "",
+            "url": url,
+            "expires_at": url_expiry(url),
+        })
+    return table
+
+
+def get_cached_stream_info(video_id: str) -> Optional[Dict[str, Any]]:
+    """Get unexpired stream info for a video from video_cache"""
+    return CacheService.get_video_cache(video_id)
+
+
+def get_stream_info(video_id: str, remote_wait: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Cached stream info for a video, extracting it on a miss
+
+    Concurrent misses for the same video share one extraction, including
+    misses on other workers.
+
+    Args:
+        remote_wait: Seconds to wait for the remote engine, see resolve_stream_info()
+
+    Returns:
+        (stream info or None, whether it came from the cache)
+
+    Raises:
+        JobPending: If the remote engine is still working on the video
+    """
+    data = get_cached_stream_info(video_id)
+    if data and data.get("original_url"):
+        return data, True
+
+    data = get_single_flight().do(
+        flight_key("stream_info", video_id),
+        lambda: resolve_stream_info(video_id, remote_wait),
+        peek=lambda: get_cached_stream_info(video_id),
+    )
+    return data, False
+
+
+def resolve_stream_info(video_id: str, remote_wait: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Extract stream info for a video and store it in video_cache
+
+    The cache entry lives until shortly before the stream URL's own expiry
+    (STREAM_EXPIRY_MARGIN), or CACHE_VIDEO_TTL when the URL has none.
+
+    Args:
+        remote_wait: Seconds to wait for the remote engine (default: until
+                     its job finishes). A job still running after that is
+                     left to finish in the background and stores its result
+                     in video_cache, where pollers on any worker find it.
+
+    Returns:
+        Stream info dict (original_url, proxy_headers, stream_expires_at,
+        formats table, video details), or None if no engine produced a
+        stream URL
+
+    Raises:
+        JobPending: If the remote job is still running after remote_wait
+    """
+    from app.services.youtube import YouTubeService
+
+    # Use YouTubeService which handles failover (Local -> Remote)
+    try:
+        info = YouTubeService.get_video_info(video_id, remote_wait=remote_wait)
+    except JobPending as e:
+        e.job.add_done_callback("stream_info", lambda job: store_stream_info(video_id, job.result))
+        raise
+    return store_stream_info(video_id, info)
+
+
+def with_formats(video_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stream info that has a formats table, extracting one locally if needed
+
+    The remote engine returns a single download URL and no formats, so
+    stream info it produced is replaced by a local extraction (stored for
+    later calls). Returns data unchanged if that is not possible (yt-dlp
+    failing or its circuit open); its formats table is then empty.
+    """
+    if data.get("formats"):
+        return data
+
+    from app.services.circuit_breaker import get_breaker
+    from app.services.youtube import YouTubeService
+
+    def extract():
+        if not get_breaker('local').allow():
+            return None
+        return store_stream_info(video_id, YouTubeService._call_local(video_id))
+
+    def cached_with_formats():
+        cached = get_cached_stream_info(video_id)
+        return cached if cached and cached.get("formats") else None
+
+    local = get_single_flight().do(flight_key("stream_formats", video_id), extract, peek=cached_with_formats)
+    return local if local and local.get("formats") else data
+
+
+def store_stream_info(video_id: str, info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Build stream info from an engine's video info and cache it; None without a stream URL"""
+    stream_url = info.get("stream_url") if info else None
+    if not stream_url:
+        return None
+
+    expires_at = url_expiry(stream_url)
+    data = {
+        "original_url": stream_url,
+        "stream_expires_at": expires_at,
+        "title": info.get("title", "Unknown"),
+        "description": info.get("description", ""),
+        "uploader": info.get("uploader", ""),
+        "uploader_id": info.get("uploader_id", ""),
+        "channel_id": info.get("channel_id", ""),
+        "upload_date": info.get("upload_date", ""),
+        "view_count": info.get("view_count", 0),
+        "subtitle_url": info.get("subtitle_url"),
+        "duration": info.get("duration"),
+        "thumbnail": info.get("thumbnail") or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+        "related": [],
+        "formats": normalize_formats(info.get("formats")),
+        # Headers the proxy must send upstream; they stay server-side behind the proxy token
+        "proxy_headers": {
+            k: v for k, v in (info.get("http_headers") or {}).items()
+            if k.lower() in _FORWARDED_HEADERS
+        },
+    }
+
+    if expires_at:
+        ttl = expires_at - Config.STREAM_EXPIRY_MARGIN - time.time()
+    else:
+        ttl = Config.CACHE_VIDEO_TTL
+    if ttl > 0:
+        CacheService.set_video_cache(video_id, data, ttl=ttl)
+    else:
+        logger.warning(f"Stream URL for {video_id} expires too soon to cache")
+    return data
+
+
+class StreamRefresher:
+    """
+    Re-resolves stream URLs of videos that are being watched before they expire
+
+    The proxy calls touch() for every request it can tie to a video. A
+    background thread per worker looks at videos touched within
+    STREAM_ACTIVE_WINDOW and re-extracts those whose cached stream info
+    expires within STREAM_REFRESH_AHEAD, under a lease so only one worker
+    does it. Proxy tokens that pointed at the old URL are repointed, so
+    players keep their links.
+    """
+
+    def __init__(self, interval: float = None, ahead: float = None, window: float = None):
+        self.interval = interval or Config.STREAM_REFRESH_INTERVAL
+        self.ahead = ahead or Config.STREAM_REFRESH_AHEAD
+        self.window = window or Config.STREAM_ACTIVE_WINDOW
+        self._lock = threading.Lock()
+        self._active: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'checks': 0,
+            'refreshed': 0,
+            'repointed': 0,
+            'failed': 0,
+        }
+
+    def touch(self, video_id: str):
+        """Note that a video's stream is being proxied right now"""
+        with self._lock:
+            self._active[video_id] = time.time()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-refresher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh_due()
+            except Exception as e:
+                logger.error(f"Stream refresher error: {e}")
+
+    def refresh_due(self):
+        """Refresh every active video whose stream URL is about to expire"""
+        now = time.time()
+        with self._lock:
+            for video_id, seen in list(self._active.items()):
+                if now - seen > self.window:
+                    del self._active[video_id]
+            active = list(self._active)
+
+        for video_id in active:
+            with self._lock:
+                self._stats['checks'] += 1
+            cached = get_cached_stream_info(video_id)
+            expires_at = cached.get("stream_expires_at") if cached else None
+            if cached is not None and (not expires_at or expires_at - now > self.ahead):
+                continue
+
+            lease = f"stream_refresh:{video_id}"
+            if not LeaseService.acquire(lease, ttl=Config.CACHE_REFRESH_LEASE_TTL):
+                continue
+            try:
+                self.refresh(video_id, cached)
+            finally:
+                LeaseService.release(lease)
+
+    def refresh(self, video_id: str, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Re-extract one video and move its proxy tokens to the new URL"""
+        try:
+            data = resolve_stream_info(video_id)
+        except Exception as e:
+            logger.error(f"Stream refresh failed for {video_id}: {e}")
+            data = None
+        if not data:
+            with self._lock:
+                self._stats['failed'] += 1
+            return None
+
+        with self._lock:
+            self._stats['refreshed'] += 1
+        logger.info(f"Refreshed stream URL for {video_id}")
+
+        # Quality links point at individual formats; follow them by itag
+        tokens = get_proxy_tokens()
+        fresh = {f["itag"]: f["url"] for f in data["formats"] if f["itag"]}
+        if previous:
+            moves = [(previous["original_url"], data["original_url"])]
+            moves += [(f["url"], fresh[f["itag"]]) for f in previous.get("formats", [])
+                      if f["itag"] in fresh]
+        else:
+            # The cached entry already expired or was evicted: take the old
+            # URLs from the tokens themselves. Only progressive links carry
+            # an itag= parameter; HLS segment links are left alone.
+            original_itag = url_itag(data["original_url"])
+            if original_itag:
+                fresh.setdefault(original_itag, data["original_url"])
+            moves = [(url, fresh[url_itag(url)]) for url in tokens.urls_for(video_id)
+                     if url_itag(url) in fresh]
+        moved = sum(tokens.repoint(video_id, old, new, data["proxy_headers"])
+                    for old, new in moves if old != new)
+        with self._lock:
+            self._stats['repointed'] += moved
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = len(self._active)
+        return stats
+
+
+# Global stream refresher
+_refresher: Optional[StreamRefresher] = None
+_refresher_lock = threading.Lock()
+
+
+def get_stream_refresher() -> StreamRefresher:
+    """Get or create the global stream refresher"""
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = StreamRefresher()
+    return _refresher
@@ -0,0 +1,212 @@
+"""
+Stream Proxy Module
+Pooled upstream connections and chunked relay for /video_proxy
+"""
+import time
+import threading
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Browser-like headers sent upstream; h_* query params override them
+DEFAULT_UPSTREAM_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://www.youtube.com/",
+    "Origin": "https://www.youtube.com",
+    "Accept": "*/*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "cross-site",
+}
+
+# Hop-by-hop / length headers that must not be copied to the client
+EXCLUDED_RESPONSE_HEADERS = {
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "connection",
+}
+
+
+def header_overrides(args: Dict[str, str]) -> Dict[str, str]:
+    """Header overrides from h_<Name>=value query parameters of a proxy request"""
+    return {key[2:]: value for key, value in args.items() if key.startswith("h_")}
+
+
+def build_upstream_headers(overrides: Dict[str, str], range_header: Optional[str] = None) -> Dict[str, str]:
+    """
+    Headers for the upstream request
+
+    Args:
+        overrides: Headers replacing the browser-like defaults
+        range_header: Client Range header, forwarded for seeking
+    """
+    headers = dict(DEFAULT_UPSTREAM_HEADERS)
+    headers.update(overrides)
+    if range_header:
+        headers["Range"] = range_header
+    return headers
+
+
+def response_headers(upstream: requests.Response) -> List[Tuple[str, str]]:
+    """Upstream headers that are safe to relay to the client"""
+    return [
+        (name, value)
+        for (name, value) in upstream.headers.items()
+        if name.lower() not in EXCLUDED_RESPONSE_HEADERS
+    ]
+
+
+class ProxyEngine:
+    """
+    Relays upstream media to clients
+
+    - One requests.Session per upstream host, so keep-alive TCP/TLS
+      connections to each googlevideo host are reused across requests.
+    - Bodies are read straight into a reusable buffer in large chunks,
+      instead of iter_content's 8 KB pieces.
+    - Each relay records time-to-first-byte and throughput.
+    """
+
+    def __init__(self, chunk_size: int = None, pool_maxsize: int = None,
+                 connect_timeout: float = None, read_timeout: float = None):
+        self.chunk_size = chunk_size or Config.PROXY_CHUNK_SIZE
+        self.pool_maxsize = pool_maxsize or Config.PROXY_POOL_MAXSIZE
+        self.timeout = (connect_timeout or Config.PROXY_CONNECT_TIMEOUT,
+                        read_timeout or Config.PROXY_READ_TIMEOUT)
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'completed': 0,
+            'aborted': 0,
+            'bytes': 0,
+            'ttfb_total': 0.0,
+            'ttfb_max': 0.0,
+            'transfer_time': 0.0,
+        }
+
+    def session_for(self, url: str) -> requests.Session:
+        """Get the pooled session for a URL's host"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def open(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        """
+        Start an upstream request; the body is left unread
+
+        Returns:
+            Streaming response with `ttfb` (seconds until headers) attached
+        """
+        started = time.monotonic()
+        try:
+            upstream = self.session_for(url).get(url, headers=headers, stream=True, timeout=self.timeout)
+        except Exception:
+            self._count('errors')
+            raise
+        upstream.ttfb = time.monotonic() - started
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['ttfb_total'] += upstream.ttfb
+            self._stats['ttfb_max'] = max(self._stats['ttfb_max'], upstream.ttfb)
+        return upstream
+
+    def relay(self, upstream: requests.Response) -> Iterator[bytes]:
+        """
+        Yield the upstream body in chunk_size pieces, then close it
+
+        Encoded bodies go through requests' decoder; plain ones are read
+        with the urllib3 response's readinto() into one reused buffer, in
+        full chunk_size pieces. Reading to the end of the body returns the
+        connection to the pool.
+        """
+        started = time.monotonic()
+        sent = 0
+        completed = False
+        try:
+            raw = upstream.raw
+            if upstream.headers.get("content-encoding") or not hasattr(raw, "readinto"):
+                for chunk in upstream.iter_content(chunk_size=self.chunk_size):
+                    sent += len(chunk)
+                    yield chunk
+            else:
+                buffer = bytearray(self.chunk_size)
+                view = memoryview(buffer)
+                while True:
+                    filled = 0
+                    # Fill the whole buffer so clients get few, large writes
+                    while filled < self.chunk_size:
+                        n = raw.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    if not filled:
+                        break
+                    sent += filled
+                    yield bytes(view[:filled])
+                    if filled < self.chunk_size:
+                        break
+            completed = True
+        finally:
+            upstream.close()
+            self._record_transfer(upstream, sent, time.monotonic() - started, completed)
+
+    def _record_transfer(self, upstream: requests.Response, sent: int, elapsed: float, completed: bool):
+        with self._lock:
+            self._stats['bytes'] += sent
+            self._stats['transfer_time'] += elapsed
+            self._stats['completed' if completed else 'aborted'] += 1
+        rate = sent / elapsed / 1024 / 1024 if elapsed > 0 else 0.0
+        logger.info(
+            f"Proxied {sent} bytes from {urlsplit(upstream.url).netloc}: "
+            f"ttfb={getattr(upstream, 'ttfb', 0) * 1000:.0f}ms, {rate:.2f} MB/s"
+            f"{'' if completed else ' (client aborted)'}"
+        )
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, object]:
+        """Relay counters with average TTFB and throughput"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['upstream_hosts'] = len(self._sessions)
+        requests_made = stats['requests']
+        stats['avg_ttfb_ms'] = round(stats.pop('ttfb_total') / requests_made * 1000, 1) if requests_made else 0.0
+        stats['ttfb_max_ms'] = round(stats.pop('ttfb_max') * 1000, 1)
+        transfer_time = stats.pop('transfer_time')
+        stats['avg_throughput_mbps'] = (
+            round(stats['bytes'] * 8 / transfer_time / 1_000_000, 2) if transfer_time else 0.0
+        )
+        return stats
+
+
+# Global proxy engine
+_proxy_engine: Optional[ProxyEngine] = None
+_proxy_engine_lock = threading.Lock()
+
+
+def get_proxy_engine() -> ProxyEngine:
+    """Get or create the global proxy engine"""
+    global _proxy_engine
+    if _proxy_engine is None:
+        with _proxy_engine_lock:
+            if _proxy_engine is None:
+                _proxy_engine = ProxyEngine()
+    return _proxy_engine
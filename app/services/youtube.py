@@ -2,15 +2,70 @@
 YouTube Service Module
 Handles all yt-dlp interactions using the library directly (not subprocess)
 """
-import yt_dlp
 import logging
-from typing import Optional, List, Dict, Any
+import time
+import threading
+from typing import Optional, List, Dict, Any, Callable, Set
 from config import Config
-from app.services.loader_to import LoaderToService
+from app.services.loader_to import LoaderToService, JobPending
 from app.services.settings import SettingsService
+from app.services.extractor_pool import get_extractor_pool
+from app.services.hedging import get_hedger
+from app.services.circuit_breaker import get_breaker
+from app.services.executor import get_executor, Task
 
 logger = logging.getLogger(__name__)
 
+# Extractions that timed out but are still running: each holds an extract
+# pool worker and a checked-out YoutubeDL until yt-dlp returns
+_abandoned: Set[Task] = set()
+_abandoned_lock = threading.Lock()
+
+
+def abandoned_extractions() -> int:
+    """Timed-out extractions still running in the background"""
+    with _abandoned_lock:
+        return len(_abandoned)
+
+
+def _abandon(task: Task):
+    """Track a timed-out extraction until it finishes and frees its extractor"""
+    with _abandoned_lock:
+        _abandoned.add(task)
+    task.add_done_callback(_reclaim)
+
+
+def _reclaim(task: Task):
+    with _abandoned_lock:
+        _abandoned.discard(task)
+    logger.info("Timed-out extraction finished; its extractor is back in the pool")
+
+
+# Extraction errors that mean yt-dlp itself is being blocked or throttled. Any
+# other error (private, removed, age-restricted videos...) is about the video
+# and says nothing about the engine's health.
+ENGINE_FAILURE_MARKERS = (
+    'http error 429',
+    'http error 403',
+    'too many requests',
+    'timed out',
+    "sign in to confirm you’re not a bot",
+    "sign in to confirm you're not a bot",
+)
+
+
+def is_engine_failure(error: Optional[BaseException]) -> bool:
+    """Whether a local extraction error should count against the local engine's breaker"""
+    if error is None:
+        return False
+    # DownloadError wraps the exception that caused it
+    cause = (getattr(error, 'exc_info', None) or (None, None))[1]
+    if isinstance(error, OSError) or isinstance(cause, OSError):
+        # Timeouts and connection errors (TimeoutError, URLError...)
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ENGINE_FAILURE_MARKERS)
+
 
 class YouTubeService:
     """Service for fetching YouTube content using yt-dlp library"""
@@ -74,7 +129,7 @@ class YouTubeService:
             }
             
             results = []
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
                 info = ydl.extract_info(search_url, download=False)
                 entries = info.get('entries', []) if info else []
                 
@@ -106,44 +161,141 @@ class YouTubeService:
             return []
     
     @classmethod
-    def get_video_info(cls, video_id: str) -> Optional[Dict[str, Any]]:
+    def get_video_info(cls, video_id: str, remote_wait: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Get detailed video information including stream URL
         
         Args:
             video_id: YouTube video ID
+            remote_wait: Seconds to wait for the remote engine (default: until
+                         its job finishes)
         
         Returns:
             Video info dict with stream_url, or None on error
+        
+        Raises:
+            JobPending: If the remote job is still running after remote_wait
         """
         engine = SettingsService.get('youtube_engine', 'auto')
         
         # 1. Force Remote
         if engine == 'remote':
-            return cls._get_info_remote(video_id)
+            return cls._get_info_remote(video_id, remote_wait)
+        
+        # A caller polling a failover still running (on any worker) skips the local retry
+        if engine == 'auto' and LoaderToService.jobs().find(cls._watch_url(video_id)):
+            return cls._get_info_remote(video_id, remote_wait)
+        
+        # 2. Auto with yt-dlp failing lately: skip it until its breaker half-opens
+        if engine == 'auto' and not get_breaker('local').allow():
+            logger.warning(f"yt-dlp circuit open, using remote loader for {video_id}")
+            return cls._get_info_remote(video_id, remote_wait, guarded=True)
+        
+        # 3. Auto: race the remote engine against a slow local extraction
+        if engine == 'auto' and Config.HEDGE_ENABLED:
+            return cls._get_info_hedged(video_id, remote_wait)
             
-        # 2. Local (or Auto first attempt)
-        info = cls._get_info_local(video_id)
+        # 4. Local (or Auto first attempt)
+        info = cls._call_local(video_id)
         
         if info:
             return info
             
-        # 3. Failover if Auto
+        # 5. Failover if Auto
         if engine == 'auto' and not info:
             logger.warning(f"yt-dlp failed for {video_id}, falling back to remote loader")
-            return cls._get_info_remote(video_id)
+            return cls._get_info_remote(video_id, remote_wait, guarded=True)
             
         return None
 
+    @staticmethod
+    def _watch_url(video_id: str) -> str:
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    @classmethod
+    def _get_info_remote(cls, video_id: str, wait: Optional[float] = None,
+                         guarded: bool = False) -> Optional[Dict[str, Any]]:
+        """Fetch info using LoaderToService (guarded: not while its circuit is open)"""
+        url = cls._watch_url(video_id)
+        if guarded and not LoaderToService.jobs().find(url) and not get_breaker('remote').allow():
+            logger.warning(f"Remote loader circuit open, no engine available for {video_id}")
+            return None
+        job = LoaderToService.submit(url)
+        info = job.wait(wait)
+        if job.pending:
+            raise JobPending(job)
+        return info
+
+    @classmethod
+    def _get_info_hedged(cls, video_id: str, remote_wait: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetch info with yt-dlp, starting loader.to as well if yt-dlp is slow
+        
+        yt-dlp gets the hedge delay (tuned from its recent latencies) before
+        loader.to is started; whichever returns a stream URL first wins. A
+        losing loader.to job is released, which cancels it unless another
+        caller joined it; a losing yt-dlp call cannot be interrupted and its
+        result is dropped.
+        """
+        url = cls._watch_url(video_id)
+        remote_job = {}
+        callback = f"hedge:{id(remote_job)}"
+        
+        def remote(report):
+            # Submitted in the caller's thread, so a caller that stops waiting
+            # at once (remote_wait=0) still finds the job; the job's own
+            # scheduler reports the outcome, no pool thread waits on it
+            if not get_breaker('remote').allow():
+                report(None)
+                return
+            job = remote_job['job'] = LoaderToService.submit(url)
+            job.add_done_callback(callback, lambda done: report(done.result))
+        
+        def cancel(engine):
+            job = remote_job.get('job')
+            if engine == 'remote' and job:
+                # The job is shared by everyone asking for this video: drop
+                # only this hedge's interest in it
+                job.remove_done_callback(callback)
+                LoaderToService.jobs().release(job)
+        
+        info, winner = get_hedger().run(
+            ('local', lambda: cls._call_local(video_id)),
+            ('remote', remote, True),
+            timeout=remote_wait,
+            cancel=cancel,
+        )
+        if winner is None:
+            job = remote_job.get('job')
+            if job and job.pending:
+                raise JobPending(job)
+        return info
+
     @classmethod
-    def _get_info_remote(cls, video_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch info using LoaderToService"""
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        return LoaderToService.get_stream_url(url)
+    def _call_local(cls, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        _get_info_local, with its latency and outcome recorded for hedging and the breaker
+
+        Only blocked or throttled extractions (see is_engine_failure) count
+        as breaker failures; a video that is simply unavailable was a
+        successful call as far as the engine's health goes.
+        """
+        errors = []
+        started = time.monotonic()
+        info = get_hedger().timed('local', lambda: cls._get_info_local(video_id, errors))
+        failed = any(is_engine_failure(error) for error in errors)
+        get_breaker('local').record(not failed, time.monotonic() - started)
+        return info
 
     @classmethod
-    def _get_info_local(cls, video_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch info using yt-dlp (original logic)"""
+    def _get_info_local(cls, video_id: str, errors: Optional[List[BaseException]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetch info using yt-dlp (original logic)
+
+        Args:
+            video_id: YouTube video ID
+            errors: If given, the extraction error is appended to it
+        """
         try:
             url = f"https://www.youtube.com/watch?v={video_id}"
             
@@ -154,7 +306,7 @@ class YouTubeService:
                 'skip_download': True,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
                 if not info:
@@ -180,11 +332,50 @@ class YouTubeService:
                     'subtitle_url': subtitle_url,
                     'duration': info.get('duration'),
                     'thumbnail': info.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
-                    'http_headers': info.get('http_headers', {})
+                    'http_headers': info.get('http_headers', {}),
+                    'formats': info.get('formats') or [],
                 }
                 
         except Exception as e:
             logger.error(f"Error getting local video info for {video_id}: {e}")
+            if errors is not None:
+                errors.append(e)
+            return None
+    
+    @classmethod
+    def get_video_metadata(cls, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get display metadata for a single video (full, non-flat extraction)
+        
+        Returns:
+            Dict with title, thumbnail, uploader, view_count, duration (seconds)
+            and upload_date, or None on error
+        """
+        try:
+            ydl_opts = {
+                **cls.BASE_OPTS,
+                'skip_download': True,
+                'noplaylist': True,
+            }
+            
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
+                info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+            
+            if not info:
+                return None
+            
+            return {
+                'id': info.get('id') or video_id,
+                'title': info.get('title'),
+                'thumbnail': info.get('thumbnail'),
+                'uploader': info.get('uploader') or info.get('channel'),
+                'view_count': info.get('view_count'),
+                'duration': int(info['duration']) if info.get('duration') else None,
+                'upload_date': info.get('upload_date'),
+            }
+            
+        except Exception as e:
+            logger.warning(f"Failed to fetch metadata for {video_id}: {e}")
             return None
     
     @staticmethod
@@ -215,6 +406,125 @@ class YouTubeService:
         
         return None
     
+    @staticmethod
+    def _run_with_timeout(func: Callable[[], Any], timeout: float) -> Any:
+        """
+        Run an in-process extraction with a deadline
+        
+        The call runs on the shared extract pool so a stalled extraction cannot
+        hold the request past its timeout (or the request deadline); it finishes
+        (bounded by socket_timeout) in the background, returning its extractor
+        to the pool, and its result is discarded. A call still queued when time
+        is up is dropped. While EXTRACT_MAX_ABANDONED timed-out calls are still
+        running, new ones fail at once rather than queue for their workers and
+        extractors.
+        """
+        stalled = abandoned_extractions()
+        if stalled >= Config.EXTRACT_MAX_ABANDONED:
+            raise TimeoutError(f"{stalled} timed-out extractions still running")
+        
+        pool = get_executor('extract')
+        task = pool.submit(func)
+        done, _ = pool.wait([task], timeout=timeout)
+        
+        if not done:
+            if not task.cancelled():
+                _abandon(task)
+            raise TimeoutError(f"Extraction timed out after {timeout}s")
+        return task.result()
+    
+    @classmethod
+    def extract_playlist(cls, url: str, limit: int = 20, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Flat-extract a channel tab, playlist or search URL in-process
+        
+        Args:
+            url: Channel/playlist URL or a ytsearchN: query
+            limit: Maximum number of entries
+            timeout: Seconds before giving up (default from config)
+        
+        Returns:
+            Playlist info dict with an 'entries' list, or None
+        
+        Raises:
+            TimeoutError: If extraction did not finish in time
+        """
+        ydl_opts = {
+            **cls.BASE_OPTS,
+            'extract_flat': True,
+            'skip_download': True,
+            'playlist_items': f'1:{limit}',
+        }
+        
+        def extract():
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
+                return ydl.extract_info(url, download=False)
+        
+        return cls._run_with_timeout(extract, timeout or Config.YTDLP_TIMEOUT)
+    
+    @classmethod
+    def get_playlist_entries(cls, url: str, limit: int = 20, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Flat entries of a channel, playlist or search URL, in one batch
+        
+        In-process equivalent of `yt-dlp --dump-json --flat-playlist`, except
+        that the first `limit` entries are extracted before any is returned:
+        each entry is a raw yt-dlp dict, with the playlist's channel fields
+        filled in where the entry lacks them.
+        
+        Raises:
+            TimeoutError: If extraction did not finish in time
+        """
+        info = cls.extract_playlist(url, limit=limit, timeout=timeout)
+        if not info:
+            return []
+        
+        entries = []
+        for entry in info.get('entries') or []:
+            if not entry or not entry.get('id'):
+                continue
+            for field in ('channel', 'channel_id', 'uploader', 'uploader_id'):
+                if not entry.get(field) and info.get(field):
+                    entry[field] = info[field]
+            entries.append(entry)
+        return entries
+    
+    @classmethod
+    def get_comments(cls, video_id: str, limit: int = 50, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Fetch top comments for a video in-process
+        
+        Args:
+            video_id: YouTube video ID
+            limit: Maximum number of comments to fetch
+            timeout: Seconds before giving up (default from config)
+        
+        Returns:
+            Dict with 'comments' (raw yt-dlp comment dicts) and 'comment_count'
+        
+        Raises:
+            TimeoutError: If extraction did not finish in time
+        """
+        ydl_opts = {
+            **cls.BASE_OPTS,
+            'skip_download': True,
+            'noplaylist': True,
+            'getcomments': True,
+            # Stop paging once we have what we display
+            'extractor_args': {'youtube': {'max_comments': [str(limit)]}},
+        }
+        
+        def extract():
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
+                return ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+        
+        info = cls._run_with_timeout(extract, timeout or Config.YTDLP_TIMEOUT) or {}
+        comments = (info.get('comments') or [])[:limit]
+        return {
+            'comments': comments,
+            'comment_count': info.get('comment_count') or len(comments),
+        }
+    
     @classmethod
     def get_channel_videos(cls, channel_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """
@@ -238,22 +548,7 @@ class YouTubeService:
             else:
                 url = f"https://www.youtube.com/{channel_id}"
             
-            ydl_opts = {
-                **cls.BASE_OPTS,
-                'extract_flat': True,
-                'playlist_items': f'1:{limit}',
-            }
-            
-            results = []
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                entries = info.get('entries', []) if info else []
-                
-                for entry in entries:
-                    if entry and entry.get('id'):
-                        results.append(cls.sanitize_video_data(entry))
-            
-            return results
+            return [cls.sanitize_video_data(entry) for entry in cls.get_playlist_entries(url, limit=limit)]
             
         except Exception as e:
             logger.error(f"Error getting channel videos for {channel_id}: {e}")
@@ -285,7 +580,7 @@ class YouTubeService:
                 'youtube_include_hls_manifest': False,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with get_extractor_pool().checkout(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
                 download_url = info.get('url', '')
@@ -0,0 +1,12 @@
+"""
+KV-Tube ASGI Entry Point
+Serves /video_proxy with non-blocking I/O and everything else through Flask
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+(requires the optional httpx and uvicorn packages)
+"""
+from app import create_app
+from app.asgi_proxy import create_asgi_app
+
+# Flask handles every route except /video_proxy
+app = create_asgi_app(create_app())
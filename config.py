@@ -15,6 +15,11 @@ class Config:
     # Database
     DATA_DIR = os.environ.get('KVTUBE_DATA_DIR', 'data')
     DB_NAME = os.path.join(DATA_DIR, 'kvtube.db')
+    DB_BUSY_TIMEOUT = 5  # Seconds a writer waits for another worker's lock
+    DB_SYNCHRONOUS = 'NORMAL'  # Safe with WAL; skips an fsync per commit
+    DB_MMAP_SIZE = 256 * 1024 * 1024
+    DB_CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+    SETTINGS_RECHECK_INTERVAL = 2  # Seconds between settings.json mtime checks
     
     # Video storage
     VIDEO_DIR = os.environ.get('KVTUBE_VIDEO_DIR', './videos')
@@ -28,16 +33,171 @@ class Config:
     CACHE_VIDEO_TTL = 3600  # 1 hour
     CACHE_CHANNEL_TTL = 1800  # 30 minutes
     
+    # Cache janitor: periodic cleanup of kvtube.db (one worker per pass)
+    VIDEO_CACHE_MAX_BYTES = int(os.environ.get('VIDEO_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 0 disables
+    CACHE_ACCESS_RESOLUTION = 60  # Seconds between last_access updates of a video_cache row
+    JANITOR_INTERVAL = 300
+    JANITOR_BATCH = 500  # Rows deleted per transaction
+    JANITOR_VACUUM_PAGES = 2000  # Free pages released per pass
+    
+    # Two-tier shared cache (per-worker LRU + shared SQLite table)
+    CACHE_NAMESPACE_TTL = {
+        'search': 600,  # 10 minutes
+        'trending': 60,  # 1 minute for fresher content
+        'section': 900,  # 15 minutes
+        'channel': CACHE_CHANNEL_TTL,
+    }
+    CACHE_MEMORY_ITEMS = 512
+    CACHE_MEMORY_BYTES = 32 * 1024 * 1024  # 32 MB per worker
+    CACHE_DISK_BYTES = 256 * 1024 * 1024  # 256 MB shared
+    
+    # Encoding of cached payloads (video_cache, shared_cache, metadata store).
+    # auto = msgpack/zstd when installed, else compact JSON/zlib; rows keep a
+    # tag byte, so switching later leaves existing rows readable
+    CACHE_SERIALIZER = os.environ.get('CACHE_SERIALIZER', 'auto')  # auto, json, msgpack
+    CACHE_COMPRESSION = os.environ.get('CACHE_COMPRESSION', 'auto')  # auto, zlib, zstd, none
+    CACHE_COMPRESS_THRESHOLD = 1024  # Compress payloads from this many encoded bytes
+    
+    # Homepage sections: (soft TTL, hard TTL) in seconds. Past the soft TTL the
+    # cached section is still served while one background refresh runs.
+    SECTION_TTL = {
+        'recommended': (900, 6 * 3600),
+        'trending': (900, 6 * 3600),
+    }
+    CACHE_REFRESH_LEASE_TTL = 120
+    
+    # Video metadata store: max age per field before it is fetched again
+    METADATA_FIELD_TTL = {
+        'title': 7 * 86400,
+        'thumbnail': 7 * 86400,
+        'uploader': 7 * 86400,
+        'view_count': 6 * 3600,
+        'duration': 30 * 86400,
+        'upload_date': 30 * 86400,
+    }
+    
+    # Hydration engine (shared pool for per-video metadata fetches)
+    HYDRATION_WORKERS = 8
+    HYDRATION_PER_HOST = 6  # Concurrent fetches per upstream host
+    HYDRATION_ITEM_TIMEOUT = 20  # Drop items still queued after this long
+    HYDRATION_DEADLINE = 4  # Max seconds a request waits; the rest fills in later
+    
+    # Shared worker pools (threads per worker process), see app/services/executor.py.
+    # A request's fan-out waits at most FANOUT_DEADLINE; tasks still queued then are dropped
+    EXECUTOR_POOLS = {
+        'requests': 16,  # Per-request fan-out: homepage sections, parallel searches
+        'extract': 16,  # In-process extractions with a timeout, hedged engine calls
+        'background': 4,  # Cache refreshes and warming
+    }
+    EXECUTOR_DEFAULT_WORKERS = 4
+    FANOUT_DEADLINE = 25
+    
+    # Video proxy: pooled upstream sessions and relay chunk size
+    PROXY_CHUNK_SIZE = int(os.environ.get('PROXY_CHUNK_SIZE', 256 * 1024))
+    PROXY_POOL_MAXSIZE = 16  # Keep-alive connections per upstream host
+    PROXY_CONNECT_TIMEOUT = 10
+    PROXY_READ_TIMEOUT = 30
+    ASGI_PROXY_MAX_CONNECTIONS = 512  # Upstream connections per process in ASGI mode (asgi.py)
+    
+    # Proxy tokens: short /video_proxy?t= links instead of full upstream URLs
+    PROXY_TOKEN_SECRET = os.environ.get('PROXY_TOKEN_SECRET', '')  # Default: key file in DATA_DIR
+    PROXY_TOKEN_TTL = 6 * 3600
+    PROXY_TOKEN_MEMORY_ITEMS = 20000
+    PROXY_TOKEN_RECHECK = 30  # Seconds before a worker re-reads a token it holds in memory
+    
+    # Stream URLs: cached until shortly before their expire= time; URLs of
+    # videos still being proxied are re-extracted ahead of expiry
+    STREAM_EXPIRY_MARGIN = 300
+    STREAM_REFRESH_INTERVAL = 60
+    STREAM_REFRESH_AHEAD = 900  # Re-extract when the cached URL expires within this
+    STREAM_ACTIVE_WINDOW = 300  # A video counts as watched this long after its last proxied request
+    
+    # Related-video prefetch: stream info for the top related videos is
+    # resolved in the background, within a per-worker budget
+    PREFETCH_TOP_N = 3
+    PREFETCH_BUDGET = 20  # Extractions per window
+    PREFETCH_BUDGET_WINDOW = 60
+    PREFETCH_MAX_BUSY = 2  # Hold off while this many extractors serve live requests
+    PREFETCH_BUSY_BACKOFF = 1.0
+    PREFETCH_MAX_AGE = 120  # Drop queued videos older than this
+    PREFETCH_QUEUE = 50
+    
+    # Rewritten HLS manifests (live ones are kept for their target duration)
+    HLS_CACHE_ITEMS = 256
+    HLS_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024  # Bigger VOD playlists are only streamed
+    HLS_VOD_TTL = 300
+    HLS_LIVE_DEFAULT_TTL = 2  # When a live playlist has no EXT-X-TARGETDURATION
+    
+    # Segment cache: proxied video bytes kept on disk for rewatches/seeks (0 disables)
+    SEGMENT_CACHE_DIR = os.path.join(DATA_DIR, 'segments')
+    SEGMENT_CACHE_BYTES = int(os.environ.get('SEGMENT_CACHE_BYTES', 2 * 1024 * 1024 * 1024))
+    
+    # Single-flight: how long a worker waits on another worker's extraction
+    SINGLE_FLIGHT_LEASE_TTL = 45
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.25
+    
     # yt-dlp settings
     # yt-dlp settings - MUST use progressive formats with combined audio+video
     # Format 22 = 720p mp4, 18 = 360p mp4 (both have audio+video combined)
     # HLS m3u8 streams have CORS issues with segment proxying, so we avoid them
     YTDLP_FORMAT = '22/18/best[protocol^=https][ext=mp4]/best[ext=mp4]/best'
     YTDLP_TIMEOUT = 30
+
+    # Extractor pool (warm YoutubeDL instances per option set)
+    EXTRACTOR_POOL_SIZE = int(os.environ.get('EXTRACTOR_POOL_SIZE', 4))
+    EXTRACTOR_MAX_USES = 200  # Recycle an instance after this many checkouts
+    EXTRACTOR_MAX_IDLE = 600  # Close instances idle for 10 minutes
+    EXTRACTOR_CHECKOUT_TIMEOUT = 30
+    # Timed-out extractions left running (each holds an extract worker and an
+    # extractor) before new ones fail fast instead of queueing behind them
+    EXTRACT_MAX_ABANDONED = 8
     
+    # Outbound rate limits per upstream host: (calls per second, burst), per
+    # worker. Every yt-dlp extraction takes one www.youtube.com token. Lower
+    # priority classes leave OUTBOUND_RESERVE tokens for interactive requests.
+    OUTBOUND_RATE = {
+        'www.youtube.com': (3.0, 12),
+    }
+    OUTBOUND_DEFAULT_RATE = (5.0, 10)
+    OUTBOUND_RESERVE = {
+        'prefetch': 3,
+        'warmer': 6,
+    }
+
     # YouTube Engine Settings
     YOUTUBE_ENGINE = os.environ.get('YOUTUBE_ENGINE', 'auto')  # auto, local, remote
     LOADER_TO_API_KEY = os.environ.get('LOADER_TO_API_KEY', '')  # Optional
+    # Remote engine jobs are polled in the background; requests wait at most
+    # LOADER_TO_REQUEST_WAIT (or ?wait=, capped) and then report them pending
+    LOADER_TO_TIMEOUT = 60
+    LOADER_TO_POLL_INITIAL = 1.0
+    LOADER_TO_POLL_MAX = 8.0
+    LOADER_TO_JOB_TTL = 300  # Finished jobs stay visible to pollers this long
+    LOADER_TO_REQUEST_WAIT = 5
+    LOADER_TO_MAX_WAIT = 25
+    
+    # Hedging in auto mode: start loader.to when yt-dlp has not answered within
+    # the HEDGE_PERCENTILE of its recent latencies (HEDGE_DEFAULT_DELAY until
+    # HEDGE_MIN_SAMPLES calls were timed)
+    HEDGE_ENABLED = True
+    HEDGE_PERCENTILE = 90
+    HEDGE_DEFAULT_DELAY = 8.0
+    HEDGE_MIN_DELAY = 1.0
+    HEDGE_MAX_DELAY = YTDLP_TIMEOUT
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_HISTORY = 500  # Histogram counts are halved at this many samples
+    
+    # Circuit breakers per engine (local, remote): open at BREAKER_FAILURE_RATE
+    # over the last BREAKER_WINDOW seconds, skip the engine in auto mode for
+    # BREAKER_COOLDOWN, then let BREAKER_PROBES calls through to test it
+    BREAKER_WINDOW = 120
+    BREAKER_MIN_CALLS = 5
+    BREAKER_FAILURE_RATE = 0.5
+    BREAKER_COOLDOWN = 60
+    BREAKER_PROBES = 1
+    BREAKER_SLOW_CALL = {
+        'local': 20,  # yt-dlp calls slower than this count as failures
+    }
     
     @staticmethod
     def init_app(app):
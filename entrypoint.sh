@@ -17,5 +17,11 @@ pip install -U yt-dlp || echo "Warning: yt-dlp update failed"
 echo "[Update] Engines checked."
 
 # 3. Start Application
+# KVTUBE_SERVER=asgi serves /video_proxy with non-blocking I/O (needs httpx + uvicorn)
+if [ "$KVTUBE_SERVER" = "asgi" ]; then
+    echo "[Startup] Launching Uvicorn (async streaming proxy)..."
+    exec uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4 --timeout-keep-alive 120
+fi
+
 echo "[Startup] Launching Gunicorn..."
 exec gunicorn --bind 0.0.0.0:5000 --workers 4 --threads 2 --timeout 120 wsgi:app
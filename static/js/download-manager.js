@@ -85,8 +85,22 @@ class DownloadManager {
 
     // === Download Functions ===
 
+    // Same polling as fetchWhenReady in watch.html (whose inline script runs
+    // before this file loads): stream endpoints answer 202 while the remote
+    // engine is still fetching a video, so poll again (without waiting
+    // server-side) until it is ready
+    async fetchWhenReady(url) {
+        let response = await fetch(url);
+        for (let attempt = 0; response.status === 202 && attempt < 30; attempt++) {
+            const retryAfter = parseFloat(response.headers.get('Retry-After')) || 2;
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+            response = await fetch(`${url}&wait=0`);
+        }
+        return response;
+    }
+
     async fetchFormats(videoId) {
-        const response = await fetch(`/api/download/formats?v=${videoId}`);
+        const response = await this.fetchWhenReady(`/api/download/formats?v=${videoId}`);
         const data = await response.json();
         if (!data.success) {
             throw new Error(data.error || 'Failed to fetch formats');
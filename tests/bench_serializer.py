@@ -0,0 +1,77 @@
+"""
+Compare cache payload encodings: stored size, encode and decode time.
+
+Usage: python tests/bench_serializer.py [path/to/kvtube.db]
+
+Uses real video_cache rows when a database is given, else a synthetic
+stream info payload.
+"""
+import json
+import os
+import sqlite3
+import sys
+import timeit
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import serializer as serializer_module
+from app.services.serializer import Serializer
+
+
+def sample_payloads(db_path=None):
+    if db_path:
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT data FROM video_cache LIMIT 200').fetchall()
+        conn.close()
+        reader = Serializer('json', 'none')
+        payloads = [reader.loads(row[0]) for row in rows if row[0]]
+        if payloads:
+            return payloads
+    return [{
+        'title': 'Sample video title',
+        'description': 'Line of a typical video description with links https://example.com\n' * 60,
+        'uploader': 'Channel', 'uploader_id': '@channel', 'channel_id': 'UC' + 'x' * 22,
+        'upload_date': '20240101', 'view_count': 1234567, 'duration': 754,
+        'original_url': 'https://rr1---sn-abc.googlevideo.com/videoplayback?expire=1700000000&' + 'p=v&' * 60,
+        'formats': [
+            {'itag': str(i), 'ext': 'mp4', 'height': h, 'vcodec': 'avc1.64001F', 'acodec': 'mp4a.40.2',
+             'size': 10_000_000 + i, 'note': f'{h}p', 'expires_at': 1700000000,
+             'url': f'https://rr1---sn-abc.googlevideo.com/videoplayback?itag={i}&' + 'p=v&' * 60}
+            for i, h in enumerate((144, 240, 360, 480, 720, 1080, 1440, 2160) * 3)
+        ],
+        'related': [],
+    }]
+
+
+def main():
+    payloads = sample_payloads(sys.argv[1] if len(sys.argv) > 1 else None)
+    variants = [('json', 'none'), ('json', 'zlib')]
+    if serializer_module.zstandard:
+        variants.append(('json', 'zstd'))
+    if serializer_module.msgpack:
+        variants += [('msgpack', 'none'), ('msgpack', 'zlib')]
+        if serializer_module.zstandard:
+            variants.append(('msgpack', 'zstd'))
+
+    baseline = sum(len(json.dumps(p)) for p in payloads)
+    print(f"{len(payloads)} payloads, json.dumps baseline {baseline} bytes")
+    print(f"{'format':<16}{'bytes':>12}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+    for encoding, compression in variants:
+        s = Serializer(encoding, compression)
+        blobs = [s.dumps(p) for p in payloads]
+        size = sum(len(b) for b in blobs)
+        runs = max(1, 2000 // len(payloads))
+        encode = timeit.timeit(lambda: [s.dumps(p) for p in payloads], number=runs) / runs / len(payloads)
+        decode = timeit.timeit(lambda: [s.loads(b) for b in blobs], number=runs) / runs / len(payloads)
+        print(f"{encoding + '/' + compression:<16}{size:>12}{size / baseline:>8.2f}"
+              f"{encode * 1e6:>12.1f}{decode * 1e6:>12.1f}")
+
+    legacy = [json.dumps(p) for p in payloads]
+    runs = max(1, 2000 // len(payloads))
+    decode = timeit.timeit(lambda: [json.loads(t) for t in legacy], number=runs) / runs / len(payloads)
+    print(f"{'legacy json text':<16}{baseline:>12}{1:>8.2f}{'':>12}{decode * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
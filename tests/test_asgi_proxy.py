@@ -0,0 +1,175 @@
+import unittest
+import asyncio
+import tempfile
+import os
+import sys
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import a2wsgi
+except ImportError:
+    a2wsgi = None
+
+from app.services import proxy_tokens as proxy_tokens_module
+from app.services.cache import ConnectionPool
+from app.services.proxy_tokens import ProxyTokenRegistry
+from app.services.segment_cache import SegmentCache
+
+UPSTREAM = 'https://rr1---sn-x.googlevideo.com/videoplayback?itag=18'
+BODY = bytes(range(256)) * 40
+
+
+def upstream(request):
+    """Fake googlevideo host: honours Range, fails on demand"""
+    if request.url.host == 'down.example.com':
+        raise httpx.ConnectError("connection refused", request=request)
+    if request.url.host == 'denied.example.com':
+        return httpx.Response(403, content=b'Forbidden')
+    range_header = request.headers.get('range')
+    if range_header:
+        start, end = (int(n) for n in range_header.split('=', 1)[1].split('-'))
+        return httpx.Response(206, content=BODY[start:end + 1], headers={
+            'Content-Type': 'video/mp4',
+            'Content-Range': f'bytes {start}-{end}/{len(BODY)}',
+            'Accept-Ranges': 'bytes',
+        })
+    return httpx.Response(200, content=BODY, headers={'Content-Type': 'video/mp4'})
+
+
+@unittest.skipUnless(httpx, 'httpx not installed')
+class TestAsyncProxy(unittest.TestCase):
+
+    def setUp(self):
+        from app.asgi_proxy import create_asgi_app
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self.registry = ProxyTokenRegistry(secret=b'test-secret', pool=self.pool)
+        patcher = mock.patch.object(proxy_tokens_module, '_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.seen = []
+
+        def handler(request):
+            self.seen.append(request)
+            return upstream(request)
+
+        self.app = self.make_app(create_asgi_app, handler)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    @staticmethod
+    def make_app(create_asgi_app, handler, wsgi_app=None):
+        app = create_asgi_app(wsgi_app)
+        app.proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return app
+
+    def call(self, query: str, headers=(), path='/video_proxy', app=None):
+        """Run one request through the ASGI app; returns (status, headers, body)"""
+        messages = []
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.sleep(3600)  # The client never goes away
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'http_version': '1.1',
+            'scheme': 'http',
+            'server': ('testserver', 80),
+            'root_path': '',
+            'method': 'GET',
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+        }
+        asyncio.run((app or self.app)(scope, receive, send))
+        start = messages[0]
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+    def test_range_is_passed_through(self):
+        status, headers, body = self.call(str(httpx.QueryParams({'url': UPSTREAM})), [('Range', 'bytes=100-199')])
+        self.assertEqual(status, 206)
+        self.assertEqual(body, BODY[100:200])
+        self.assertEqual(headers['content-range'], f'bytes 100-199/{len(BODY)}')
+        self.assertEqual(headers['access-control-allow-origin'], '*')
+        self.assertEqual(self.seen[0].headers['range'], 'bytes=100-199')
+
+    def test_relayed_ranges_are_cached(self):
+        from app import asgi_proxy
+
+        cache = SegmentCache(os.path.join(self.tmp.name, 'segments'), max_bytes=10 ** 7, pool=self.pool)
+        url = 'https://rr1---sn-x.googlevideo.com/videoplayback?id=abc&itag=18'
+        query = str(httpx.QueryParams({'url': url}))
+        with mock.patch.object(asgi_proxy, 'get_segment_cache', return_value=cache), \
+                mock.patch.object(asgi_proxy.Config, 'SEGMENT_CACHE_BYTES', 10 ** 7):
+            first = self.call(query, [('Range', 'bytes=100-199')])
+            second = self.call(query, [('Range', 'bytes=120-149')])
+        self.assertEqual(first[::2], (206, BODY[100:200]))
+        self.assertEqual(second[::2], (206, BODY[120:150]))
+        self.assertEqual(second[1]['content-range'], f'bytes 120-149/{len(BODY)}')
+        self.assertEqual(len(self.seen), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_header_overrides(self):
+        query = str(httpx.QueryParams({'url': UPSTREAM, 'h_Referer': 'https://www.youtube.com/', 'h_User-Agent': 'UA'}))
+        status, _, body = self.call(query)
+        self.assertEqual((status, body), (200, BODY))
+        self.assertEqual(str(self.seen[0].url), UPSTREAM)
+        self.assertEqual(self.seen[0].headers['referer'], 'https://www.youtube.com/')
+        self.assertEqual(self.seen[0].headers['user-agent'], 'UA')
+
+    def test_token_resolves_to_its_target(self):
+        link = self.registry.link(UPSTREAM, {'Referer': 'https://www.youtube.com/'})
+        status, _, body = self.call(link.split('?', 1)[1], [('Range', 'bytes=0-9')])
+        self.assertEqual((status, body), (206, BODY[:10]))
+        self.assertEqual(str(self.seen[0].url), UPSTREAM)
+        self.assertEqual(self.seen[0].headers['referer'], 'https://www.youtube.com/')
+
+    def test_bad_requests(self):
+        self.assertEqual(self.call('t=not-a-token')[0], 410)
+        self.assertEqual(self.call('')[0], 400)
+        self.assertEqual(self.seen, [])
+
+    def test_upstream_errors(self):
+        status, _, body = self.call('url=https://denied.example.com/videoplayback')
+        self.assertEqual((status, body), (403, b'Forbidden'))
+        status, headers, _ = self.call('url=https://down.example.com/videoplayback')
+        self.assertEqual(status, 500)
+        self.assertEqual(headers['access-control-allow-origin'], '*')
+        self.assertEqual(self.app.proxy.stats()['errors'], 1)
+
+    def test_other_paths_without_flask(self):
+        self.assertEqual(self.call('', path='/watch')[0], 404)
+
+    @unittest.skipUnless(a2wsgi, 'a2wsgi not installed')
+    def test_other_paths_go_to_flask(self):
+        from app.asgi_proxy import create_asgi_app
+
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO'].encode()]
+
+        app = self.make_app(create_asgi_app, upstream, wsgi_app)
+        self.assertEqual(self.call('', path='/watch', app=app)[::2], (200, b'/watch'))
+        self.assertEqual(self.call(f'url={UPSTREAM}', app=app)[::2], (200, BODY))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import sys
+import time
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def make(self, **kwargs):
+        options = dict(window=60, min_calls=4, failure_rate=0.5, slow_call=1.0, cooldown=0.05, probes=1)
+        options.update(kwargs)
+        return CircuitBreaker('local', **options)
+
+    def test_opens_on_failure_rate(self):
+        breaker = self.make()
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.1)
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state(), CLOSED)
+        breaker.record(True, 5.0)  # Too slow: counts as a failure
+        self.assertEqual(breaker.state(), OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_half_open_probe(self):
+        breaker = self.make(min_calls=1)
+        breaker.record(False)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertEqual(breaker.state(), HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # One probe at a time
+
+        breaker.record(False)
+        self.assertEqual(breaker.state(), OPEN)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(True, 0.2)
+        self.assertEqual(breaker.state(), CLOSED)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.stats()['opened'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
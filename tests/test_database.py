@@ -0,0 +1,87 @@
+import unittest
+import sqlite3
+import tempfile
+import threading
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import database as database_module
+from app.services.database import ConnectionPool, MIGRATIONS, schema_version
+from app.services.cache import HistoryService
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Missing data directory is created by the pool
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'data', 'test.db'))
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def test_pragmas(self):
+        conn = self.pool.get_connection()
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+        self.assertGreater(conn.execute('PRAGMA busy_timeout').fetchone()[0], 0)
+
+    def test_connection_per_thread(self):
+        conns = []
+        threading.Thread(target=lambda: conns.append(self.pool.get_connection())).start()
+        threading.Thread(target=lambda: conns.append(self.pool.get_connection())).start()
+        main = self.pool.get_connection()
+        self.assertIs(main, self.pool.get_connection())
+        for _ in range(100):
+            if len(conns) == 2:
+                break
+            threading.Event().wait(0.01)
+        self.assertNotIn(main, conns)
+
+    def test_migrations_dedupe_and_index_old_database(self):
+        path = os.path.join(self.tmp.name, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('''CREATE TABLE user_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, video_id TEXT, title TEXT,
+            thumbnail TEXT, type TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+        conn.execute('CREATE TABLE proxy_tokens (token TEXT PRIMARY KEY, url TEXT NOT NULL, headers TEXT, expires_at REAL)')
+        conn.executemany(
+            'INSERT INTO user_videos (user_id, video_id, title, type) VALUES (?, ?, ?, ?)',
+            [(1, 'a', 'old', 'history'), (1, 'b', 'b', 'history'), (1, 'a', 'new', 'history')]
+        )
+        conn.commit()
+        conn.close()
+
+        pool = ConnectionPool(path)
+        self.addCleanup(pool.close)
+        conn = pool.get_connection()
+        self.assertEqual(schema_version(conn), len(MIGRATIONS))
+        rows = conn.execute('SELECT video_id, title FROM user_videos ORDER BY video_id').fetchall()
+        self.assertEqual([tuple(r) for r in rows], [('a', 'new'), ('b', 'b')])
+        plan = ' '.join(r[-1] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT title FROM user_videos WHERE user_id = 1 AND type = 'history' "
+            "ORDER BY timestamp DESC LIMIT 5"
+        ))
+        self.assertIn('idx_user_videos_list', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+        # Reopening is a no-op
+        self.assertEqual(database_module.migrate(conn), len(MIGRATIONS))
+
+    def test_history_upsert(self):
+        saved, database_module._pool = database_module._pool, self.pool
+        self.addCleanup(setattr, database_module, '_pool', saved)
+        HistoryService.add_to_history('a', 'first', 't1')
+        HistoryService.add_to_history('b', 'b', 't2')
+        HistoryService.add_to_history('a', 'second', 't3')
+        history = HistoryService.get_history()
+        self.assertEqual(len(history), 2)
+        self.assertEqual({h['id']: h['title'] for h in history}['a'], 'second')
+
+
+if __name__ == '__main__':
+    unittest.main()
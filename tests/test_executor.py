@@ -0,0 +1,98 @@
+import unittest
+import threading
+import time
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.executor import TaskPool, request_deadline, current_deadline
+from app.services.outbound import WARMER, current_priority, outbound_priority
+
+
+class TestTaskPool(unittest.TestCase):
+
+    def test_gather_runs_in_parallel_and_keeps_order(self):
+        pool = TaskPool('test', 4)
+
+        def work(n):
+            time.sleep(0.1)
+            return n * 2
+
+        start = time.monotonic()
+        self.assertEqual(pool.gather(work, [1, 2, 3, 4]), [2, 4, 6, 8])
+        self.assertLess(time.monotonic() - start, 0.35)
+        self.assertEqual(pool.stats()['workers'], 4)
+
+    def test_failed_items_yield_default(self):
+        pool = TaskPool('test', 2)
+
+        def work(n):
+            if n == 2:
+                raise ValueError("boom")
+            return [n]
+
+        self.assertEqual(pool.gather(work, [1, 2, 3], default=[]), [[1], [], [3]])
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_nested_gather_does_not_deadlock(self):
+        """Every worker waiting on subtasks would starve a plain bounded pool"""
+        pool = TaskPool('test', 1)
+
+        def outer(n):
+            return sum(pool.gather(lambda m: m + n, [1, 2, 3]))
+
+        self.assertEqual(pool.gather(outer, [0, 10], timeout=2), [6, 36])
+        self.assertEqual(pool.stats()['inline'], 6)
+
+    def test_deadline_cancels_queued_tasks(self):
+        pool = TaskPool('test', 1)
+        release = threading.Event()
+        ran = []
+
+        def work(n):
+            ran.append(n)
+            if n == 0:
+                release.wait(2)
+            return n
+
+        with request_deadline(0.1):
+            results = pool.gather(work, [0, 1, 2])
+        release.set()
+        self.assertEqual(results, [None, None, None])
+        time.sleep(0.1)
+        self.assertEqual(ran, [0])
+        self.assertEqual(pool.stats()['cancelled'], 2)
+
+    def test_task_queued_past_its_deadline_expires(self):
+        pool = TaskPool('test', 1)
+        release = threading.Event()
+        blocker = pool.submit(release.wait, 2)
+        with request_deadline(0.05):
+            late = pool.submit(lambda: 'ran')
+        time.sleep(0.1)
+        release.set()
+        blocker.result(2)
+        with self.assertRaises(TimeoutError):
+            late.result(2)
+        self.assertEqual(pool.stats()['expired'], 1)
+
+    def test_tasks_inherit_priority_and_deadline(self):
+        pool = TaskPool('test', 2)
+        with outbound_priority(WARMER), request_deadline(5):
+            expected = current_deadline()
+            task = pool.submit(lambda: (current_priority(), current_deadline()))
+        self.assertEqual(task.result(2), (WARMER, expected))
+
+    def test_nested_deadlines_only_tighten(self):
+        with request_deadline(1):
+            outer = current_deadline()
+            with request_deadline(10):
+                self.assertEqual(current_deadline(), outer)
+            with request_deadline(None):
+                self.assertIsNone(current_deadline())
+
+
+if __name__ == '__main__':
+    unittest.main()
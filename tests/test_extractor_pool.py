@@ -0,0 +1,100 @@
+import unittest
+import threading
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.extractor_pool import ExtractorPool
+
+
+class FakeYDL:
+    """Stand-in for yt_dlp.YoutubeDL that records its lifecycle"""
+
+    def __init__(self, params):
+        self.params = params
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestExtractorPool(unittest.TestCase):
+
+    def test_reuses_instance_for_same_options(self):
+        """A released instance is handed out again for identical options"""
+        pool = ExtractorPool(max_per_key=2, factory=FakeYDL)
+        with pool.checkout({'quiet': True}) as first:
+            pass
+        with pool.checkout({'quiet': True}) as second:
+            pass
+
+        self.assertIs(first, second)
+        stats = pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_per_call_options_do_not_split_pool(self):
+        """Playlist range is applied for one checkout and then restored"""
+        pool = ExtractorPool(factory=FakeYDL)
+        with pool.checkout({'quiet': True, 'playlistend': 5}) as ydl:
+            self.assertEqual(ydl.params['playlistend'], 5)
+        with pool.checkout({'quiet': True, 'playlistend': 20}) as again:
+            self.assertIs(ydl, again)
+            self.assertEqual(again.params['playlistend'], 20)
+        self.assertNotIn('playlistend', ydl.params)
+
+    def test_unhealthy_instance_is_discarded(self):
+        """Unexpected errors close the instance instead of returning it"""
+        pool = ExtractorPool(factory=FakeYDL)
+        with self.assertRaises(RuntimeError):
+            with pool.checkout({'quiet': True}) as broken:
+                raise RuntimeError("boom")
+
+        self.assertTrue(broken.closed)
+        with pool.checkout({'quiet': True}) as fresh:
+            self.assertIsNot(broken, fresh)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_retires_after_max_uses(self):
+        pool = ExtractorPool(max_uses=2, factory=FakeYDL)
+        seen = []
+        for _ in range(3):
+            with pool.checkout({}) as ydl:
+                seen.append(ydl)
+
+        self.assertIs(seen[0], seen[1])
+        self.assertIsNot(seen[1], seen[2])
+        self.assertTrue(seen[0].closed)
+
+    def test_bounded_checkout_waits_then_times_out(self):
+        """With every instance checked out, callers wait and eventually time out"""
+        pool = ExtractorPool(max_per_key=1, factory=FakeYDL)
+        held = threading.Event()
+        released = threading.Event()
+
+        def hold():
+            with pool.checkout({}):
+                held.set()
+                released.wait(1)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        try:
+            held.wait(1)
+            with self.assertRaises(TimeoutError):
+                with pool.checkout({}, timeout=0.05):
+                    pass
+        finally:
+            released.set()
+            holder.join()
+
+        with pool.checkout({}, timeout=1):
+            pass
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
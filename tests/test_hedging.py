@@ -0,0 +1,99 @@
+import unittest
+import os
+import sys
+import time
+import threading
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.hedging import Hedger, LatencyHistogram
+
+
+def after(seconds, value):
+    def call():
+        time.sleep(seconds)
+        return value
+    return call
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles_and_decay(self):
+        h = LatencyHistogram(max_samples=1000)
+        for _ in range(90):
+            h.observe(0.5)
+        for _ in range(10):
+            h.observe(10)
+        self.assertLessEqual(abs(h.percentile(50) - 0.5), 0.2)
+        self.assertGreaterEqual(h.percentile(99), 10)
+
+        small = LatencyHistogram(max_samples=10)
+        for _ in range(10):
+            small.observe(1)
+        self.assertEqual(small.count, 5)
+
+
+class TestHedger(unittest.TestCase):
+
+    def test_fast_primary_never_hedges(self):
+        hedger = Hedger(default_delay=0.5)
+        started = []
+        result, winner = hedger.run(('local', after(0, 'a')),
+                                    ('remote', lambda: started.append(1) or 'b'))
+        self.assertEqual((result, winner), ('a', 'local'))
+        self.assertEqual(started, [])
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        hedger = Hedger(default_delay=0.05)
+        cancelled = []
+        t = time.monotonic()
+        result, winner = hedger.run(('local', after(1, 'a')), ('remote', after(0.05, 'b')),
+                                    cancel=cancelled.append)
+        self.assertEqual((result, winner), ('b', 'remote'))
+        self.assertLess(time.monotonic() - t, 0.5)
+        self.assertEqual(cancelled, ['local'])
+        self.assertEqual(hedger.stats()['hedged'], 1)
+
+    def test_failed_primary_fails_over_at_once(self):
+        hedger = Hedger(default_delay=5)
+        t = time.monotonic()
+        result, winner = hedger.run(('local', after(0, None)), ('remote', after(0, 'b')))
+        self.assertEqual(winner, 'remote')
+        self.assertLess(time.monotonic() - t, 1)
+        self.assertEqual(hedger.stats()['failover'], 1)
+
+    def test_asynchronous_engine_reports_through_callback(self):
+        """An asynchronous engine starts in the caller's thread and holds no worker"""
+        hedger = Hedger(default_delay=0.01)
+        reports = []
+        started = []
+
+        def remote(report):
+            started.append(threading.current_thread())
+            reports.append(report)
+
+        result = hedger.run(('local', after(1, 'a')), ('remote', remote, True), timeout=0)
+        self.assertEqual(result, (None, None))
+        self.assertEqual(started, [threading.current_thread()])
+
+        def later(report):
+            threading.Timer(0.05, report, args=('b',)).start()
+
+        result = hedger.run(('local', after(1, 'a')), ('remote', later, True))
+        self.assertEqual(result, ('b', 'remote'))
+
+    def test_timeout_and_delay_tuning(self):
+        hedger = Hedger(default_delay=0.01, min_delay=0, max_delay=20, min_samples=5)
+        self.assertEqual(hedger.run(('local', after(1, 'a')), ('remote', after(1, 'b')), timeout=0.05),
+                         (None, None))
+        self.assertEqual(hedger.stats()['unanswered'], 1)
+
+        for _ in range(10):
+            hedger.record('local', 2.0, True)
+        self.assertGreaterEqual(hedger.delay('local'), 2.0)
+        self.assertLess(hedger.delay('local'), 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import time
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from urllib.parse import quote
+
+from app.services.hls import ManifestCache, is_manifest, rewrite_manifest
+
+LIVE = """#EXTM3U
+#EXT-X-TARGETDURATION:5
+#EXTINF:5.0,
+seg1.ts
+#EXTINF:5.0,
+https://cdn/seg2.ts"""
+
+
+def link(url):
+    return f"/video_proxy?url={quote(url, safe='')}"
+
+
+class TestHls(unittest.TestCase):
+
+    def test_manifest_rewrite(self):
+        self.assertTrue(is_manifest('https://host/a/index.m3u8?x=1', 'text/plain'))
+        self.assertFalse(is_manifest('https://host/videoplayback?id=1', 'video/mp4'))
+
+        rewritten = rewrite_manifest(LIVE, 'https://host/a/index.m3u8', link)
+        self.assertEqual(rewritten.splitlines()[3:], [
+            '/video_proxy?url=https%3A%2F%2Fhost%2Fa%2Fseg1.ts',
+            '#EXTINF:5.0,',
+            '/video_proxy?url=https%3A%2F%2Fcdn%2Fseg2.ts',
+        ])
+
+    def test_live_manifest_cached_for_target_duration(self):
+        cache = ManifestCache(max_items=10, max_entry_bytes=10000, vod_ttl=300)
+        url = 'https://host/a/index.m3u8'
+        variant = (('Referer', 'r'),)
+        body = ''.join(cache.rewrite_stream(LIVE.splitlines(), url, variant, link))
+
+        self.assertEqual(body, rewrite_manifest(LIVE, url, link))
+        self.assertEqual(cache.get(url, variant), body)
+        # Different header overrides are a different rewrite
+        self.assertIsNone(cache.get(url, ()))
+
+        key = (url, variant)
+        expires_in = cache._entries[key][1] - time.time()
+        self.assertTrue(4 < expires_in <= 5)
+
+    def test_large_manifest_streams_without_caching(self):
+        cache = ManifestCache(max_items=10, max_entry_bytes=1000, vod_ttl=300)
+        lines = ['#EXTM3U'] + [f'seg{i}.ts' for i in range(1000)] + ['#EXT-X-ENDLIST']
+        blocks = list(cache.rewrite_stream(lines, 'https://host/v.m3u8', (), link))
+
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(''.join(blocks).count('/video_proxy?url='), 1000)
+        self.assertIsNone(cache.get('https://host/v.m3u8', ()))
+        self.assertEqual(cache.stats()['too_large'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import threading
+import time
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.hydration import HydrationEngine
+
+
+class TestHydrationEngine(unittest.TestCase):
+
+    def test_returns_results_in_parallel(self):
+        engine = HydrationEngine(max_workers=4, per_host_limit=4, item_timeout=5)
+
+        def fetch(key):
+            time.sleep(0.1)
+            return key.upper()
+
+        start = time.monotonic()
+        results = engine.hydrate(['a', 'b', 'c', 'd'], fetch, deadline=2)
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'})
+        self.assertLess(time.monotonic() - start, 0.35)
+
+    def test_deadline_returns_partial_and_late_items_still_report(self):
+        """Slow items miss the response but still reach on_result"""
+        engine = HydrationEngine(max_workers=2, per_host_limit=2, item_timeout=5)
+        release = threading.Event()
+        stored = {}
+        late_done = threading.Event()
+
+        def fetch(key):
+            if key == 'slow':
+                release.wait(2)
+            return key
+
+        def on_result(key, result):
+            stored[key] = result
+            if key == 'slow':
+                late_done.set()
+
+        results = engine.hydrate(['fast', 'slow'], fetch, deadline=0.1, on_result=on_result)
+        self.assertEqual(results, {'fast': 'fast'})
+        self.assertEqual(engine.stats()['late'], 1)
+
+        release.set()
+        self.assertTrue(late_done.wait(2))
+        self.assertEqual(stored, {'fast': 'fast', 'slow': 'slow'})
+
+    def test_in_flight_item_is_joined(self):
+        engine = HydrationEngine(max_workers=4, per_host_limit=4, item_timeout=5)
+        release = threading.Event()
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            release.wait(2)
+            return key
+
+        first = threading.Thread(target=engine.hydrate, args=(['x'], fetch), kwargs={'deadline': 2})
+        first.start()
+        while not calls:
+            time.sleep(0.01)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(engine.hydrate(['x'], fetch, deadline=2), {'x': 'x'})
+        first.join()
+
+        self.assertEqual(calls, ['x'])
+        self.assertEqual(engine.stats()['joined'], 1)
+
+    def test_queued_items_expire(self):
+        """Items that cannot get a host slot before their deadline are dropped"""
+        engine = HydrationEngine(max_workers=4, per_host_limit=1, item_timeout=0.1)
+        release = threading.Event()
+
+        def fetch(key):
+            release.wait(1)
+            return key
+
+        threading.Timer(0.2, release.set).start()
+        results = engine.hydrate(['a', 'b'], fetch, deadline=1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(engine.stats()['expired'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
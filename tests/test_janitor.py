@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import time
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.database import ConnectionPool
+from app.services.janitor import CacheJanitor
+
+
+class TestJanitor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def fill(self, rows):
+        with self.pool.connection() as conn:
+            conn.executemany(
+                'INSERT INTO video_cache (video_id, data, expires_at, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def test_expired_rows_deleted_in_batches(self):
+        now = time.time()
+        data = 'x' * 1000
+        self.fill([(f'old{i}', data, now - 1, 1000, now) for i in range(25)] +
+                  [(f'new{i}', data, now + 600, 1000, now) for i in range(5)])
+
+        result = CacheJanitor(batch_size=10, max_bytes=0, pool=self.pool).run_once()
+        self.assertEqual(result['expired_rows'], 25)
+        self.assertEqual(result['expired_bytes'], 25000)
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM video_cache').fetchone()[0], 5)
+
+    def test_size_budget_evicts_least_recently_read(self):
+        now = time.time()
+        self.fill([(f'v{i}', 'x' * 100, now + 600, 100, now - 100 + i) for i in range(10)])
+
+        janitor = CacheJanitor(batch_size=3, max_bytes=650, pool=self.pool)
+        result = janitor.run_once()
+        self.assertEqual(result['evicted_rows'], 4)
+        with self.pool.connection() as conn:
+            left = [r[0] for r in conn.execute('SELECT video_id FROM video_cache ORDER BY video_id')]
+        self.assertEqual(left, [f'v{i}' for i in range(4, 10)])
+        self.assertEqual(janitor.stats()['evicted_bytes'], 400)
+
+    def test_incremental_vacuum_returns_pages(self):
+        now = time.time()
+        self.fill([(f'v{i}', 'x' * 4000, now - 1, 4000, now) for i in range(200)])
+
+        result = CacheJanitor(max_bytes=0, vacuum_pages=100000, pool=self.pool).run_once()
+        self.assertGreater(result['vacuumed_bytes'], 0)
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA freelist_count').fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
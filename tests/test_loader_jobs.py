@@ -0,0 +1,146 @@
+import unittest
+import tempfile
+import os
+import sys
+import threading
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app.services.cache import ConnectionPool, TieredCache
+from app.services.loader_to import LoaderToJobs, LoaderToService
+
+URL = 'https://www.youtube.com/watch?v=abc'
+
+
+class TestLoaderToJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.polls = []
+        self.started = []
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.pool.close)
+        patches = [
+            mock.patch.object(Config, 'LOADER_TO_POLL_INITIAL', 0.01),
+            mock.patch.object(Config, 'LOADER_TO_POLL_MAX', 0.04),
+            mock.patch.object(LoaderToService, 'start_task', self.fake_start),
+            mock.patch.object(LoaderToService, 'check_progress', self.fake_progress),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def make_jobs(self, **kwargs):
+        """A worker's scheduler; all of them share this test's SQLite file"""
+        return LoaderToJobs(cache=TieredCache(pool=self.pool), **kwargs)
+
+    def fake_start(self, url, fmt):
+        self.started.append(url)
+        return {'id': 'task1', 'progress_url': 'https://p/progress?id=task1', 'info': {'title': 'T'}}
+
+    def fake_progress(self, progress_url):
+        self.polls.append(progress_url)
+        if len(self.polls) < 3:
+            return 'running', None
+        return 'done', {'download_url': 'https://dl/abc.mp4'}
+
+    def test_submit_returns_before_task_finishes(self):
+        jobs = self.make_jobs(timeout=5)
+        job = jobs.submit(URL)
+        self.assertIs(jobs.submit(URL), job)
+        self.assertIsNone(job.wait(0))
+        self.assertTrue(job.pending)
+
+        seen = []
+        job.add_done_callback('test', seen.append)
+        result = job.wait(2)
+        self.assertEqual(result['stream_url'], 'https://dl/abc.mp4')
+        self.assertEqual(result['title'], 'T')
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(seen, [job])
+        self.assertEqual(len(self.polls), 3)
+        self.assertIsNone(jobs.find(URL))
+        self.assertIs(jobs.get(job.id), job)
+        stats = jobs.stats()
+        self.assertEqual((stats['submitted'], stats['joined'], stats['succeeded']), (1, 1, 1))
+
+    def test_times_out(self):
+        jobs = self.make_jobs(timeout=0.1)
+        with mock.patch.object(LoaderToService, 'check_progress', lambda progress_url: ('running', None)):
+            job = jobs.submit(URL)
+            self.assertIsNone(job.wait(2))
+        self.assertEqual((job.status, job.error), ('failed', 'timed out'))
+        self.assertEqual(jobs.stats()['timed_out'], 1)
+
+    def test_other_worker_follows_instead_of_resubmitting(self):
+        """A poll landing on another worker joins the running job"""
+        owner, other = self.make_jobs(timeout=5), self.make_jobs(timeout=5)
+        job = owner.submit(URL)
+
+        follower = other.find(URL)
+        self.assertIsNotNone(follower)
+        self.assertEqual(follower.id, job.id)
+        self.assertIs(other.submit(URL), follower)
+
+        result = follower.wait(2)
+        self.assertEqual(result['stream_url'], 'https://dl/abc.mp4')
+        self.assertEqual(self.started, [URL])
+        self.assertEqual(other.stats()['followed'], 1)
+
+        # A later poll elsewhere gets the finished result without extracting
+        late = self.make_jobs(timeout=5).submit(URL)
+        self.assertFalse(late.pending)
+        self.assertEqual(late.result['stream_url'], 'https://dl/abc.mp4')
+        self.assertEqual(self.started, [URL])
+
+    def test_slow_poll_does_not_hold_up_other_jobs(self):
+        jobs = self.make_jobs(timeout=5)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def progress(progress_url):
+            if 'slow' in progress_url:
+                release.wait(5)
+                return 'running', None
+            return 'done', {'download_url': 'https://dl/fast.mp4'}
+
+        def start(url, fmt):
+            name = 'slow' if url.endswith('slow') else 'fast'
+            return {'id': name, 'progress_url': f'https://p/progress?id={name}', 'info': {}}
+
+        with mock.patch.object(LoaderToService, 'check_progress', progress), \
+                mock.patch.object(LoaderToService, 'start_task', start):
+            slow = jobs.submit(URL + 'slow')
+            fast = jobs.submit(URL + 'fast')
+            self.assertEqual(fast.wait(2)['stream_url'], 'https://dl/fast.mp4')
+            self.assertTrue(slow.pending)
+
+    def test_release_cancels_only_jobs_nobody_joined(self):
+        with mock.patch.object(LoaderToService, 'check_progress', lambda progress_url: ('running', None)):
+            jobs = self.make_jobs(timeout=5)
+            job = jobs.submit(URL)
+            self.assertIs(jobs.submit(URL), job)
+            self.assertFalse(jobs.release(job))
+            self.assertTrue(job.pending)
+            self.assertTrue(jobs.release(job))
+            self.assertEqual((job.status, job.error), ('cancelled', 'cancelled'))
+
+    def test_release_keeps_job_followed_on_another_worker(self):
+        with mock.patch.object(LoaderToService, 'check_progress', lambda progress_url: ('running', None)):
+            owner, other = self.make_jobs(timeout=5), self.make_jobs(timeout=5)
+            job = owner.submit(URL)
+            follower = other.submit(URL)
+            self.assertFalse(owner.release(job))
+            self.assertTrue(job.pending)
+            # The follower's own release only stops its local polling
+            self.assertTrue(other.release(follower))
+            self.assertTrue(job.pending)
+            owner.cancel(job)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+import os
+import sys
+import time
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.database import ConnectionPool
+from app.services.metadata_store import MetadataStore, FIELDS
+
+
+class TestMetadataStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self.store = MetadataStore(field_ttl={f: 60 for f in FIELDS}, pool=self.pool)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def test_empty_fields_are_fresh_once_fetched(self):
+        self.store.upsert_many([{'id': 'abc', 'title': 'T', 'upload_date': None, 'uploader': ''}])
+        stored = self.store.load(['abc'])['abc']
+        self.assertIsNone(stored['fields']['upload_date'])
+        self.assertTrue(self.store.is_fresh(stored, ('title', 'upload_date', 'uploader')))
+        # Never fetched at all
+        self.assertFalse(self.store.is_fresh(stored, ('view_count',)))
+        self.assertFalse(self.store.is_fresh(stored, ('title',), now=time.time() + 120))
+
+    def test_empty_values_keep_stored_ones(self):
+        self.store.upsert_many([{'id': 'abc', 'uploader': 'Someone'}])
+        self.store.upsert_many([{'id': 'abc', 'uploader': ''}])
+        stored = self.store.load(['abc'])['abc']
+        self.assertEqual(stored['fields']['uploader'], 'Someone')
+        self.assertTrue(self.store.is_fresh(stored, ('uploader',)))
+
+    def test_get_many_does_not_refetch_empty_fields(self):
+        fetched = []
+
+        def fetcher(video_id):
+            fetched.append(video_id)
+            return {'id': video_id, **{f: None for f in FIELDS}, 'title': 'T'}
+
+        store = MetadataStore(fetcher=fetcher, field_ttl={f: 60 for f in FIELDS}, pool=self.pool)
+        self.assertEqual(store.get_many(['abc'], deadline=5)['abc']['title'], 'T')
+        self.assertEqual(store.get_many(['abc'], deadline=5)['abc']['upload_date'], '')
+        self.assertEqual(fetched, ['abc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.outbound import (
+    OutboundScheduler, INTERACTIVE, PREFETCH, WARMER, carry_priority, current_priority, outbound_priority,
+)
+
+
+class TestOutboundScheduler(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        scheduler = OutboundScheduler(rates={'h': (20.0, 3)}, reserve={})
+        start = time.monotonic()
+        for _ in range(5):
+            scheduler.acquire('h', priority=INTERACTIVE, timeout=2)
+        # 3 from the burst, 2 more at 20/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire('h', priority=INTERACTIVE, timeout=0)
+        self.assertEqual(scheduler.stats()['priorities']['interactive']['timeouts'], 1)
+
+    def test_reserve_and_priority_order(self):
+        # Slow refill, so both waiters are queued well before the next token
+        scheduler = OutboundScheduler(rates={'h': (2.0, 3)}, reserve={'warmer': 2})
+        scheduler.acquire('h', priority=WARMER, timeout=1)  # 3 -> 2 tokens
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire('h', priority=WARMER, timeout=0)  # Must leave 2
+        scheduler.acquire('h', priority=INTERACTIVE, timeout=0)
+        scheduler.acquire('h', priority=INTERACTIVE, timeout=0)
+
+        order = []
+
+        def take(name, priority):
+            scheduler.acquire('h', priority=priority, timeout=5)
+            order.append(name)
+
+        threads = [threading.Thread(target=take, args=('warmer', WARMER))]
+        threads[0].start()
+        time.sleep(0.02)
+        threads.append(threading.Thread(target=take, args=('prefetch', PREFETCH)))
+        threads.append(threading.Thread(target=take, args=('interactive', INTERACTIVE)))
+        for t in threads[1:]:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(order, ['interactive', 'prefetch', 'warmer'])
+
+    def test_priority_context(self):
+        seen = []
+        with outbound_priority(PREFETCH):
+            worker = threading.Thread(target=carry_priority(lambda: seen.append(current_priority())))
+        worker.start()
+        worker.join()
+        self.assertEqual(seen, [PREFETCH])
+        self.assertEqual(current_priority(), INTERACTIVE)
+
+
+if __name__ == '__main__':
+    unittest.main()
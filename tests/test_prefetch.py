@@ -0,0 +1,40 @@
+import unittest
+import time
+import os
+import sys
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.prefetch import StreamPrefetcher
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_top_ranked_first_within_budget(self):
+        fetched = []
+
+        def fake_get_stream_info(video_id, remote_wait=None):
+            fetched.append(video_id)
+            return {'original_url': 'https://h/' + video_id}, False
+
+        with mock.patch('app.services.prefetch.get_stream_info', fake_get_stream_info), \
+                mock.patch('app.services.prefetch.get_cached_stream_info', lambda video_id: None):
+            prefetcher = StreamPrefetcher(top_n=3, budget=2, window=60)
+            prefetcher.schedule(['a', 'b', 'c', 'd'])
+            for _ in range(100):
+                if len(fetched) == 2:
+                    break
+                time.sleep(0.02)
+            time.sleep(0.05)
+
+        self.assertEqual(fetched, ['a', 'b'])
+        stats = prefetcher.stats()
+        self.assertEqual(stats['scheduled'], 3)
+        self.assertEqual(stats['queued'], 1)
+        self.assertEqual(stats['budget_left'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
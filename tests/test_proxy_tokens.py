@@ -0,0 +1,64 @@
+import unittest
+import tempfile
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache import ConnectionPool
+from app.services.proxy_tokens import ProxyTokenRegistry
+
+
+class TestProxyTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def make_registry(self, **kwargs):
+        return ProxyTokenRegistry(secret=b'test-secret', pool=self.pool, **kwargs)
+
+    def test_link_is_short_and_resolves_in_other_worker(self):
+        url = 'https://r1.googlevideo.com/videoplayback?' + 'x' * 2000
+        headers = {'User-Agent': 'UA', 'Cookie': 'a=b'}
+        link = self.make_registry().link(url, headers)
+
+        self.assertTrue(link.startswith('/video_proxy?t='))
+        self.assertLess(len(link), 60)
+        token = link.split('=', 1)[1]
+        self.assertEqual(self.make_registry().resolve(token), (url, headers, None))
+
+    def test_same_target_same_token(self):
+        registry = self.make_registry()
+        self.assertEqual(registry.issue('https://h/a', {'A': '1'}), registry.issue('https://h/a', {'A': '1'}))
+        self.assertNotEqual(registry.issue('https://h/a', {'A': '1'}), registry.issue('https://h/a', {'A': '2'}))
+
+    def test_forged_and_expired_tokens_rejected(self):
+        registry = self.make_registry()
+        token = registry.issue('https://h/a')
+        token_id, _, signature = token.partition('.')
+        self.assertIsNone(registry.resolve(f'{token_id}.AAAAAAAAAAA'))
+        self.assertIsNone(ProxyTokenRegistry(secret=b'other', pool=self.pool).resolve(token))
+
+        expired = registry.issue('https://h/old', ttl=-1)
+        self.assertIsNone(registry.resolve(expired))
+        self.assertEqual(registry.stats()['expired'], 1)
+
+    def test_repoint_reaches_other_workers(self):
+        issuer, other = self.make_registry(), self.make_registry(recheck=0)
+        token = issuer.link('https://h/old?expire=1', {'A': '1'}, video_id='vid').split('=', 1)[1]
+        self.assertEqual(other.resolve(token).url, 'https://h/old?expire=1')
+
+        self.assertEqual(issuer.repoint('vid', 'https://h/old?expire=1', 'https://h/new', {'A': '2'}), 1)
+        self.assertEqual(issuer.resolve(token), ('https://h/new', {'A': '2'}, 'vid'))
+        self.assertEqual(other.resolve(token), ('https://h/new', {'A': '2'}, 'vid'))
+        self.assertEqual(issuer.repoint('other', 'https://h/new', 'https://h/x'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import tempfile
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache import ConnectionPool
+from app.services.segment_cache import SegmentCache, stream_key, requested_range
+from app.routes import streaming
+
+
+class TestSegmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self.cache = SegmentCache(os.path.join(self.tmp.name, 'segments'), max_bytes=1000, pool=self.pool)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def store(self, key, start, data, total=None):
+        with self.cache.writer(key, start, total, 'video/mp4') as writer:
+            writer.write(data)
+
+    def read(self, hit):
+        f = hit.open()
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_stream_key_and_range_parsing(self):
+        self.assertEqual(stream_key('https://r1.googlevideo.com/videoplayback?id=o-AB.1&itag=18&expire=1'), ('o-AB.1', '18'))
+        self.assertEqual(stream_key('https://r1.googlevideo.com/videoplayback/id/abc/itag/137/source/yt'), ('abc', '137'))
+        self.assertIsNone(stream_key('https://example.com/video.mp4'))
+        self.assertIsNone(stream_key('https://r1.googlevideo.com/videoplayback?id=../x&itag=18'))
+
+        self.assertEqual(requested_range('https://h/v?range=10-20', 'bytes=0-5'), (10, 20))
+        self.assertEqual(requested_range('https://h/v', 'bytes=100-'), (100, None))
+        self.assertEqual(requested_range('https://h/v', None), (0, None))
+        self.assertIsNone(requested_range('https://h/v', 'bytes=0-1,5-9'))
+
+    def test_hls_segments_and_playlists_are_not_keyed(self):
+        """Numbered segments and variant playlists share id/itag but not bytes"""
+        seg10 = 'https://r1.googlevideo.com/videoplayback/id/abc.1/itag/96/source/yt_live/sq/10/file/seg.ts'
+        seg11 = 'https://r1.googlevideo.com/videoplayback/id/abc.1/itag/96/source/yt_live/sq/11/file/seg.ts'
+        playlist = 'https://manifest.googlevideo.com/api/manifest/hls_playlist/id/abc.1/itag/96/playlist/index.m3u8'
+        self.assertIsNone(stream_key(seg10))
+        self.assertIsNone(stream_key(seg11))
+        self.assertIsNone(stream_key(playlist))
+        self.assertIsNone(stream_key('https://r1.googlevideo.com/videoplayback?id=abc.1&itag=96&sq=10'))
+
+    def test_full_body_to_ignored_range_request_is_stored_from_zero(self):
+        """Upstream answering 200 to a Range request sends the stream from byte 0"""
+        class Upstream:
+            status_code = 200
+            headers = {'content-length': '300', 'content-type': 'video/mp4'}
+
+        body = bytes(range(256)) + bytes(44)
+        original = streaming.get_segment_cache
+        streaming.get_segment_cache = lambda: self.cache
+        try:
+            relayed = streaming.cache_upstream_body(iter([body[:150], body[150:]]), Upstream(), ('vid', '18'), (100, 199))
+            self.assertEqual(b''.join(relayed), body)
+        finally:
+            streaming.get_segment_cache = original
+
+        hit = self.cache.lookup(('vid', '18'), 100, 199)
+        self.assertIsNotNone(hit)
+        self.assertEqual(self.read(hit), body[100:200])
+
+    def test_adjacent_ranges_merge_and_serve(self):
+        key = ('vid', '18')
+        self.store(key, 0, b'a' * 100, total=300)
+        self.assertIsNone(self.cache.lookup(key, 50, 150))
+
+        self.store(key, 100, b'b' * 100)
+        hit = self.cache.lookup(key, 50, 150)
+        self.assertEqual(self.read(hit), b'a' * 50 + b'b' * 51)
+        # Open-ended request needs the end of the stream
+        self.assertIsNone(self.cache.lookup(key, 150, None))
+
+        self.store(key, 200, b'c' * 100)
+        hit = self.cache.lookup(key, 250, None)
+        self.assertEqual((hit.end, hit.total), (299, 300))
+        self.assertEqual(self.read(hit), b'c' * 50)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_evicts_least_recently_used_stream(self):
+        self.store(('old', '18'), 0, b'x' * 600)
+        self.store(('new', '18'), 0, b'y' * 600)
+        self.cache.enforce_budget()
+
+        self.assertIsNone(self.cache.lookup(('old', '18'), 0, 599))
+        self.assertFalse(os.path.exists(self.cache.path_for(('old', '18'))))
+        self.assertIsNotNone(self.cache.lookup(('new', '18'), 0, 599))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
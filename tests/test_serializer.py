@@ -0,0 +1,50 @@
+import unittest
+import json
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import serializer as serializer_module
+from app.services.serializer import Serializer
+
+PAYLOAD = {
+    'title': 'Video',
+    'description': 'A long description. ' * 200,
+    'view_count': 12345,
+    'formats': [{'itag': '18', 'height': 360, 'url': 'https://r/videoplayback?itag=18'}],
+}
+
+
+class TestSerializer(unittest.TestCase):
+
+    def test_json_zlib_roundtrip_and_threshold(self):
+        s = Serializer('json', 'zlib', threshold=1024)
+        blob, size = s.encode(PAYLOAD)
+        self.assertEqual(blob[0], 0x11)
+        self.assertLess(len(blob), size)
+        self.assertEqual(s.loads(blob), PAYLOAD)
+
+        small = s.dumps({'a': 1})
+        self.assertEqual(small[0], 0x10)
+        self.assertEqual(s.loads(small), {'a': 1})
+
+    def test_legacy_json_rows_readable(self):
+        s = Serializer('json', 'zlib')
+        self.assertEqual(s.loads(json.dumps(PAYLOAD)), PAYLOAD)
+        self.assertEqual(s.loads(json.dumps(PAYLOAD).encode()), PAYLOAD)
+
+    def test_rows_readable_after_changing_format(self):
+        blob = Serializer('json', 'none').dumps(PAYLOAD)
+        self.assertEqual(Serializer('json', 'zlib').loads(blob), PAYLOAD)
+
+    @unittest.skipUnless(serializer_module.msgpack and serializer_module.zstandard, 'msgpack/zstandard not installed')
+    def test_msgpack_zstd_roundtrip(self):
+        blob = Serializer('msgpack', 'zstd').dumps(PAYLOAD)
+        self.assertEqual(blob[0], 0x22)
+        self.assertEqual(Serializer('json', 'zlib').loads(blob), PAYLOAD)
+
+
+if __name__ == '__main__':
+    unittest.main()
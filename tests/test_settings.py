@@ -0,0 +1,65 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app.services.settings import SettingsService
+
+
+class TestSettingsService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'settings.json')
+        self.patches = [
+            mock.patch.object(SettingsService, 'SETTINGS_FILE', self.path),
+            mock.patch.object(SettingsService, '_snapshot', None),
+            mock.patch.object(SettingsService, '_signature', None),
+            mock.patch.object(SettingsService, '_checked_at', 0.0),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_reads_reuse_snapshot(self):
+        with mock.patch.object(SettingsService, '_load_settings',
+                               wraps=SettingsService._load_settings) as load:
+            for _ in range(5):
+                self.assertEqual(SettingsService.get('youtube_engine'), 'auto')
+        self.assertEqual(load.call_count, 1)
+
+    def test_set_persists_atomically(self):
+        SettingsService.set('youtube_engine', 'local')
+        self.assertEqual(SettingsService.get('youtube_engine'), 'local')
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['youtube_engine'], 'local')
+        self.assertEqual(os.listdir(self.tmp.name), ['settings.json'])
+        with self.assertRaises(TypeError):
+            SettingsService.snapshot()['youtube_engine'] = 'remote'
+
+    def test_picks_up_other_writer(self):
+        SettingsService.set('youtube_engine', 'local')
+        # Another worker rewrites the file
+        with open(self.path, 'w') as f:
+            json.dump({'youtube_engine': 'remote', 'extra': True}, f)
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+        self.assertEqual(SettingsService.get('youtube_engine'), 'local')  # within recheck interval
+        with mock.patch.object(Config, 'SETTINGS_RECHECK_INTERVAL', 0):
+            self.assertEqual(SettingsService.get('youtube_engine'), 'remote')
+            self.assertTrue(SettingsService.get_all()['extra'])
+
+
+if __name__ == '__main__':
+    unittest.main()
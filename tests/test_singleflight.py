@@ -0,0 +1,131 @@
+import unittest
+import tempfile
+import threading
+import time
+import os
+import sys
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import cache as cache_module
+from app.services.cache import ConnectionPool, LeaseService
+from app.services.singleflight import SingleFlight, flight_key
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        # Leases go through the app's global pool
+        patcher = mock.patch.object(cache_module, 'get_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def run_concurrently(self, flight, key, fn, callers=5, peek=None):
+        """Call flight.do from several threads at once; returns their results or errors"""
+        outcomes = [None] * callers
+        start = threading.Barrier(callers)
+
+        def call(i):
+            start.wait()
+            try:
+                outcomes[i] = flight.do(key, fn, peek)
+            except Exception as e:
+                outcomes[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight(lease_ttl=5)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'id': 'abc'}
+
+        outcomes = self.run_concurrently(flight, flight_key('info', 'abc'), fn)
+        self.assertEqual(outcomes, [{'id': 'abc'}] * 5)
+        self.assertEqual(len(calls), 1)
+        stats = flight.stats()
+        self.assertEqual((stats['leaders'], stats['followers'], stats['in_flight']), (1, 4, 0))
+
+    def test_leader_error_reaches_followers(self):
+        flight = SingleFlight(lease_ttl=5)
+
+        def fn():
+            time.sleep(0.2)
+            raise ValueError("upstream down")
+
+        outcomes = self.run_concurrently(flight, 'key', fn, callers=3)
+        self.assertTrue(all(isinstance(o, ValueError) for o in outcomes))
+        # The failed call is not remembered
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+    def test_follower_stops_waiting_for_an_overrunning_leader(self):
+        flight = SingleFlight(lease_ttl=0.2)
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return 'leader'
+
+        leader = threading.Thread(target=flight.do, args=('key', slow))
+        leader.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        self.assertEqual(flight.do('key', lambda: 'follower'), 'follower')
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        leader.join(5)
+        self.assertEqual(flight.stats()['follower_timeouts'], 1)
+
+    def test_other_worker_result_is_picked_up(self):
+        """A lease held by another worker: poll peek instead of calling upstream"""
+        flight = SingleFlight(lease_ttl=5, poll_interval=0.02)
+        key = flight_key('info', 'abc')
+        # Leases are held per thread, so another thread stands in for another worker
+        other = threading.Thread(target=LeaseService.acquire, args=(f"flight:{key}", 5))
+        other.start()
+        other.join()
+
+        published = []
+        threading.Timer(0.1, published.append, args=['from other worker']).start()
+        peek = lambda: published[0] if published else None
+        calls = []
+
+        result = flight.do(key, lambda: calls.append(1) or 'local', peek)
+        self.assertEqual(result, 'from other worker')
+        self.assertEqual(calls, [])
+        self.assertEqual(flight.stats()['remote_hits'], 1)
+
+    def test_stuck_worker_lease_times_out(self):
+        flight = SingleFlight(lease_ttl=0.1, poll_interval=0.02)
+        other = threading.Thread(target=LeaseService.acquire, args=('flight:key', 5))
+        other.start()
+        other.join()
+
+        self.assertEqual(flight.do('key', lambda: 'local', lambda: None), 'local')
+        self.assertEqual(flight.stats()['remote_timeouts'], 1)
+
+    def test_lease_holder_checks_peek_first(self):
+        flight = SingleFlight(lease_ttl=5)
+        self.assertEqual(flight.do('key', lambda: 'local', lambda: 'cached'), 'cached')
+        # The lease was released
+        self.assertTrue(LeaseService.acquire('flight:key', 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import tempfile
+import os
+import sys
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import database as database_module
+from app.services.database import ConnectionPool
+from app.services import stream_info as stream_info_module
+from app.services.stream_info import (
+    url_expiry, normalize_formats, store_stream_info, with_formats, get_cached_stream_info, StreamRefresher,
+)
+from app.services.proxy_tokens import ProxyTokenRegistry
+from app.services.youtube import YouTubeService
+
+
+class TestStreamInfo(unittest.TestCase):
+
+    def test_expiry_from_query(self):
+        url = 'https://rr1---sn-x.googlevideo.com/videoplayback?expire=1700000000&ei=abc&itag=18'
+        self.assertEqual(url_expiry(url), 1700000000)
+
+    def test_expiry_from_manifest_path(self):
+        url = 'https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/1700003600/ei/abc/index.m3u8'
+        self.assertEqual(url_expiry(url), 1700003600)
+
+    def test_no_expiry(self):
+        self.assertIsNone(url_expiry('https://example.com/video.mp4'))
+        self.assertIsNone(url_expiry('https://example.com/videoplayback?expire=soon'))
+
+    def test_format_table(self):
+        table = normalize_formats([
+            {'format_id': '233', 'url': 'https://m/hls_playlist/index.m3u8', 'ext': 'mp4'},
+            {'format_id': '18', 'url': 'https://r/videoplayback?expire=1700000000&itag=18', 'ext': 'mp4',
+             'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a', 'filesize_approx': 1000, 'format_note': '360p'},
+            {'format_id': '140', 'url': 'https://r/videoplayback?itag=140', 'ext': 'm4a', 'vcodec': 'none',
+             'acodec': 'mp4a'},
+        ])
+        self.assertEqual([f['itag'] for f in table], ['18', '140'])
+        self.assertEqual(table[0]['size'], 1000)
+        self.assertEqual(table[0]['expires_at'], 1700000000)
+        self.assertEqual(table[1]['height'], 0)
+
+
+
+class TempDatabaseTestCase(unittest.TestCase):
+    """Points the app's connection pool at a temporary SQLite file"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self._saved_pool = database_module._pool
+        database_module._pool = self.pool
+
+    def tearDown(self):
+        database_module._pool = self._saved_pool
+        self.pool.close()
+        self.tmp.cleanup()
+
+
+class TestWithFormats(TempDatabaseTestCase):
+
+    def test_remote_stream_info_gets_local_formats(self):
+        """The remote engine reports no formats; a local extraction supplies them"""
+        remote = store_stream_info('vid', {'stream_url': 'https://dl/vid.mp4', 'title': 'T'})
+        self.assertEqual(remote['formats'], [])
+
+        with mock.patch.object(YouTubeService, '_call_local', lambda video_id: None):
+            self.assertIs(with_formats('vid', remote), remote)
+
+        local = {
+            'stream_url': 'https://r/videoplayback?itag=18', 'title': 'T',
+            'formats': [{'format_id': '18', 'url': 'https://r/videoplayback?itag=18', 'ext': 'mp4',
+                         'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a'}],
+        }
+        with mock.patch.object(YouTubeService, '_call_local', lambda video_id: local):
+            data = with_formats('vid', remote)
+        self.assertEqual([f['itag'] for f in data['formats']], ['18'])
+        self.assertEqual(get_cached_stream_info('vid')['formats'], data['formats'])
+
+
+class TestStreamRefresher(TempDatabaseTestCase):
+
+    def test_tokens_follow_refresh_after_cache_entry_is_gone(self):
+        """With no cached entry to compare, old URLs come from the tokens"""
+        registry = ProxyTokenRegistry(secret=b'test', pool=self.pool)
+        old_url = 'https://r/videoplayback?itag=18&expire=1'
+        play = registry.link(old_url, video_id='vid').split('=', 1)[1]
+        segment = registry.link('https://r/videoplayback/id/x/itag/96/sq/3', video_id='vid').split('=', 1)[1]
+
+        new_url = 'https://r/videoplayback?itag=18&expire=2'
+        data = {
+            'original_url': new_url,
+            'proxy_headers': {},
+            'formats': [{'itag': '18', 'url': new_url}],
+        }
+        with mock.patch.object(stream_info_module, 'resolve_stream_info', lambda video_id: data), \
+                mock.patch.object(stream_info_module, 'get_proxy_tokens', lambda: registry):
+            refresher = StreamRefresher(interval=60, ahead=60, window=60)
+            refresher.refresh('vid', None)
+
+        self.assertEqual(registry.resolve(play).url, new_url)
+        self.assertEqual(registry.resolve(segment).url, 'https://r/videoplayback/id/x/itag/96/sq/3')
+        self.assertEqual(refresher.stats()['repointed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
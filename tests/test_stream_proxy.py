@@ -0,0 +1,84 @@
+import unittest
+import threading
+import http.server
+import io
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from app.services.stream_proxy import ProxyEngine, build_upstream_headers, header_overrides
+
+BODY = os.urandom(300_000)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    peers = set()
+
+    def do_GET(self):
+        self.peers.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.send_header('Content-Type', 'video/mp4')
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestStreamProxy(unittest.TestCase):
+
+    def test_header_overrides_and_range(self):
+        overrides = header_overrides({'h_Referer': 'https://example.com/', 'url': 'x'})
+        headers = build_upstream_headers(overrides, 'bytes=0-99')
+        self.assertEqual(headers['Referer'], 'https://example.com/')
+        self.assertEqual(headers['Range'], 'bytes=0-99')
+        self.assertNotIn('url', headers)
+
+    def test_relay_reuses_upstream_connection(self):
+        """Consecutive relays from one host share a keep-alive connection"""
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_address[1]}/videoplayback'
+
+        engine = ProxyEngine(chunk_size=64 * 1024)
+        for _ in range(3):
+            chunks = list(engine.relay(engine.open(url, {})))
+            self.assertEqual(b''.join(chunks), BODY)
+            self.assertTrue(all(len(c) == 64 * 1024 for c in chunks[:-1]))
+
+        self.assertEqual(len(_Handler.peers), 1)
+        stats = engine.stats()
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['bytes'], 3 * len(BODY))
+
+    def test_relay_without_readinto_uses_iter_content(self):
+        class RawBody:
+            """A raw body with only read() and close()"""
+
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def read(self, amt=None, **kwargs):
+                return self._data.read(amt)
+
+            def close(self):
+                pass
+
+        upstream = requests.Response()
+        upstream.status_code = 200
+        upstream.url = 'http://upstream.test/videoplayback'
+        upstream.raw = RawBody(BODY)
+        chunks = list(ProxyEngine(chunk_size=64 * 1024).relay(upstream))
+        self.assertEqual(b''.join(chunks), BODY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import tempfile
+import threading
+import time
+import os
+import sys
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import database as database_module
+from app.services.cache import ConnectionPool, TieredCache, LeaseService
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self._saved_pool = database_module._pool
+        database_module._pool = self.pool
+
+    def tearDown(self):
+        database_module._pool = self._saved_pool
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def make_cache(self, **kwargs):
+        kwargs.setdefault('ttls', {'search': 60})
+        return TieredCache(pool=self.pool, **kwargs)
+
+    def test_callers_get_their_own_copy(self):
+        """Mutating a returned or stored value leaves the cached entry intact"""
+        cache = self.make_cache()
+        value = [{'id': 'abc'}]
+        cache.set('search', 'cats', value)
+        value[0]['upload_date'] = '20240101'
+
+        first = cache.get('search', 'cats')
+        first[0]['view_count'] = 5
+        self.assertEqual(cache.get('search', 'cats'), [{'id': 'abc'}])
+
+        other = self.make_cache()
+        from_disk = other.get('search', 'cats')
+        from_disk.append({'id': 'def'})
+        self.assertEqual(other.get('search', 'cats'), [{'id': 'abc'}])
+
+    def test_shared_tier_serves_other_workers(self):
+        """A value written by one worker's cache is read by another's"""
+        writer = self.make_cache()
+        reader = self.make_cache()
+
+        writer.set('search', 'cats', [{'id': 'abc'}])
+        self.assertEqual(reader.get('search', 'cats'), [{'id': 'abc'}])
+        self.assertEqual(reader.get('search', 'cats'), [{'id': 'abc'}])
+
+        counts = reader.stats()['namespaces']['search']
+        self.assertEqual(counts['disk_hits'], 1)
+        self.assertEqual(counts['memory_hits'], 1)
+
+    def test_expired_entries_miss(self):
+        cache = self.make_cache()
+        cache.set('search', 'old', [1], ttl=-1)
+        self.assertIsNone(cache.get('search', 'old'))
+        self.assertEqual(cache.stats()['namespaces']['search']['misses'], 1)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = self.make_cache(max_items=2)
+        cache.set('search', 'a', 1)
+        cache.set('search', 'b', 2)
+        cache.get('search', 'a')
+        cache.set('search', 'c', 3)
+
+        self.assertEqual(cache.stats()['memory_items'], 2)
+        self.assertEqual(cache.stats()['namespaces']['search']['evictions'], 1)
+        # 'b' fell out of memory but is still on disk
+        self.assertEqual(cache.get('search', 'b'), 2)
+        self.assertEqual(cache.stats()['namespaces']['search']['disk_hits'], 1)
+
+    def test_disk_budget_drops_oldest_rows(self):
+        cache = self.make_cache(disk_max_bytes=30)
+        for i in range(5):
+            cache.set('search', f'k{i}', 'x' * 10)
+        cache.enforce_disk_budget()
+
+        with self.pool.connection() as conn:
+            keys = [row['key'] for row in conn.execute('SELECT key FROM shared_cache ORDER BY key')]
+        self.assertEqual(keys, ['k3', 'k4'])
+
+    def test_stale_entry_served_while_refreshing(self):
+        """Past the soft TTL the old value is returned and refreshed once in the background"""
+        cache = self.make_cache()
+        cache.set('section', 'home', ['old'])
+        # Age the entry past its soft TTL in both tiers
+        cache._memory[('section', 'home')] = (['old'], 7, time.time() - 100, time.time() + 100)
+        with self.pool.connection() as conn:
+            conn.execute('UPDATE shared_cache SET stored_at = stored_at - 100')
+
+        refreshed = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            refreshed.set()
+            return ['new']
+
+        self.assertEqual(cache.get_or_refresh('section', 'home', loader, soft_ttl=10, hard_ttl=1000), ['old'])
+        self.assertTrue(refreshed.wait(2))
+        # Wait for the refresh thread to finish writing
+        deadline = time.time() + 2
+        while cache._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(cache.get_or_refresh('section', 'home', loader, soft_ttl=10, hard_ttl=1000), ['new'])
+        self.assertEqual(len(calls), 1)
+
+    def test_missing_entry_loads_synchronously(self):
+        cache = self.make_cache()
+        value = cache.get_or_refresh('section', 'cold', lambda: ['fresh'], soft_ttl=10, hard_ttl=100)
+        self.assertEqual(value, ['fresh'])
+        self.assertEqual(cache.get('section', 'cold'), ['fresh'])
+
+    def test_lease_excludes_second_holder(self):
+        self.assertTrue(LeaseService.acquire('job', ttl=60))
+        result = []
+        other = threading.Thread(target=lambda: result.append(LeaseService.acquire('job', ttl=60)))
+        other.start()
+        other.join()
+        self.assertEqual(result, [False])
+
+        LeaseService.release('job')
+        self.assertTrue(LeaseService.acquire('job', ttl=60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+# Add parent dir to path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yt_dlp.utils import DownloadError
+from app.services import youtube as youtube_module
+from app.services.youtube import YouTubeService, is_engine_failure, abandoned_extractions
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.cache import ConnectionPool, TieredCache
+from app.services.hedging import Hedger
+from app.services.loader_to import LoaderToJobs, LoaderToService
+
+
+class FakeYDL:
+
+    def __init__(self, extract):
+        self.extract = extract
+
+    def extract_info(self, url, download=False):
+        return self.extract(url)
+
+
+class FakePool:
+    """Stands in for the extractor pool; every checkout hands out the same fake"""
+
+    def __init__(self, extract):
+        self.ydl = FakeYDL(extract)
+        self.checkouts = []
+
+    @contextmanager
+    def checkout(self, opts, timeout=None):
+        self.checkouts.append(opts)
+        yield self.ydl
+
+
+class TestLocalBreaker(unittest.TestCase):
+
+    def call(self, extract):
+        breaker = CircuitBreaker('local', window=60, min_calls=1, failure_rate=0.5, slow_call=10, cooldown=60, probes=1)
+        with mock.patch.object(youtube_module, 'get_extractor_pool', return_value=FakePool(extract)), \
+                mock.patch.object(youtube_module, 'get_breaker', return_value=breaker):
+            info = YouTubeService._call_local('abc')
+        return info, breaker.stats()
+
+    def test_unavailable_video_is_not_a_breaker_failure(self):
+        for message in ("ERROR: [youtube] abc: Private video. Sign in if you've been granted access",
+                        "ERROR: [youtube] abc: Video unavailable. This video has been removed by the uploader",
+                        "ERROR: [youtube] abc: Sign in to confirm your age. This video may be inappropriate"):
+            def extract(url, message=message):
+                raise DownloadError(message)
+
+            info, stats = self.call(extract)
+            self.assertIsNone(info)
+            self.assertEqual((stats['calls'], stats['failures']), (1, 0), message)
+
+    def test_throttling_and_timeouts_are_breaker_failures(self):
+        for error in (DownloadError("ERROR: [youtube] abc: Sign in to confirm you’re not a bot"),
+                      DownloadError("ERROR: unable to download webpage: HTTP Error 429: Too Many Requests"),
+                      DownloadError("ERROR: unable to download webpage", exc_info=(TimeoutError, TimeoutError(), None)),
+                      TimeoutError("Timed out waiting for a free extractor")):
+            def extract(url, error=error):
+                raise error
+
+            info, stats = self.call(extract)
+            self.assertIsNone(info)
+            self.assertEqual(stats['failures'], 1, str(error))
+
+    def test_success_is_recorded(self):
+        info, stats = self.call(lambda url: {'url': 'https://example.com/v', 'title': 'T'})
+        self.assertEqual(info['stream_url'], 'https://example.com/v')
+        self.assertEqual((stats['calls'], stats['failures']), (1, 0))
+
+    def test_is_engine_failure(self):
+        self.assertFalse(is_engine_failure(None))
+        self.assertTrue(is_engine_failure(DownloadError("HTTP Error 403: Forbidden")))
+        self.assertFalse(is_engine_failure(DownloadError("This video is not available")))
+
+
+class TestInProcessExtraction(unittest.TestCase):
+    """The in-process replacements for the yt-dlp subprocess calls"""
+
+    def patch_pool(self, extract):
+        pool = FakePool(extract)
+        patcher = mock.patch.object(youtube_module, 'get_extractor_pool', return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def test_run_with_timeout_returns_and_raises(self):
+        self.assertEqual(YouTubeService._run_with_timeout(lambda: 'info', 2), 'info')
+
+        def broken():
+            raise ValueError("bad")
+
+        with self.assertRaises(ValueError):
+            YouTubeService._run_with_timeout(broken, 2)
+
+    @staticmethod
+    def wait_for_reclaim():
+        """Let extractions abandoned by earlier tests finish"""
+        deadline = time.monotonic() + 2
+        while abandoned_extractions() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_run_with_timeout_gives_up_on_stalled_extraction(self):
+        self.wait_for_reclaim()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            YouTubeService._run_with_timeout(lambda: release.wait(5), 0.1)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(abandoned_extractions(), 1)
+
+        # Too many stalled extractions: fail without queueing another
+        with mock.patch.object(youtube_module.Config, 'EXTRACT_MAX_ABANDONED', 1):
+            with self.assertRaises(TimeoutError):
+                YouTubeService._run_with_timeout(lambda: 'info', 2)
+
+        release.set()
+        self.wait_for_reclaim()
+        self.assertEqual(abandoned_extractions(), 0)
+
+    def test_playlist_is_flat_and_sliced(self):
+        def extract(url):
+            items = pool.checkouts[-1]['playlist_items']
+            count = int(items.split(':')[1])
+            return {
+                'channel': 'Chan',
+                'channel_id': 'UC1',
+                'entries': [{'id': f'v{i}', 'title': f'Video {i}'} for i in range(count)],
+            }
+
+        pool = self.patch_pool(extract)
+        info = YouTubeService.extract_playlist('https://www.youtube.com/@chan/videos', limit=3)
+        self.assertEqual([e['id'] for e in info['entries']], ['v0', 'v1', 'v2'])
+        self.assertTrue(pool.checkouts[0]['extract_flat'])
+        self.assertEqual(pool.checkouts[0]['playlist_items'], '1:3')
+
+    def test_playlist_entries_skip_bad_entries_and_fill_channel(self):
+        self.patch_pool(lambda url: {
+            'channel': 'Chan',
+            'uploader': 'Chan',
+            'entries': [{'id': 'a', 'channel': 'Other'}, None, {'title': 'no id'}, {'id': 'b'}],
+        })
+        entries = YouTubeService.get_playlist_entries('ytsearch2:query', limit=2)
+        self.assertEqual([(e['id'], e['channel'], e['uploader']) for e in entries],
+                         [('a', 'Other', 'Chan'), ('b', 'Chan', 'Chan')])
+
+    def test_playlist_entries_time_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.patch_pool(lambda url: release.wait(5) and None)
+        with self.assertRaises(TimeoutError):
+            YouTubeService.get_playlist_entries('ytsearch2:query', timeout=0.1)
+
+    def test_comments_are_limited(self):
+        pool = self.patch_pool(lambda url: {
+            'comments': [{'id': str(i), 'text': f'comment {i}'} for i in range(10)],
+            'comment_count': 1234,
+        })
+        result = YouTubeService.get_comments('abc', limit=4)
+        self.assertEqual([c['id'] for c in result['comments']], ['0', '1', '2', '3'])
+        self.assertEqual(result['comment_count'], 1234)
+        self.assertTrue(pool.checkouts[0]['getcomments'])
+        self.assertEqual(pool.checkouts[0]['extractor_args']['youtube']['max_comments'], ['4'])
+
+    def test_comments_without_count_or_info(self):
+        self.patch_pool(lambda url: {'comments': [{'id': '1'}, {'id': '2'}]})
+        self.assertEqual(YouTubeService.get_comments('abc')['comment_count'], 2)
+        self.patch_pool(lambda url: None)
+        self.assertEqual(YouTubeService.get_comments('abc'), {'comments': [], 'comment_count': 0})
+
+
+class TestHedgedInfo(unittest.TestCase):
+    """yt-dlp winning the hedge against a loader.to job other callers may share"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, 'test.db'))
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.pool.close)
+        self.jobs = LoaderToJobs(timeout=5, cache=TieredCache(pool=self.pool))
+        self.url = YouTubeService._watch_url('abc')
+        patches = [
+            mock.patch.object(LoaderToService, '_jobs', self.jobs),
+            mock.patch.object(LoaderToService, 'start_task',
+                              lambda url, fmt: {'id': 't', 'progress_url': 'https://p/progress?id=t'}),
+            mock.patch.object(LoaderToService, 'check_progress', lambda progress_url: ('running', None)),
+            mock.patch.object(youtube_module, 'get_hedger', return_value=Hedger(default_delay=0.05)),
+            mock.patch.object(youtube_module, 'get_breaker', side_effect=lambda name: CircuitBreaker(name)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def local_after_remote_started(self, join=False):
+        """A yt-dlp call that returns once the hedge has started loader.to"""
+        def local(video_id):
+            deadline = time.monotonic() + 2
+            while self.jobs.find(self.url) is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if join:
+                # Another request for the same video joins the running job
+                LoaderToService.submit(self.url)
+            return {'stream_url': 'https://local/abc.mp4'}
+        return local
+
+    def test_joined_job_survives_losing_the_hedge(self):
+        with mock.patch.object(YouTubeService, '_call_local', side_effect=self.local_after_remote_started(join=True)):
+            info = YouTubeService._get_info_hedged('abc', remote_wait=2)
+        self.assertEqual(info['stream_url'], 'https://local/abc.mp4')
+        job = self.jobs.find(self.url)
+        self.assertTrue(job.pending)
+        self.assertEqual(job._callbacks, {})
+        self.jobs.cancel(job)
+
+    def test_unshared_job_is_cancelled(self):
+        with mock.patch.object(YouTubeService, '_call_local', side_effect=self.local_after_remote_started()):
+            YouTubeService._get_info_hedged('abc', remote_wait=2)
+        self.assertIsNone(self.jobs.find(self.url))
+        self.assertEqual(self.jobs.stats()['cancelled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()